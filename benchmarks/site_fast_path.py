@@ -0,0 +1,166 @@
+"""
+站点文件快速通道基准测试 - 对比经过完整 Flask 处理和经过快速通道时的吞吐量
+
+在临时目录中创建应用（SQLite 数据库、本地存储）和一个已发布站点，直接调用 WSGI 应用
+（不经过网络和 WSGI 服务器），分别测量以下情况下站点文件请求的每秒请求数:
+  - 完整 Flask 处理（快速通道之后的下一层 WSGI 应用）
+  - 快速通道
+每种情况都分别测试匿名访问和携带登录会话 Cookie 的访问。
+
+用法:
+    python benchmarks/site_fast_path.py
+    python benchmarks/site_fast_path.py --requests 20000 --file-size 16384
+    python benchmarks/site_fast_path.py --local-mode pack
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def setup_environment(tmp, local_mode):
+    """应用配置在导入时读取，需要在导入应用之前设置环境变量"""
+    os.environ.update({
+        "STORAGE_TYPE": "local",
+        "LOCAL_STORAGE_MODE": local_mode,
+        "DB_TYPE": "sqlite",
+        "SQLITE_DB_PATH": os.path.join(tmp, "bench.db"),
+        "SITES_FOLDER": os.path.join(tmp, "sites"),
+        "UPLOAD_FOLDER": os.path.join(tmp, "uploads"),
+        "SESSION_TYPE": "sqlite",
+        "SESSION_SQLITE_PATH": os.path.join(tmp, "sessions.db"),
+        "LOG_FILE": os.path.join(tmp, "bench.log"),
+        "LOG_LEVEL": "WARNING",
+        "SITE_FAST_PATH": "true",
+    })
+
+
+def create_site(app, tmp, file_size):
+    """创建一个已发布站点，返回站点 ID"""
+    from html_hoster.database import db, Site
+    from html_hoster.storage import get_storage_service
+
+    source_dir = os.path.join(tmp, "source")
+    os.makedirs(os.path.join(source_dir, "css"), exist_ok=True)
+    with open(os.path.join(source_dir, "index.html"), "w") as f:
+        f.write("<!DOCTYPE html><title>bench</title>" + "x" * max(0, file_size - 35))
+    with open(os.path.join(source_dir, "css", "main.css"), "w") as f:
+        f.write("body{margin:0}")
+
+    site_id = str(uuid.uuid4())
+    with app.app_context():
+        db.create_all()
+        get_storage_service(app).upload_site(site_id, source_dir)
+        db.session.add(Site(id=site_id, name="bench", oss_url=f"/site/{site_id}/index.html",
+                            is_published=True, status="completed"))
+        db.session.commit()
+    return site_id
+
+
+def login_cookie(app):
+    """注册一个用户并返回登录后的会话 Cookie"""
+    client = app.test_client()
+    client.post("/auth/register", data={
+        "username": "bench", "password": "bench-password", "confirm_password": "bench-password",
+    })
+    cookie = client.get_cookie(app.config.get("SESSION_COOKIE_NAME", "session"))
+    return f"{cookie.key}={cookie.value}" if cookie else None
+
+
+def make_environ(path, cookie=None):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "SCRIPT_NAME": "",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "REMOTE_ADDR": "127.0.0.1",
+        "HTTP_HOST": "localhost",
+        "wsgi.url_scheme": "http",
+        "wsgi.input": None,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if cookie:
+        environ["HTTP_COOKIE"] = cookie
+    return environ
+
+
+def run(wsgi_app, path, cookie, requests, rounds):
+    """执行请求并返回每秒请求数的中位数"""
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(status)
+
+    results = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(requests):
+            body = wsgi_app(make_environ(path, cookie), start_response)
+            for _ in body:
+                pass
+            if hasattr(body, "close"):
+                body.close()
+        results.append(requests / (time.perf_counter() - start))
+
+    bad = [status for status in statuses if not status.startswith("200")]
+    if bad:
+        raise RuntimeError(f"请求返回了非 200 状态: {bad[0]}")
+    return statistics.median(results)
+
+
+def main():
+    """基准测试入口"""
+    parser = argparse.ArgumentParser(description="站点文件快速通道基准测试")
+    parser.add_argument("--requests", type=int, default=5000, help="每轮请求数")
+    parser.add_argument("--rounds", type=int, default=3, help="测量轮数，取中位数")
+    parser.add_argument("--file-size", type=int, default=4096, help="测试文件 index.html 的大小（字节）")
+    parser.add_argument("--local-mode", choices=["files", "pack"], default="files", help="本地存储模式")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="html-hoster-bench-")
+    try:
+        setup_environment(tmp, args.local_mode)
+        from html_hoster.__main__ import create_app
+        from html_hoster.fastpath import SiteFastPath
+
+        app = create_app()
+        if not isinstance(app.wsgi_app, SiteFastPath):
+            print("站点文件快速通道未启用")
+            sys.exit(1)
+        site_id = create_site(app, tmp, args.file_size)
+        cookie = login_cookie(app)
+
+        fast_app = app.wsgi_app
+        flask_app = fast_app.wsgi_app
+        paths = {"index.html": f"/site/{site_id}/index.html", "css/main.css": f"/site/{site_id}/css/main.css"}
+
+        print(f"本地存储模式: {args.local_mode}, 每轮 {args.requests} 个请求, {args.rounds} 轮")
+        print()
+        print(f"{'请求':<28}{'Flask(req/s)':>14}{'快速通道(req/s)':>18}{'加速比':>10}")
+        for name, path in paths.items():
+            for label, request_cookie in (("匿名", None), ("已登录", cookie)):
+                # 预热
+                run(flask_app, path, request_cookie, 200, 1)
+                run(fast_app, path, request_cookie, 200, 1)
+                before = run(flask_app, path, request_cookie, args.requests, args.rounds)
+                after = run(fast_app, path, request_cookie, args.requests, args.rounds)
+                title = f"{name} ({label})"
+                print(f"{title:<28}{before:>14.0f}{after:>18.0f}{after / before:>9.1f}x")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+站点表查询基准测试 - 对比添加二级索引前后的查询延迟
+
+在指定数据库中生成大量模拟站点数据，分别在没有二级索引和添加二级索引后执行首页、
+个人资料、站点列表 API、未关联用户检查和任务状态查询，输出各查询的延迟。
+
+注意: 该脚本会在目标数据库中创建并清空 user 和 site 表，请使用专门的测试数据库。
+
+用法:
+    python benchmarks/site_queries.py --db-url sqlite:////tmp/bench.db
+    python benchmarks/site_queries.py --db-url mysql+pymysql://root:pw@localhost/bench --reset
+    python benchmarks/site_queries.py --db-url postgresql://postgres:pw@localhost/bench --sites 500000
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, func, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from html_hoster.database import db, Site, User  # noqa: E402
+
+STATUSES = ["completed"] * 97 + ["pending"] * 2 + ["failed"]
+
+
+def build_queries(heavy_user_id, light_user_id):
+    """构造需要测试的查询"""
+    site = Site.__table__
+    return {
+        "普通用户站点列表 (index/profile)": (
+            select(site).where(site.c.user_id == light_user_id).order_by(site.c.created_at.desc())
+        ),
+        "重度用户站点列表 (index/profile)": (
+            select(site).where(site.c.user_id == heavy_user_id).order_by(site.c.created_at.desc())
+        ),
+        "全部站点第一页 (api_list_sites)": (
+            select(site).order_by(site.c.created_at.desc(), site.c.id.desc()).limit(50)
+        ),
+        "未关联用户的站点 (check_sites)": select(site).where(site.c.user_id.is_(None)),
+        "处理中的任务": (
+            select(site).where(site.c.status == "pending").order_by(site.c.created_at)
+        ),
+        "用户站点计数": select(func.count()).select_from(site).where(site.c.user_id == heavy_user_id),
+    }
+
+
+def seed(engine, users, sites, batch_size=5000):
+    """批量生成用户和站点数据"""
+    user_table = User.__table__
+    site_table = Site.__table__
+    now = datetime.utcnow()
+
+    with engine.begin() as conn:
+        conn.execute(user_table.insert(), [
+            {"id": i, "username": f"bench_user_{i}", "password_hash": "x", "is_admin": False, "created_at": now}
+            for i in range(1, users + 1)
+        ])
+
+    # 少数用户拥有大量站点，并保留一部分未关联用户的站点
+    heavy_users = max(1, users // 100)
+    batch = []
+    for i in range(sites):
+        roll = random.random()
+        if roll < 0.02:
+            user_id = None
+        elif roll < 0.5:
+            user_id = random.randint(1, heavy_users)
+        else:
+            user_id = random.randint(1, users)
+
+        created_at = now - timedelta(seconds=random.randint(0, 365 * 24 * 3600))
+        site_id = str(uuid.uuid4())
+        batch.append({
+            "id": site_id,
+            "name": f"site_{site_id}",
+            "oss_url": f"/site/{site_id}/index.html",
+            "created_at": created_at,
+            "updated_at": created_at,
+            "is_published": True,
+            "status": random.choice(STATUSES),
+            "user_id": user_id,
+        })
+        if len(batch) >= batch_size:
+            with engine.begin() as conn:
+                conn.execute(site_table.insert(), batch)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(site_table.insert(), batch)
+
+
+def analyze(engine):
+    """更新统计信息，使查询计划反映当前数据"""
+    statements = {
+        "sqlite": "ANALYZE",
+        "mysql": "ANALYZE TABLE site",
+        "postgresql": "ANALYZE site",
+    }
+    statement = statements.get(engine.dialect.name)
+    if statement:
+        with engine.begin() as conn:
+            conn.execute(text(statement))
+
+
+def run_queries(engine, queries, repeat):
+    """执行查询并返回每个查询的延迟中位数（毫秒）"""
+    results = {}
+    with engine.connect() as conn:
+        for name, query in queries.items():
+            # 预热一次
+            conn.execute(query).fetchall()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(query).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def explain(engine, query):
+    """获取查询计划"""
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return [" | ".join(str(col) for col in row) for row in conn.execute(text(prefix + str(compiled)))]
+
+
+def main():
+    """基准测试入口"""
+    parser = argparse.ArgumentParser(description="站点表二级索引基准测试")
+    parser.add_argument("--db-url", required=True, help="SQLAlchemy 数据库 URL（请使用测试数据库）")
+    parser.add_argument("--users", type=int, default=2000, help="生成的用户数量")
+    parser.add_argument("--sites", type=int, default=200000, help="生成的站点数量")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询的执行次数")
+    parser.add_argument("--reset", action="store_true", help="目标数据库已有数据时清空后重新生成")
+    parser.add_argument("--explain", action="store_true", help="输出添加索引前后的查询计划")
+    args = parser.parse_args()
+
+    random.seed(42)
+    engine = create_engine(args.db_url)
+    metadata = db.metadata
+
+    # 准备表结构
+    site_table = Site.__table__
+    metadata.create_all(engine, tables=[User.__table__, site_table])
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(site_table)).scalar()
+    if existing:
+        if not args.reset:
+            print(f"目标数据库中已有 {existing} 个站点，使用 --reset 清空后重新生成")
+            sys.exit(1)
+        metadata.drop_all(engine, tables=[site_table, User.__table__])
+        metadata.create_all(engine, tables=[User.__table__, site_table])
+
+    # 删除二级索引，得到初始迁移时的表结构
+    for index in site_table.indexes:
+        index.drop(engine, checkfirst=True)
+
+    print(f"生成数据: {args.users} 个用户, {args.sites} 个站点 ({engine.dialect.name})")
+    start = time.perf_counter()
+    seed(engine, args.users, args.sites)
+    analyze(engine)
+    print(f"生成完成，耗时 {time.perf_counter() - start:.1f} 秒")
+
+    queries = build_queries(heavy_user_id=1, light_user_id=args.users)
+
+    if args.explain:
+        for name, query in queries.items():
+            print(f"[无索引] {name}: {explain(engine, query)}")
+    before = run_queries(engine, queries, args.repeat)
+
+    for index in site_table.indexes:
+        index.create(engine)
+    analyze(engine)
+
+    if args.explain:
+        for name, query in queries.items():
+            print(f"[有索引] {name}: {explain(engine, query)}")
+    after = run_queries(engine, queries, args.repeat)
+
+    print()
+    print(f"{'查询':<36}{'无索引(ms)':>12}{'有索引(ms)':>12}{'加速比':>10}")
+    for name in queries:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<36}{before[name]:>12.2f}{after[name]:>12.2f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+启动时间基准测试 - 测量导入耗时和处理第一个请求前的耗时
+
+在临时目录中使用 SQLite 数据库和本地存储，每次测量都启动新的 Python 进程（冷启动）:
+  - 导入耗时: 通过 python -X importtime 导入 html_hoster.__main__，按顶层包汇总耗时，
+    并列出被导入的可选后端和数据库驱动（使用 SQLite 和本地存储时不应导入）
+  - 启动阶段: 在子进程中分别测量导入、create_app 和第一个 /health 请求的耗时
+  - 端到端: 启动 python -m html_hoster serve，直到 /health 第一次返回 200 的耗时
+
+可以设置耗时预算，中位数超过预算时以非零状态退出，便于在 CI 中跟踪启动时间。
+
+用法:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --top 15
+    python benchmarks/startup.py --import-budget-ms 800 --first-request-budget-ms 3000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+from collections import defaultdict
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只有对应的 STORAGE_TYPE/DB_TYPE 或命令才需要的依赖
+OPTIONAL_MODULES = ("pymysql", "psycopg2", "boto3", "oss2", "supabase", "flask_migrate", "alembic", "waitress")
+
+# 在子进程中分阶段测量启动耗时
+PHASES_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from html_hoster.__main__ import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get("/health")
+done = time.perf_counter()
+print(json.dumps({
+    "status": response.status_code,
+    "import": imported - start,
+    "create_app": created - imported,
+    "first_request": done - created,
+    "total": done - start,
+}))
+"""
+
+
+def make_environment(tmp):
+    """使用 SQLite 和本地存储的子进程环境变量"""
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": PROJECT_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "STORAGE_TYPE": "local",
+        "DB_TYPE": "sqlite",
+        "SQLITE_DB_PATH": os.path.join(tmp, "bench.db"),
+        "SITES_FOLDER": os.path.join(tmp, "sites"),
+        "UPLOAD_FOLDER": os.path.join(tmp, "uploads"),
+        "SESSION_TYPE": "sqlite",
+        "SESSION_SQLITE_PATH": os.path.join(tmp, "sessions.db"),
+        "LOG_FILE": os.path.join(tmp, "bench.log"),
+        "LOG_LEVEL": "WARNING",
+        "SERVER_PROCESSES": "1",
+    })
+    return env
+
+
+def parse_importtime(output):
+    """
+    解析 -X importtime 的输出
+
+    返回:
+        tuple: (html_hoster.__main__ 的累计耗时（秒）, {顶层包: 自身耗时之和（秒）})
+    """
+    total = 0.0
+    packages = defaultdict(float)
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        packages[module.split(".")[0]] += int(self_us) / 1e6
+        if module == "html_hoster.__main__":
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def measure_imports(env, runs):
+    """多次冷启动导入 html_hoster.__main__，返回每次的总耗时、各包耗时和被导入的可选依赖"""
+    totals = []
+    packages = defaultdict(list)
+    optional = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import html_hoster.__main__"],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        total, run_packages = parse_importtime(result.stderr)
+        totals.append(total)
+        for package, seconds in run_packages.items():
+            packages[package].append(seconds)
+        optional.update(package for package in run_packages if package in OPTIONAL_MODULES)
+    return totals, {package: statistics.median(values) for package, values in packages.items()}, optional
+
+
+def measure_phases(env, runs):
+    """在子进程中测量导入、create_app 和第一个请求的耗时"""
+    phases = defaultdict(list)
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", PHASES_SCRIPT], env=env,
+                                capture_output=True, text=True, check=True)
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        if data.pop("status") != 200:
+            raise RuntimeError("/health 未返回 200")
+        for phase, seconds in data.items():
+            phases[phase].append(seconds)
+    return phases
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_serve(env, runs, timeout=60.0):
+    """启动 serve 子命令，测量到 /health 第一次返回 200 的耗时"""
+    results = []
+    for _ in range(runs):
+        port = free_port()
+        serve_env = dict(env, SERVER_HOST="127.0.0.1", SERVER_PORT=str(port))
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "-m", "html_hoster", "serve"], env=serve_env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"服务进程启动失败，退出码 {process.returncode}")
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError(f"服务进程在 {timeout} 秒内没有响应")
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                        if response.status == 200:
+                            break
+                except OSError:
+                    time.sleep(0.01)
+            results.append(time.perf_counter() - start)
+        finally:
+            process.terminate()
+            process.wait()
+    return results
+
+
+def ms(seconds):
+    return f"{seconds * 1000:8.1f} ms"
+
+
+def main():
+    """基准测试入口"""
+    parser = argparse.ArgumentParser(description="启动时间基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="每项测量的次数，取中位数")
+    parser.add_argument("--top", type=int, default=10, help="列出导入耗时最多的包的数量")
+    parser.add_argument("--skip-serve", action="store_true", help="跳过启动 serve 子命令的端到端测量")
+    parser.add_argument("--import-budget-ms", type=float, help="导入 html_hoster.__main__ 的耗时预算（毫秒）")
+    parser.add_argument("--first-request-budget-ms", type=float,
+                        help="从启动进程到第一个请求完成的耗时预算（毫秒）")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="html-hoster-startup-")
+    failures = []
+    try:
+        env = make_environment(tmp)
+
+        totals, packages, optional = measure_imports(env, args.runs)
+        import_time = statistics.median(totals)
+        print(f"导入 html_hoster.__main__（{args.runs} 次冷启动的中位数）: {ms(import_time)}")
+        print()
+        print(f"导入耗时最多的 {args.top} 个包（自身耗时之和）:")
+        for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"  {package:<28}{ms(seconds)}")
+        print()
+        if optional:
+            print(f"被导入的可选依赖: {', '.join(sorted(optional))}")
+        else:
+            print("被导入的可选依赖: 无")
+        print()
+
+        phases = measure_phases(env, args.runs)
+        print("启动阶段（中位数）:")
+        for phase in ("import", "create_app", "first_request", "total"):
+            print(f"  {phase:<28}{ms(statistics.median(phases[phase]))}")
+        first_request = statistics.median(phases["total"])
+
+        if not args.skip_serve:
+            serve = statistics.median(measure_serve(env, args.runs))
+            print(f"  {'serve 到第一个 200 响应':<24}{ms(serve)}")
+            first_request = serve
+
+        if args.import_budget_ms is not None and import_time * 1000 > args.import_budget_ms:
+            failures.append(f"导入耗时 {import_time * 1000:.1f} ms 超过预算 {args.import_budget_ms:.1f} ms")
+        if args.first_request_budget_ms is not None and first_request * 1000 > args.first_request_budget_ms:
+            failures.append(f"第一个请求前的耗时 {first_request * 1000:.1f} ms "
+                            f"超过预算 {args.first_request_budget_ms:.1f} ms")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if failures:
+        print()
+        for failure in failures:
+            print(failure)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,22 +3,25 @@ import sys
 import logging
 import argparse
 from flask import Flask, render_template
-import pymysql
-from html_hoster.database import db, init_db, migrate
+from html_hoster.database import init_db, init_migrate
 from html_hoster.auth import init_auth
 from html_hoster.views import main_bp, site_bp
 from html_hoster.auth_views import auth_bp
 from html_hoster.config import get_config
 from html_hoster.tasks import init_executor
+from html_hoster.cache import init_cache
+from html_hoster.metrics import init_metrics
+from html_hoster.timing import init_timing
+from html_hoster.fastpath import init_site_fast_path
+from html_hoster.warmup import init_warmup, start_cache_warmup
+from html_hoster.logs import setup_logging
 
-# 加载配置
-config = get_config()
 
-# 设置 PyMySQL 作为 mysqlclient 的替代
-pymysql.install_as_MySQLdb()
-
-def create_app():
+def create_app(config=None):
     """创建并配置Flask应用"""
+    # 加载配置
+    config = config or get_config()
+    
     # 初始化 Flask 应用
     app = Flask(__name__, 
                 template_folder=config.template_folder, 
@@ -28,16 +31,7 @@ def create_app():
     config.init_app(app)
     
     # 设置日志
-    log_level = getattr(logging, app.config["LOG_LEVEL"])
-    log_file = app.config["LOG_FILE"]
-    logging.basicConfig(
-        level=log_level,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
+    setup_logging(app)
     
     # 确保上传目录和网站存储目录存在
     os.makedirs(config.upload_folder, exist_ok=True)
@@ -53,6 +47,21 @@ def create_app():
     # 初始化 Flask-Executor
     init_executor(app)
     
+    # 初始化页面片段缓存
+    init_cache(app)
+    
+    # 初始化站点文件访问次数记录
+    init_warmup(app)
+    
+    # 初始化指标统计
+    init_metrics(app)
+    
+    # 初始化请求阶段计时
+    init_timing(app)
+    
+    # 挂载站点文件快速通道（位于最外层，先于其他 WSGI 中间件处理请求）
+    init_site_fast_path(app)
+    
     # 注册错误处理器
     register_error_handlers(app)
     
@@ -91,6 +100,8 @@ def register_error_handlers(app):
 def run_db_migrations(command, message=None, revision=None):
     """运行数据库迁移命令"""
     app = create_app()
+    # 只有迁移命令才导入 Flask-Migrate
+    init_migrate(app)
     with app.app_context():
         from flask_migrate import init, migrate, upgrade, downgrade, current, history
         
@@ -125,6 +136,118 @@ def run_db_migrations(command, message=None, revision=None):
             current(verbose=True)
 
 
+def run_reshard(dry_run=False):
+    """按当前分片配置重新组织本地网站目录"""
+    app = create_app()
+    with app.app_context():
+        from html_hoster.storage import LocalStorage
+        
+        storage = LocalStorage(app)
+        logging.info(f"开始重新分片网站目录: 深度={storage.shard_depth}, 宽度={storage.shard_width}")
+        moved = storage.reshard(dry_run=dry_run)
+        logging.info(f"重新分片结束，共处理 {moved} 个站点")
+
+
+def run_recount_usage():
+    """根据站点记录重新计算所有用户的用量汇总"""
+    app = create_app()
+    with app.app_context():
+        from html_hoster.usage import recount_user_usage
+        
+        updated = recount_user_usage()
+        logging.info(f"用量汇总重新计算完成，修正了 {updated} 个用户")
+
+
+def run_proxy_config(server, server_name, listen, site_server, output=None):
+    """生成与当前配置匹配的反向代理配置"""
+    from html_hoster.offload import render_proxy_config
+    
+    flask_config = get_config().to_flask_config()
+    expected = "x-sendfile" if server == "apache" else "x-accel-redirect"
+    if flask_config["STORAGE_TYPE"] != "local" or flask_config["LOCAL_STORAGE_MODE"] != "files":
+        logging.warning("文件卸载只适用于 STORAGE_TYPE=local 且 LOCAL_STORAGE_MODE=files")
+    elif flask_config["LOCAL_FILE_OFFLOAD"] != expected:
+        logging.warning(f"当前 LOCAL_FILE_OFFLOAD={flask_config['LOCAL_FILE_OFFLOAD']}，"
+                        f"使用该配置时需要设置 LOCAL_FILE_OFFLOAD={expected}")
+    if flask_config["TRUSTED_PROXY_COUNT"] < 1:
+        logging.warning("当前 TRUSTED_PROXY_COUNT=0，经过反向代理的请求都来自代理地址，所有客户端共用一个登录限流令牌桶，"
+                        "使用该配置时需要设置 TRUSTED_PROXY_COUNT=1")
+    
+    content = render_proxy_config(flask_config, server=server, server_name=server_name,
+                                  listen=listen, site_server=site_server)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(content)
+        logging.info(f"反向代理配置已写入: {output}")
+    else:
+        sys.stdout.write(content)
+
+
+def run_warm(top_n=None, rate=None, dry_run=False):
+    """按访问次数预热站点信息和站点文件"""
+    from html_hoster.warmup import CacheWarmer
+    
+    app = create_app()
+    warmer = CacheWarmer(
+        app,
+        top_n=top_n or app.config["CACHE_WARMUP_TOP_N"],
+        rate=rate or app.config["CACHE_WARMUP_RATE"],
+        window_hours=app.config["CACHE_WARMUP_WINDOW_HOURS"],
+        timeout=app.config["CACHE_WARMUP_TIMEOUT"],
+    )
+    stats = warmer.run(dry_run=dry_run)
+    if dry_run:
+        for site_id, path in stats.get("paths", []):
+            sys.stdout.write(f"{site_id}/{path}\n")
+        return
+    logging.info(f"缓存预热完成: 站点 {stats['sites']} 个, 文件 {stats['files']} 个, "
+                 f"{stats['bytes']} 字节, 失败 {stats['errors']} 次, 耗时 {stats['seconds']} 秒")
+
+
+def run_server(worker=False):
+    """启动 Web 服务器；SERVER_PROCESSES 大于 1 时启动多进程主进程"""
+    from html_hoster.prefork import (STARTUP_TIMEOUT, Supervisor, effective_processes, reuseport_supported,
+                                     run_worker, worker_command)
+    
+    config = get_config()
+    if worker:
+        # 多进程模式下的工作进程
+        app = create_app(config)
+        start_cache_warmup(app)
+        run_worker(app, graceful_timeout=config.server_graceful_timeout)
+        return
+    
+    processes = effective_processes(config.server_processes)
+    if processes > 1 and not reuseport_supported():
+        logging.warning("当前平台不支持 SO_REUSEPORT，使用单进程模式")
+        processes = 1
+    
+    if processes > 1:
+        # 主进程只设置日志，不创建应用和数据库连接
+        app = Flask(__name__)
+        config.init_app(app)
+        setup_logging(app)
+        logging.info(f"启动多进程服务器，主机: {config.server_host}, 端口: {config.server_port}, "
+                     f"进程数: {processes}, 每个进程的线程数: {config.server_workers}")
+        # 启用预热就绪检查时，工作进程在预热完成后才通知主进程已开始监听
+        startup_timeout = STARTUP_TIMEOUT
+        if config.cache_warmup and config.cache_warmup_readiness_gate:
+            startup_timeout += config.cache_warmup_timeout
+        Supervisor(worker_command(), processes, graceful_timeout=config.server_graceful_timeout,
+                   startup_timeout=startup_timeout).run()
+        return
+    
+    app = create_app(config)
+    start_cache_warmup(app)
+    # 启动服务器
+    from waitress import serve
+    server_host = app.config["SERVER_HOST"]
+    server_port = app.config["SERVER_PORT"]
+    server_workers = app.config["SERVER_WORKERS"]
+    logging.info(f"启动服务器，主机: {server_host}, 端口: {server_port}, 工作线程数: {server_workers}")
+    serve(app, host=server_host, port=server_port, threads=server_workers)
+
+
 def main():
     """应用入口点"""
     parser = argparse.ArgumentParser(description='HTML Hoster - 静态网站托管平台')
@@ -132,6 +255,11 @@ def main():
     
     # 服务器命令
     server_parser = subparsers.add_parser('serve', help='启动 Web 服务器')
+    # 由多进程主进程启动工作进程时使用
+    server_parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    
+    # 异步站点文件服务命令
+    subparsers.add_parser('serve-sites', help='启动专门提供站点文件访问的异步服务器（SITE_SERVER_PORT）')
     
     # 数据库迁移命令
     db_parser = subparsers.add_parser('db', help='数据库迁移管理')
@@ -140,22 +268,54 @@ def main():
     db_parser.add_argument('--message', '-m', help='迁移消息描述')
     db_parser.add_argument('--revision', '-r', help='指定迁移版本')
     
+    # 网站目录重新分片命令
+    reshard_parser = subparsers.add_parser('reshard', help='按 SITES_SHARD_DEPTH/SITES_SHARD_WIDTH 在线重新分片本地网站目录')
+    reshard_parser.add_argument('--dry-run', action='store_true', help='只统计需要移动的站点，不实际移动')
+    
+    # 用户用量重新计算命令
+    subparsers.add_parser('recount-usage', help='根据站点记录重新计算用户的站点数量和存储用量')
+    
+    # 缓存预热命令
+    warm_parser = subparsers.add_parser('warm', help='按访问次数预热站点信息和站点文件（分层存储的本地副本等）')
+    warm_parser.add_argument('--top', type=int, help='预热的路径数，默认 CACHE_WARMUP_TOP_N')
+    warm_parser.add_argument('--rate', type=float, help='每秒最多的数据库查询和存储读取次数，默认 CACHE_WARMUP_RATE')
+    warm_parser.add_argument('--dry-run', action='store_true', help='只列出需要预热的路径')
+    
+    # 反向代理配置生成命令
+    proxy_parser = subparsers.add_parser('proxy-config', help='生成与 LOCAL_FILE_OFFLOAD 配套的反向代理配置')
+    proxy_parser.add_argument('--server', choices=['nginx', 'apache'], default='nginx', help='反向代理类型')
+    proxy_parser.add_argument('--server-name', help='站点域名，默认匹配所有域名')
+    proxy_parser.add_argument('--listen', type=int, default=80, help='反向代理监听的端口')
+    proxy_parser.add_argument('--site-server', action='store_true', help='把 /site/ 转发到 serve-sites 启动的异步站点文件服务')
+    proxy_parser.add_argument('--output', '-o', help='写入文件，默认输出到标准输出')
+    
     args = parser.parse_args()
     
     try:
         if args.command == 'db':
             # 运行数据库迁移命令
             run_db_migrations(args.action, args.message, args.revision)
+        elif args.command == 'reshard':
+            # 重新分片本地网站目录
+            run_reshard(args.dry_run)
+        elif args.command == 'recount-usage':
+            # 重新计算用户用量汇总
+            run_recount_usage()
+        elif args.command == 'warm':
+            # 预热缓存
+            run_warm(args.top, args.rate, args.dry_run)
+        elif args.command == 'proxy-config':
+            # 生成反向代理配置
+            run_proxy_config(args.server, args.server_name, args.listen, args.site_server, args.output)
+        elif args.command == 'serve-sites':
+            # 启动异步站点文件服务
+            from html_hoster.site_server import run_site_server
+            app = create_app()
+            start_cache_warmup(app)
+            run_site_server(app)
         else:
             # 默认启动服务器
-            app = create_app()
-            # 启动服务器
-            from waitress import serve
-            server_host = app.config["SERVER_HOST"]
-            server_port = app.config["SERVER_PORT"]
-            server_workers = app.config["SERVER_WORKERS"]
-            logging.info(f"启动服务器，主机: {server_host}, 端口: {server_port}, 工作进程数: {server_workers}")
-            serve(app, host=server_host, port=server_port, threads=server_workers)
+            run_server(worker=getattr(args, 'worker', False))
     except Exception as e:
         logging.error(f"执行命令失败: {e}")
         import traceback
@@ -56,8 +56,8 @@ def admin_required(f):
                 return redirect(url_for('auth.login'))
         
         # 检查用户是否是管理员
-        from html_hoster.database import User
-        user = User.query.get(user_id)
+        from html_hoster.cache import get_cached_user
+        user = get_cached_user(user_id)
         
         if not user or not user.is_admin:
             return jsonify({"success": False, "msg": "需要管理员权限"}), 403
@@ -66,15 +66,30 @@ def admin_required(f):
     return decorated_function
 
 
+def regenerate_session():
+    """登录后更换会话ID，避免会话固定攻击（签名 Cookie 会话无需处理）"""
+    if hasattr(session, "regenerate"):
+        session.regenerate()
+
+
 def init_auth(app):
     """初始化身份验证模块"""
     # 配置会话
     if not app.secret_key:
         app.secret_key = os.getenv("SECRET_KEY", os.urandom(24).hex())
     
-    app.config['SESSION_TYPE'] = 'filesystem'
     app.config['PERMANENT_SESSION_LIFETIME'] = 86400  # 1天
     
+    # 启用服务端会话存储
+    from html_hoster.sessions import init_sessions
+    init_sessions(app)
+    
+    # 登录和注册的限流及密码哈希线程池
+    from html_hoster.ratelimit import init_rate_limits
+    from html_hoster.passwords import init_password_hasher
+    init_rate_limits(app)
+    init_password_hasher(app)
+    
     # 尝试初始化Supabase
     supabase = get_supabase_client()
     if supabase:
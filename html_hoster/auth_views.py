@@ -2,15 +2,32 @@
 认证视图模块 - 处理用户登录和注册
 """
 import logging
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
-from html_hoster.database import db, User, Site
-from html_hoster.auth import login_required
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
+from html_hoster.database import db, User
+from html_hoster.auth import login_required, regenerate_session
+from html_hoster.cache import get_cached_user
+from html_hoster.passwords import get_password_hasher, HashingBusyError
+from html_hoster.ratelimit import auth_rate_limited
+from html_hoster.views import render_user_sites
+from html_hoster.replica import replica_read
 
 # 创建Blueprint
 auth_bp = Blueprint('auth', __name__)
 
+def _login_rate_limited(error):
+    """登录请求超过限流"""
+    flash(str(error), 'error')
+    return render_template('login.html'), 429
+
+
+def _register_rate_limited(error):
+    """注册请求超过限流"""
+    flash(str(error), 'error')
+    return render_template('register.html'), 429
+
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@auth_rate_limited(_login_rate_limited)
 def login():
     """用户登录"""
     if request.method == 'GET':
@@ -28,11 +45,19 @@ def login():
         # 查询用户
         user = User.query.filter_by(username=username).first()
         
-        if not user or not check_password_hash(user.password_hash, password):
+        hasher = get_password_hasher()
+        if not user or not hasher.verify(user.password_hash, password):
             flash('用户名或密码错误', 'error')
             return render_template('login.html'), 401
         
-        # 登录成功，保存session
+        # 哈希方法或参数已调整时，用本次输入的密码重新计算哈希
+        if hasher.needs_rehash(user.password_hash):
+            user.password_hash = hasher.hash(password)
+            db.session.commit()
+            logging.info(f"已升级用户 {username} 的密码哈希")
+        
+        # 登录成功，更换会话ID后保存session
+        regenerate_session()
         session['user_id'] = user.id
         session['username'] = user.username
         
@@ -42,6 +67,9 @@ def login():
         # 重定向到首页
         return redirect(url_for('main.index'))
         
+    except HashingBusyError as e:
+        flash(str(e), 'error')
+        return render_template('login.html'), 503
     except Exception as e:
         logging.error(f"登录失败: {e}")
         flash('登录失败，请稍后再试', 'error')
@@ -49,6 +77,7 @@ def login():
 
 
 @auth_bp.route('/register', methods=['GET', 'POST'])
+@auth_rate_limited(_register_rate_limited)
 def register():
     """用户注册"""
     if request.method == 'GET':
@@ -76,7 +105,7 @@ def register():
             return render_template('register.html'), 400
         
         # 创建新用户
-        password_hash = generate_password_hash(password)
+        password_hash = get_password_hasher().hash(password)
         new_user = User(username=username, password_hash=password_hash)
         
         db.session.add(new_user)
@@ -86,6 +115,7 @@ def register():
         logging.info(f"新用户注册成功: {username}")
         
         # 自动登录
+        regenerate_session()
         session['user_id'] = new_user.id
         session['username'] = new_user.username
         
@@ -93,6 +123,9 @@ def register():
         flash('注册成功！', 'success')
         return redirect(url_for('main.index'))
         
+    except HashingBusyError as e:
+        flash(str(e), 'error')
+        return render_template('register.html'), 503
     except Exception as e:
         logging.error(f"注册失败: {e}")
         flash('注册失败，请稍后再试', 'error')
@@ -111,6 +144,7 @@ def logout():
 
 
 @auth_bp.route('/profile')
+@replica_read
 @login_required
 def profile():
     """用户个人资料"""
@@ -121,10 +155,12 @@ def profile():
         if not user:
             return redirect(url_for('auth.logout'))
         
-        # 确保获取用户的站点
-        user.sites = Site.query.filter_by(user_id=user.id).order_by(Site.created_at.desc()).all()
+        # 获取用户的站点（分页）
+        site_count, sites_html = render_user_sites('_profile_sites.html', user.id, 'auth.profile')
         
-        return render_template('profile.html', user=user)
+        return render_template('profile.html', user=user, site_count=site_count, sites_html=sites_html,
+                               max_sites=current_app.config['USER_MAX_SITES'],
+                               quota_mb=current_app.config['USER_QUOTA_MB'])
         
     except Exception as e:
         logging.error(f"获取用户资料失败: {e}")
@@ -133,6 +169,7 @@ def profile():
 
 
 @auth_bp.route('/api/user/current', methods=['GET'])
+@replica_read
 def api_current_user():
     """API: 获取当前登录用户信息"""
     try:
@@ -145,7 +182,7 @@ def api_current_user():
                 'logged_in': False
             })
         
-        user = User.query.get(user_id)
+        user = get_cached_user(user_id)
         
         if not user:
             # 用户ID存在但用户不存在，清除session
@@ -0,0 +1,260 @@
+"""
+缓存模块 - 按用户缓存渲染后的页面片段、用户身份信息和站点访问信息
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class FragmentCache:
+    """
+    按用户划分的页面片段缓存
+
+    每个用户有一个版本号，用户的站点发生变化时版本号递增，旧版本的缓存项随之失效，
+    并在 LRU 淘汰时被清理。
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, user_id, key):
+        return (user_id, self._generations.get(user_id, 0), key)
+
+    def get(self, user_id, key):
+        """获取缓存的片段，不存在时返回 None"""
+        with self._lock:
+            cache_key = self._key(user_id, key)
+            fragment = self._items.get(cache_key)
+            if fragment is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._items.move_to_end(cache_key)
+            return fragment
+
+    def set(self, user_id, key, fragment, generation=None):
+        """
+        缓存片段
+
+        Args:
+            generation: 开始渲染时的版本号，渲染期间用户数据发生变化时不缓存
+        """
+        with self._lock:
+            if generation is not None and generation != self._generations.get(user_id, 0):
+                return
+            self._items[self._key(user_id, key)] = fragment
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def generation(self, user_id):
+        """获取用户当前的版本号"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def invalidate(self, user_id):
+        """使用户的所有缓存片段失效"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for cache_key in [k for k in self._items if k[0] == user_id]:
+                del self._items[cache_key]
+        logging.debug(f"用户 {user_id} 的页面片段缓存已失效")
+
+    def stats(self):
+        """获取命中次数、未命中次数和缓存项数量"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._items)}
+
+
+# 站点列表片段缓存
+fragment_cache = FragmentCache()
+
+# 缓存的用户身份信息（不含会随站点发布频繁变化的用量字段）
+CachedUser = namedtuple("CachedUser", ["id", "username", "email", "is_admin", "created_at", "last_login"])
+
+
+class RecordCache:
+    """进程内按 id 缓存的数据库记录，缓存项在 TTL 后过期，记录修改后立即失效"""
+
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, record_id):
+        """获取缓存的记录，不存在或已过期时返回 None"""
+        with self._lock:
+            item = self._items.get(record_id)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, record = item
+            if expires_at < time.monotonic():
+                del self._items[record_id]
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(record_id)
+            return record
+
+    def set(self, record):
+        """缓存记录"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._items[record.id] = (time.monotonic() + self.ttl, record)
+            self._items.move_to_end(record.id)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def invalidate(self, record_id):
+        """使记录的缓存失效"""
+        with self._lock:
+            self._items.pop(record_id, None)
+
+    def stats(self):
+        """获取命中次数、未命中次数和缓存项数量"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._items)}
+
+
+user_cache = RecordCache()
+
+# 缓存的站点访问信息，提供站点文件时用于判断站点是否存在和是否已发布
+CachedSite = namedtuple("CachedSite", ["id", "user_id", "is_published"])
+
+site_cache = RecordCache(ttl=5)
+
+
+def get_cached_user(user_id):
+    """
+    获取用户身份信息，优先使用缓存
+
+    返回:
+        CachedUser: 用户信息，用户不存在时返回 None
+    """
+    from html_hoster.database import db, User
+
+    if not user_id:
+        return None
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    cached = CachedUser(user.id, user.username, user.email, user.is_admin, user.created_at, user.last_login)
+    user_cache.set(cached)
+    return cached
+
+
+def get_cached_site(site_id):
+    """
+    获取站点访问信息，优先使用缓存
+
+    返回:
+        CachedSite: 站点信息，站点不存在时返回 None（不存在的站点不缓存）
+    """
+    cached = site_cache.get(site_id)
+    if cached is not None:
+        return cached
+    return fetch_site(site_id)
+
+
+def prefetch_sites(site_ids):
+    """
+    一次查询读取多个站点的访问信息并写入缓存
+
+    返回:
+        dict: {站点ID: CachedSite}，不存在的站点不包含在内
+    """
+    from sqlalchemy import select
+    from html_hoster.database import db, Site
+
+    if not site_ids:
+        return {}
+    rows = db.session.execute(
+        select(Site.id, Site.user_id, Site.is_published).where(Site.id.in_(list(site_ids)))
+    ).all()
+    found = {}
+    for row in rows:
+        cached = CachedSite(row.id, row.user_id, bool(row.is_published))
+        site_cache.set(cached)
+        found[row.id] = cached
+    return found
+
+
+def fetch_site(site_id):
+    """从数据库读取站点访问信息并写入缓存，站点不存在时返回 None"""
+    from html_hoster.database import db, Site
+
+    site = db.session.get(Site, site_id)
+    if site is None:
+        return None
+    cached = CachedSite(site.id, site.user_id, bool(site.is_published))
+    site_cache.set(cached)
+    return cached
+
+
+def _collect_site_owners(session, flush_context):
+    """刷新会话时收集发生变化的站点、站点所属用户和被修改的用户"""
+    from html_hoster.database import Site, User
+
+    owners = session.info.setdefault("changed_site_owners", set())
+    users = session.info.setdefault("changed_users", set())
+    sites = session.info.setdefault("changed_sites", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            users.add(obj.id)
+            continue
+        if not isinstance(obj, Site):
+            continue
+        sites.add(obj.id)
+        owners.add(obj.user_id)
+        # 站点更换所属用户时，旧用户的缓存也需要失效
+        history = inspect(obj).attrs.user_id.history
+        owners.update(history.deleted or ())
+
+
+def _invalidate_site_owners(session):
+    """事务提交后使相关用户的缓存失效"""
+    for user_id in session.info.pop("changed_site_owners", set()):
+        fragment_cache.invalidate(user_id)
+    for user_id in session.info.pop("changed_users", set()):
+        user_cache.invalidate(user_id)
+    for site_id in session.info.pop("changed_sites", set()):
+        site_cache.invalidate(site_id)
+
+
+def _discard_site_owners(session):
+    """事务回滚时丢弃收集的用户"""
+    session.info.pop("changed_site_owners", None)
+    session.info.pop("changed_users", None)
+    session.info.pop("changed_sites", None)
+
+
+def init_cache(app):
+    """初始化页面片段缓存、用户缓存和站点缓存，并注册站点和用户变更时的缓存失效"""
+    fragment_cache.max_entries = app.config.get("FRAGMENT_CACHE_SIZE", 1024)
+    user_cache.ttl = app.config.get("USER_CACHE_TTL", 60)
+    user_cache.max_entries = app.config.get("USER_CACHE_SIZE", 10000)
+    site_cache.ttl = app.config.get("SITE_CACHE_TTL", 5)
+    site_cache.max_entries = app.config.get("SITE_CACHE_SIZE", 10000)
+
+    if not event.contains(Session, "after_flush", _collect_site_owners):
+        event.listen(Session, "after_flush", _collect_site_owners)
+        event.listen(Session, "after_commit", _invalidate_site_owners)
+        event.listen(Session, "after_rollback", _discard_site_owners)
+    logging.info("页面片段缓存、用户缓存和站点缓存初始化完成")
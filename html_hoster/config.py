@@ -15,6 +15,7 @@ TEMPLATE_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
 UPLOAD_DIR = BASE_DIR.parent / "uploads"
 SITES_DIR = BASE_DIR.parent / "sites"  # 新增网站存储目录
+INSTANCE_DIR = BASE_DIR.parent / "instance"  # 运行时数据目录（会话等），位于包目录之外
 
 
 class DatabaseType(str, Enum):
@@ -24,12 +25,61 @@ class DatabaseType(str, Enum):
     SUPABASE = "supabase"
 
 
+class SqliteSynchronous(str, Enum):
+    """SQLite 同步模式枚举"""
+    OFF = "OFF"
+    NORMAL = "NORMAL"  # WAL 模式下仅在检查点时同步，断电最多丢失最近的事务
+    FULL = "FULL"
+    EXTRA = "EXTRA"
+
+
+class SessionType(str, Enum):
+    """会话存储类型枚举"""
+    COOKIE = "cookie"  # 签名 Cookie，会话数据保存在客户端
+    MEMORY = "memory"  # 进程内存，多进程部署时不共享
+    SQLITE = "sqlite"
+    FILESYSTEM = "filesystem"
+
+
+class ServerTimingMode(str, Enum):
+    """Server-Timing 响应头模式枚举"""
+    OFF = "off"
+    ADMIN = "admin"  # 只对管理员返回
+    ALL = "all"
+
+
 class StorageType(str, Enum):
     """存储类型枚举"""
     LOCAL = "local"
     OSS = "oss"
     S3 = "s3"
     SUPABASE = "supabase"
+    TIERED = "tiered"  # 本地热副本 + 远程持久存储
+
+
+class LocalStorageMode(str, Enum):
+    """本地存储模式枚举"""
+    FILES = "files"  # 每个文件单独存储
+    PACK = "pack"  # 每个站点存储为单个打包文件
+
+
+class FileOffloadMode(str, Enum):
+    """本地文件交给反向代理发送的方式枚举"""
+    OFF = "off"  # 由应用发送文件内容
+    X_ACCEL_REDIRECT = "x-accel-redirect"  # nginx 内部重定向
+    X_SENDFILE = "x-sendfile"  # Apache mod_xsendfile / lighttpd
+
+
+class RemoteStorageMode(str, Enum):
+    """远程存储模式枚举"""
+    FILES = "files"  # 每个文件一个对象
+    BUNDLE = "bundle"  # 每个站点一个打包对象，通过范围请求读取
+
+
+class LogFormat(str, Enum):
+    """日志格式枚举"""
+    TEXT = "text"
+    JSON = "json"  # 每行一个 JSON 对象，包含结构化字段
 
 
 class LogLevel(str, Enum):
@@ -48,7 +98,15 @@ class BaseConfig(BaseSettings):
     secret_key: str = "dev_key_please_change_in_production"
     server_host: str = "0.0.0.0"
     server_port: int = 5000
-    server_workers: int = 4
+    server_workers: int = 4  # 每个服务进程中 waitress 的线程数
+    server_processes: int = 1  # 服务进程数，大于 1 时由主进程管理多个 SO_REUSEPORT 工作进程，0 表示 CPU 核数
+    server_graceful_timeout: float = 30  # 停止或重新加载时等待工作进程处理完请求的最长时间（秒）
+    # serve-sites 异步站点文件服务设置
+    site_server_host: Optional[str] = None  # 监听地址，未设置时使用 SERVER_HOST
+    site_server_port: int = 5001
+    site_server_threads: int = 32  # 执行远程存储读取、数据库查询和 Flask 回退处理的线程数
+    site_server_max_connections: int = 10000  # 最大并发连接数，超过时直接关闭新连接
+    site_server_keepalive_timeout: float = 15  # 长连接空闲超时（秒）
     debug: bool = False
     testing: bool = False
     max_content_length: int = 50 * 1024 * 1024  # 50MB 最大上传大小
@@ -59,15 +117,35 @@ class BaseConfig(BaseSettings):
     static_folder: Path = STATIC_DIR
     upload_folder: Path = UPLOAD_DIR
     sites_folder: Path = SITES_DIR  # 新增网站存储目录
+    # 网站目录分片设置：深度为0时使用扁平布局 <uuid>，深度为2宽度为2时为 ab/cd/<uuid>
+    sites_shard_depth: int = 0
+    sites_shard_width: int = 2
     
     # 日志设置
     log_level: LogLevel = LogLevel.INFO
     log_file: str = "app.log"
+    log_format: LogFormat = LogFormat.JSON
+    log_async: bool = True  # 日志由后台线程批量写入，请求线程不等待磁盘
+    log_queue_size: int = 10000  # 日志队列长度，队列满时丢弃低于 WARNING 的日志
+    log_batch_size: int = 256  # 每批写入的最大日志条数
+    log_sample_rates: str = "site_file=0.01,storage.read=0.01,storage.write=0.1"  # 按类别采样，WARNING 及以上总是记录
     
     # 数据库设置
     db_type: DatabaseType = DatabaseType.SQLITE
     sqlalchemy_track_modifications: bool = False
     sqlite_db_path: Path = BASE_DIR / "instance" / "sites.db"
+    sqlite_wal_enabled: bool = True  # 使用 WAL 日志模式，读操作不会等待写操作
+    sqlite_busy_timeout_ms: int = 5000  # 数据库被锁定时的最长等待时间（毫秒）
+    sqlite_synchronous: SqliteSynchronous = SqliteSynchronous.NORMAL
+    sqlite_mmap_size_mb: int = 256  # 内存映射读取的最大大小（MB），0 表示不使用
+    sqlite_writer_queue: bool = True  # 后台任务的写操作由单个写线程串行执行
+
+    # 数据库连接池设置
+    db_pool_size: int = 0  # 连接池大小，0 表示按 SERVER_WORKERS + EXECUTOR_MAX_WORKERS + 1 计算
+    db_max_overflow: int = 5  # 连接池满时允许额外创建的连接数
+    db_pool_timeout: float = 10.0  # 获取连接的最长等待时间（秒）
+    db_pool_recycle: int = 1800  # 连接的最长使用时间（秒），应小于 MySQL 的 wait_timeout
+    db_pool_pre_ping: bool = True  # 获取连接时检查连接是否可用
 
     # MySQL 设置
     mysql_host: str = "localhost"
@@ -76,6 +154,12 @@ class BaseConfig(BaseSettings):
     mysql_password: str = ""
     mysql_db: str = "html_hoster"
 
+    # 只读副本设置（MySQL/Supabase），多个副本 URI 以逗号分隔
+    db_replica_urls: str = ""
+    db_replica_max_lag: float = 5.0  # 允许的最大复制延迟（秒）
+    db_replica_check_interval: float = 5.0  # 副本健康检查间隔（秒）
+    db_replica_sticky_seconds: int = 10  # 用户提交写操作后固定使用主库的时间（秒）
+
     # Supabase PostgreSQL 设置
     supabase_db_host: Optional[str] = None
     supabase_db_port: str = "5432"
@@ -86,6 +170,30 @@ class BaseConfig(BaseSettings):
 
     # 存储服务设置
     storage_type: StorageType = StorageType.LOCAL
+    
+    # 本地存储设置
+    local_storage_mode: LocalStorageMode = LocalStorageMode.FILES
+    local_pack_cache_size: int = 256  # 同时保持内存映射的打包文件数量
+    local_file_offload: FileOffloadMode = FileOffloadMode.OFF  # 文件模式下由反向代理发送文件内容
+    x_accel_redirect_prefix: str = "/_internal_sites/"  # nginx 中对应网站目录的 internal location
+    
+    # 远程存储设置（OSS/S3）
+    remote_storage_mode: RemoteStorageMode = RemoteStorageMode.FILES
+    bundle_index_cache_size: int = 1024  # 内存中缓存的站点索引数量
+    bundle_index_cache_ttl: int = 300  # 站点索引缓存时间（秒）
+    
+    # 分层存储设置（STORAGE_TYPE=tiered）
+    tiered_remote_type: StorageType = StorageType.OSS  # 作为持久存储的远程后端
+    tiered_local_quota_mb: int = 10240  # 本地热副本的磁盘配额（MB）
+    
+    # 远程存储读取保护设置（OSS/S3/Supabase）
+    storage_read_timeout: float = 10.0  # 单次读取的最长等待时间（秒）
+    storage_hedge_enabled: bool = True  # 读取慢于 p95 延迟时发起对冲请求
+    storage_hedge_min_delay_ms: int = 50  # 对冲请求的最小等待时间（毫秒）
+    storage_breaker_failure_threshold: int = 5  # 连续失败多少次后熔断，0 表示不熔断
+    storage_breaker_reset_timeout: float = 30.0  # 熔断持续时间（秒）
+    storage_fallback_cache_mb: int = 64  # 后端不可用时降级使用的内存缓存大小（MB）
+    storage_io_workers: int = 16  # 执行远程读取的线程数
 
     # 阿里云OSS设置
     oss_access_key_id: Optional[str] = None
@@ -111,6 +219,56 @@ class BaseConfig(BaseSettings):
     # Executor 设置
     executor_type: str = "thread"
     executor_max_workers: int = 4
+    
+    # 会话设置
+    session_type: SessionType = SessionType.FILESYSTEM
+    session_file_dir: Path = INSTANCE_DIR / "sessions"
+    session_sqlite_path: Path = INSTANCE_DIR / "sessions.db"
+    user_cache_ttl: int = 60  # 用户身份信息缓存时间（秒），0 表示不缓存
+    user_cache_size: int = 10000  # 用户身份信息缓存的最大条目数
+    site_cache_ttl: int = 5  # 站点访问信息（是否存在、是否发布）缓存时间（秒），0 表示不缓存
+    site_cache_size: int = 10000  # 站点访问信息缓存的最大条目数
+    site_fast_path: bool = True  # 已发布站点的文件请求是否绕过 Flask 路由和会话直接处理
+    
+    # 缓存预热设置
+    site_hit_tracking: bool = True  # 是否记录站点文件的访问次数
+    site_hit_flush_interval: int = 60  # 访问次数写入数据库的间隔（秒）
+    site_hit_max_paths: int = 10000  # 每个写入周期内记录的最大路径数
+    cache_warmup: bool = True  # 服务启动时是否在后台预热访问最多的站点
+    cache_warmup_top_n: int = 200  # 预热的路径数
+    cache_warmup_rate: float = 20.0  # 预热时每个进程每秒最多的数据库查询和存储读取次数
+    cache_warmup_window_hours: int = 168  # 只预热最近多少小时内被访问过的路径
+    cache_warmup_timeout: float = 120.0  # 预热的最长时间（秒）
+    cache_warmup_readiness_gate: bool = False  # 预热完成前 /health 返回 503，工作进程预热完成后才开始监听
+    
+    # 密码哈希和认证限流设置
+    password_hash_method: str = "pbkdf2:sha256:600000"  # werkzeug 哈希方法，修改后用户登录时自动升级
+    password_hash_workers: int = 2  # 计算密码哈希的线程数
+    password_hash_queue_depth: int = 8  # 等待计算哈希的最大请求数，超过时返回 503
+    auth_rate_limit_per_ip_burst: int = 10  # 每个 IP 允许的突发登录/注册请求数
+    auth_rate_limit_per_ip_per_minute: float = 10  # 每个 IP 每分钟补充的请求数
+    auth_rate_limit_global_burst: int = 30  # 全局允许的突发登录/注册请求数
+    auth_rate_limit_global_per_second: float = 5  # 全局每秒补充的请求数
+    trusted_proxy_count: int = 0  # 应用之前受信任的反向代理层数，大于 0 时从 X-Forwarded-For 读取客户端 IP
+    
+    # 指标设置
+    metrics_enabled: bool = True  # 是否统计指标并提供 /metrics 端点
+    metrics_token: Optional[str] = None  # 设置后访问 /metrics 需要 Authorization: Bearer <token>，未设置时只允许本机访问
+    server_timing: ServerTimingMode = ServerTimingMode.OFF  # 是否返回 Server-Timing 响应头
+    slow_request_threshold_ms: int = 1000  # 总耗时超过该值的请求记录慢请求日志，0 表示不记录
+    
+    # 采样剖析设置
+    profiler_enabled: bool = True  # 是否允许管理员通过 /api/admin/profile 进行采样剖析
+    profiler_max_seconds: float = 60  # 单次剖析的最长时间（秒）
+    profiler_min_interval_ms: float = 5  # 最短采样间隔（毫秒），限制剖析本身的开销
+    
+    # 用户配额设置，0 表示不限制
+    user_max_sites: int = 0  # 每个用户最多的站点数量（含处理中的站点）
+    user_quota_mb: int = 0  # 每个用户的存储用量上限（MB，按解压后的文件大小计算）
+    
+    # 站点列表设置
+    sites_page_size: int = 20  # 首页和个人资料页每页显示的站点数量
+    fragment_cache_size: int = 1024  # 站点列表片段缓存的最大条目数
 
     # 从环境变量加载配置
     model_config = SettingsConfigDict(
@@ -121,6 +279,30 @@ class BaseConfig(BaseSettings):
         extra="ignore"
     )
     
+    @field_validator("sites_shard_depth")
+    @classmethod
+    def validate_sites_shard_depth(cls, value: int) -> int:
+        """校验网站目录分片深度"""
+        if not 0 <= value <= 4:
+            raise ValueError("SITES_SHARD_DEPTH 必须在 0 到 4 之间")
+        return value
+    
+    @field_validator("sites_shard_width")
+    @classmethod
+    def validate_sites_shard_width(cls, value: int) -> int:
+        """校验网站目录分片宽度"""
+        if not 1 <= value <= 4:
+            raise ValueError("SITES_SHARD_WIDTH 必须在 1 到 4 之间")
+        return value
+    
+    @field_validator("sites_page_size")
+    @classmethod
+    def validate_sites_page_size(cls, value: int) -> int:
+        """校验站点列表每页数量"""
+        if not 1 <= value <= 200:
+            raise ValueError("SITES_PAGE_SIZE 必须在 1 到 200 之间")
+        return value
+    
     @property
     def sqlalchemy_database_uri(self) -> str:
         """根据数据库类型获取数据库URI"""
@@ -132,16 +314,33 @@ class BaseConfig(BaseSettings):
             # SQLite (默认)
             return f"sqlite:///{self.sqlite_db_path}"
     
+    @property
+    def db_pool_size_effective(self) -> int:
+        """连接池大小，未设置时按服务线程数和后台任务线程数计算（另加一个数据库写线程）"""
+        if self.db_pool_size > 0:
+            return self.db_pool_size
+        return self.server_workers + self.executor_max_workers + 1
+    
     @property
     def sqlalchemy_engine_options(self) -> Dict[str, Any]:
         """获取SQLAlchemy引擎选项"""
+        options: Dict[str, Any] = {}
         if self.db_type == DatabaseType.SUPABASE:
-            return {
-                "connect_args": {
-                    "options": f"-csearch_path={self.supabase_db_schema}"
-                }
+            options["connect_args"] = {
+                "options": f"-csearch_path={self.supabase_db_schema}"
             }
-        return {}
+        
+        # 内存 SQLite 数据库使用单个共享连接，不需要连接池
+        if self.db_type == DatabaseType.SQLITE and str(self.sqlite_db_path) == ":memory:":
+            return options
+        
+        options["pool_size"] = self.db_pool_size_effective
+        options["max_overflow"] = self.db_max_overflow
+        options["pool_timeout"] = self.db_pool_timeout
+        if self.db_type != DatabaseType.SQLITE:
+            options["pool_recycle"] = self.db_pool_recycle
+            options["pool_pre_ping"] = self.db_pool_pre_ping
+        return options
     
     def to_flask_config(self) -> Dict[str, Any]:
         """转换为Flask配置字典"""
@@ -151,6 +350,13 @@ class BaseConfig(BaseSettings):
             "SERVER_HOST": self.server_host,
             "SERVER_PORT": self.server_port,
             "SERVER_WORKERS": self.server_workers,
+            "SERVER_PROCESSES": self.server_processes,
+            "SERVER_GRACEFUL_TIMEOUT": self.server_graceful_timeout,
+            "SITE_SERVER_HOST": self.site_server_host or self.server_host,
+            "SITE_SERVER_PORT": self.site_server_port,
+            "SITE_SERVER_THREADS": self.site_server_threads,
+            "SITE_SERVER_MAX_CONNECTIONS": self.site_server_max_connections,
+            "SITE_SERVER_KEEPALIVE_TIMEOUT": self.site_server_keepalive_timeout,
             "DEBUG": self.debug,
             "TESTING": self.testing,
             "MAX_CONTENT_LENGTH": self.max_content_length,
@@ -161,15 +367,27 @@ class BaseConfig(BaseSettings):
             "STATIC_FOLDER": self.static_folder,
             "UPLOAD_FOLDER": self.upload_folder,
             "SITES_FOLDER": self.sites_folder,  # 新增网站存储目录
+            "SITES_SHARD_DEPTH": self.sites_shard_depth,
+            "SITES_SHARD_WIDTH": self.sites_shard_width,
             
             # 日志设置
             "LOG_LEVEL": self.log_level.value,
             "LOG_FILE": self.log_file,
+            "LOG_FORMAT": self.log_format.value,
+            "LOG_ASYNC": self.log_async,
+            "LOG_QUEUE_SIZE": self.log_queue_size,
+            "LOG_BATCH_SIZE": self.log_batch_size,
+            "LOG_SAMPLE_RATES": self.log_sample_rates,
             
             # 数据库设置
             "DB_TYPE": self.db_type.value,
             "SQLALCHEMY_TRACK_MODIFICATIONS": self.sqlalchemy_track_modifications,
             "SQLALCHEMY_DATABASE_URI": self.sqlalchemy_database_uri,
+            "DB_POOL_SIZE": self.db_pool_size_effective,
+            "DB_MAX_OVERFLOW": self.db_max_overflow,
+            "DB_POOL_TIMEOUT": self.db_pool_timeout,
+            "DB_POOL_RECYCLE": self.db_pool_recycle,
+            "DB_POOL_PRE_PING": self.db_pool_pre_ping,
         }
         
         # 添加引擎选项（如果有）
@@ -179,6 +397,11 @@ class BaseConfig(BaseSettings):
         # 数据库特定配置
         if self.db_type == DatabaseType.SQLITE:
             config["SQLITE_DB_PATH"] = self.sqlite_db_path
+            config["SQLITE_WAL_ENABLED"] = self.sqlite_wal_enabled
+            config["SQLITE_BUSY_TIMEOUT_MS"] = self.sqlite_busy_timeout_ms
+            config["SQLITE_SYNCHRONOUS"] = self.sqlite_synchronous.value
+            config["SQLITE_MMAP_SIZE_MB"] = self.sqlite_mmap_size_mb
+            config["SQLITE_WRITER_QUEUE"] = self.sqlite_writer_queue
         elif self.db_type == DatabaseType.MYSQL:
             config["MYSQL_HOST"] = self.mysql_host
             config["MYSQL_PORT"] = self.mysql_port
@@ -193,9 +416,46 @@ class BaseConfig(BaseSettings):
             config["SUPABASE_DB_NAME"] = self.supabase_db_name
             config["SUPABASE_DB_SCHEMA"] = self.supabase_db_schema
         
+        # 只读副本设置
+        config["DB_REPLICA_URLS"] = self.db_replica_urls
+        config["DB_REPLICA_MAX_LAG"] = self.db_replica_max_lag
+        config["DB_REPLICA_CHECK_INTERVAL"] = self.db_replica_check_interval
+        config["DB_REPLICA_STICKY_SECONDS"] = self.db_replica_sticky_seconds
+        if self.db_type != DatabaseType.SQLITE:
+            replica_urls = [url.strip() for url in self.db_replica_urls.split(",") if url.strip()]
+            if replica_urls:
+                config["SQLALCHEMY_BINDS"] = {
+                    f"replica_{index}": {"url": url, **self.sqlalchemy_engine_options}
+                    for index, url in enumerate(replica_urls)
+                }
+        
         # 存储服务设置
         config["STORAGE_TYPE"] = self.storage_type.value
         
+        # 本地存储设置
+        config["LOCAL_STORAGE_MODE"] = self.local_storage_mode.value
+        config["LOCAL_PACK_CACHE_SIZE"] = self.local_pack_cache_size
+        config["LOCAL_FILE_OFFLOAD"] = self.local_file_offload.value
+        config["X_ACCEL_REDIRECT_PREFIX"] = self.x_accel_redirect_prefix
+        
+        # 远程存储设置
+        config["REMOTE_STORAGE_MODE"] = self.remote_storage_mode.value
+        config["BUNDLE_INDEX_CACHE_SIZE"] = self.bundle_index_cache_size
+        config["BUNDLE_INDEX_CACHE_TTL"] = self.bundle_index_cache_ttl
+        
+        # 分层存储设置
+        config["TIERED_REMOTE_TYPE"] = self.tiered_remote_type.value
+        config["TIERED_LOCAL_QUOTA_MB"] = self.tiered_local_quota_mb
+        
+        # 远程存储读取保护设置
+        config["STORAGE_READ_TIMEOUT"] = self.storage_read_timeout
+        config["STORAGE_HEDGE_ENABLED"] = self.storage_hedge_enabled
+        config["STORAGE_HEDGE_MIN_DELAY_MS"] = self.storage_hedge_min_delay_ms
+        config["STORAGE_BREAKER_FAILURE_THRESHOLD"] = self.storage_breaker_failure_threshold
+        config["STORAGE_BREAKER_RESET_TIMEOUT"] = self.storage_breaker_reset_timeout
+        config["STORAGE_FALLBACK_CACHE_MB"] = self.storage_fallback_cache_mb
+        config["STORAGE_IO_WORKERS"] = self.storage_io_workers
+        
         # 阿里云OSS设置
         config["OSS_ACCESS_KEY_ID"] = self.oss_access_key_id
         config["OSS_ACCESS_KEY_SECRET"] = self.oss_access_key_secret
@@ -221,6 +481,56 @@ class BaseConfig(BaseSettings):
         config["EXECUTOR_TYPE"] = self.executor_type
         config["EXECUTOR_MAX_WORKERS"] = self.executor_max_workers
         
+        # 会话设置
+        config["SESSION_TYPE"] = self.session_type.value
+        config["SESSION_FILE_DIR"] = self.session_file_dir
+        config["SESSION_SQLITE_PATH"] = self.session_sqlite_path
+        config["USER_CACHE_TTL"] = self.user_cache_ttl
+        config["USER_CACHE_SIZE"] = self.user_cache_size
+        config["SITE_CACHE_TTL"] = self.site_cache_ttl
+        config["SITE_CACHE_SIZE"] = self.site_cache_size
+        config["SITE_FAST_PATH"] = self.site_fast_path
+        
+        # 缓存预热设置
+        config["SITE_HIT_TRACKING"] = self.site_hit_tracking
+        config["SITE_HIT_FLUSH_INTERVAL"] = self.site_hit_flush_interval
+        config["SITE_HIT_MAX_PATHS"] = self.site_hit_max_paths
+        config["CACHE_WARMUP"] = self.cache_warmup
+        config["CACHE_WARMUP_TOP_N"] = self.cache_warmup_top_n
+        config["CACHE_WARMUP_RATE"] = self.cache_warmup_rate
+        config["CACHE_WARMUP_WINDOW_HOURS"] = self.cache_warmup_window_hours
+        config["CACHE_WARMUP_TIMEOUT"] = self.cache_warmup_timeout
+        config["CACHE_WARMUP_READINESS_GATE"] = self.cache_warmup_readiness_gate
+        
+        # 密码哈希和认证限流设置
+        config["PASSWORD_HASH_METHOD"] = self.password_hash_method
+        config["PASSWORD_HASH_WORKERS"] = self.password_hash_workers
+        config["PASSWORD_HASH_QUEUE_DEPTH"] = self.password_hash_queue_depth
+        config["AUTH_RATE_LIMIT_PER_IP_BURST"] = self.auth_rate_limit_per_ip_burst
+        config["AUTH_RATE_LIMIT_PER_IP_PER_MINUTE"] = self.auth_rate_limit_per_ip_per_minute
+        config["AUTH_RATE_LIMIT_GLOBAL_BURST"] = self.auth_rate_limit_global_burst
+        config["AUTH_RATE_LIMIT_GLOBAL_PER_SECOND"] = self.auth_rate_limit_global_per_second
+        config["TRUSTED_PROXY_COUNT"] = self.trusted_proxy_count
+        
+        # 指标设置
+        config["METRICS_ENABLED"] = self.metrics_enabled
+        config["METRICS_TOKEN"] = self.metrics_token
+        config["SERVER_TIMING"] = self.server_timing.value
+        config["SLOW_REQUEST_THRESHOLD_MS"] = self.slow_request_threshold_ms
+        
+        # 采样剖析设置
+        config["PROFILER_ENABLED"] = self.profiler_enabled
+        config["PROFILER_MAX_SECONDS"] = self.profiler_max_seconds
+        config["PROFILER_MIN_INTERVAL_MS"] = self.profiler_min_interval_ms
+        
+        # 用户配额设置
+        config["USER_MAX_SITES"] = self.user_max_sites
+        config["USER_QUOTA_MB"] = self.user_quota_mb
+        
+        # 站点列表设置
+        config["SITES_PAGE_SIZE"] = self.sites_page_size
+        config["FRAGMENT_CACHE_SIZE"] = self.fragment_cache_size
+        
         return config
     
     def init_app(self, app):
@@ -239,6 +549,7 @@ class TestingConfig(BaseConfig):
     testing: bool = True
     debug: bool = True
     sqlite_db_path: str = ":memory:"
+    session_type: SessionType = SessionType.MEMORY
 
 
 class ProductionConfig(BaseConfig):
@@ -2,16 +2,49 @@
 数据库模块 - 支持多种数据库后端
 """
 import os
+import queue
 import logging
+import threading
 from datetime import datetime
+from concurrent.futures import Future
 from flask_sqlalchemy import SQLAlchemy
-from flask import Flask
-from flask_migrate import Migrate
+from flask import Flask, current_app
+from sqlalchemy import event
+from html_hoster.replica import RoutingSession, init_replicas
+from html_hoster.db_pool import use_instrumented_pool, instrument_engine
 
-# 初始化 SQLAlchemy 对象
-db = SQLAlchemy()
-# 初始化 Migrate 对象
-migrate = Migrate()
+# 初始化 SQLAlchemy 对象，查询可按需路由到只读副本
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+# 未指定驱动时 SQLAlchemy 使用 mysqlclient（MySQLdb）连接 MySQL
+MYSQLDB_URL_PREFIXES = ("mysql://", "mysql+mysqldb://")
+
+
+def install_db_driver(app: Flask):
+    """
+    按配置的数据库地址准备驱动
+    
+    只有使用 MySQL 时才导入 PyMySQL 并注册为 mysqlclient 的替代；
+    PostgreSQL 的 psycopg2 由 SQLAlchemy 在创建引擎时导入。
+    """
+    urls = [app.config.get("SQLALCHEMY_DATABASE_URI") or ""]
+    for bind_options in app.config.get("SQLALCHEMY_BINDS", {}).values():
+        urls.append(bind_options.get("url", "") if isinstance(bind_options, dict) else bind_options)
+    if any(str(url).startswith(MYSQLDB_URL_PREFIXES) for url in urls):
+        import pymysql
+        
+        pymysql.install_as_MySQLdb()
+
+
+def init_migrate(app: Flask):
+    """
+    初始化数据库迁移
+    
+    只有数据库迁移命令需要 Flask-Migrate（及 Alembic），服务启动时不导入。
+    """
+    from flask_migrate import Migrate
+    
+    Migrate(app, db)
 
 
 def init_db(app: Flask):
@@ -29,23 +62,134 @@ def init_db(app: Flask):
         sqlite_path = app.config["SQLITE_DB_PATH"]
         os.makedirs(os.path.dirname(sqlite_path), exist_ok=True)
     
+    # 按数据库类型导入驱动
+    install_db_driver(app)
+    
+    # 使用记录获取等待时间的连接池
+    use_instrumented_pool(app.config.get("SQLALCHEMY_ENGINE_OPTIONS"))
+    for bind_options in app.config.get("SQLALCHEMY_BINDS", {}).values():
+        use_instrumented_pool(bind_options)
+    
     # 初始化数据库
     db.init_app(app)
     
-    # 初始化数据库迁移
-    migrate.init_app(app, db)
+    # 注册只读副本
+    init_replicas(app, db)
     
     # 在应用上下文中创建所有表
     with app.app_context():
+        for key, engine in db.engines.items():
+            instrument_engine(key or "primary", engine)
+        
         if db_type == "mysql":
             logging.info(f"MySQL 数据库初始化完成: {app.config['MYSQL_HOST']}:{app.config['MYSQL_PORT']}/{app.config['MYSQL_DB']}")
         elif db_type == "supabase":
             logging.info(f"Supabase PostgreSQL 数据库初始化完成: {app.config['SUPABASE_DB_HOST']}:{app.config['SUPABASE_DB_PORT']}/{app.config['SUPABASE_DB_NAME']}")
         else:
+            configure_sqlite(app)
             logging.info(f"SQLite 数据库初始化完成: {app.config['SQLITE_DB_PATH']}")
         
-        # 注意：migrate 初始化后不需要再调用 db.create_all()
-        # 通过 flask db migrate 和 flask db upgrade 命令管理数据库结构
+        # 注意：不需要调用 db.create_all()
+        # 通过 python -m html_hoster db migrate 和 db upgrade 命令管理数据库结构
+    
+    # SQLite 同一时刻只允许一个写事务，后台任务的写操作交给单个写线程串行执行
+    if db_type == "sqlite" and app.config.get("SQLITE_WRITER_QUEUE", True):
+        app.extensions["db_writer"] = DatabaseWriter(app)
+
+
+def configure_sqlite(app: Flask):
+    """
+    为连接池中的每个 SQLite 连接设置 PRAGMA
+
+    WAL 模式下读操作不会被写操作阻塞，busy_timeout 让写操作在锁被占用时等待而不是立即报错，
+    synchronous=NORMAL 在 WAL 模式下只在检查点时同步磁盘，mmap_size 通过内存映射减少读取时的拷贝。
+    """
+    wal_enabled = app.config.get("SQLITE_WAL_ENABLED", True)
+    busy_timeout = app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000)
+    synchronous = app.config.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    mmap_size = app.config.get("SQLITE_MMAP_SIZE_MB", 256) * 1024 * 1024
+    in_memory = str(app.config["SQLITE_DB_PATH"]) == ":memory:"
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+            if wal_enabled and not in_memory:
+                cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute(f"PRAGMA synchronous = {synchronous}")
+            cursor.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        finally:
+            cursor.close()
+
+    event.listen(db.engine, "connect", set_sqlite_pragmas)
+    logging.info(f"SQLite 连接参数: WAL={wal_enabled}, busy_timeout={busy_timeout}ms, "
+                 f"synchronous={synchronous}, mmap_size={mmap_size // (1024 * 1024)}MB")
+
+
+class DatabaseWriter:
+    """
+    单线程数据库写入队列
+
+    写操作按提交顺序在同一个线程中执行，每个操作在独立的事务中完成并提交，
+    避免多个后台任务同时争用 SQLite 的写锁。
+    """
+
+    def __init__(self, app: Flask):
+        self.app = app
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        提交写操作
+
+        参数:
+            fn: 写操作，在写线程的应用上下文中执行，返回后自动提交事务
+
+        返回:
+            Future: 写操作的结果
+        """
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _run(self):
+        """写线程主循环"""
+        while True:
+            future, fn, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self.app.app_context():
+                try:
+                    result = fn(*args, **kwargs)
+                    db.session.commit()
+                    future.set_result(result)
+                except BaseException as e:
+                    db.session.rollback()
+                    logging.error(f"数据库写操作失败: {e}")
+                    future.set_exception(e)
+                finally:
+                    db.session.remove()
+
+
+def run_write(fn, *args, **kwargs):
+    """
+    执行数据库写操作并等待结果
+
+    启用了写入队列时由写线程串行执行，否则在当前线程中执行并提交。
+    """
+    writer = current_app.extensions.get("db_writer")
+    if writer is None:
+        try:
+            result = fn(*args, **kwargs)
+            db.session.commit()
+        except Exception:
+            # 与写线程一致，失败时回滚，调用方可以在同一会话中重试
+            db.session.rollback()
+            raise
+        return result
+    return writer.submit(fn, *args, **kwargs).result()
 
 
 # 用户模型
@@ -53,11 +197,14 @@ class User(db.Model):
     """用户模型"""
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=True)
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
+    # 用量汇总：已发布站点的数量和文件总大小，在站点发布和删除时增量维护
+    site_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
     
     # 用户创建的站点
     sites = db.relationship('Site', backref='owner', lazy=True)
@@ -72,7 +219,9 @@ class User(db.Model):
             "email": self.email,
             "is_admin": self.is_admin,
             "created_at": self.created_at.isoformat() if self.created_at else None,
-            "last_login": self.last_login.isoformat() if self.last_login else None
+            "last_login": self.last_login.isoformat() if self.last_login else None,
+            "site_count": self.site_count,
+            "total_bytes": self.total_bytes
         }
 
 
@@ -90,9 +239,20 @@ class Site(db.Model):
     status = db.Column(db.String(20), default="pending")
     # 添加错误信息字段
     error_message = db.Column(db.Text, nullable=True)
+    # 站点用量：文件数量、解压后的总大小和上传时的大小，在发布时记录
+    file_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    compressed_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
     
     # 外键关联用户
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    
+    # 二级索引：按用户列出站点、按创建时间分页、查找未完成的任务
+    __table_args__ = (
+        db.Index("ix_site_user_id_created_at", "user_id", "created_at"),
+        db.Index("ix_site_created_at_id", "created_at", "id"),
+        db.Index("ix_site_status_created_at", "status", "created_at"),
+    )
 
     def __repr__(self):
         return f"<Site {self.name}>"
@@ -108,5 +268,27 @@ class Site(db.Model):
             "is_published": self.is_published,
             "user_id": self.user_id,
             "status": self.status,
-            "error_message": self.error_message
-        } 
\ No newline at end of file
+            "error_message": self.error_message,
+            "file_count": self.file_count,
+            "total_bytes": self.total_bytes,
+            "compressed_bytes": self.compressed_bytes
+        }
+
+
+# 站点文件访问次数模型
+class SiteHit(db.Model):
+    """站点文件的累计访问次数，由各服务进程定期合并写入，用于启动时预热缓存"""
+    __tablename__ = "site_hit"
+    
+    site_id = db.Column(db.String(36), primary_key=True)
+    path = db.Column(db.String(512), primary_key=True)
+    hits = db.Column(db.BigInteger, nullable=False, default=0, server_default="0")
+    last_hit_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # 预热时按访问次数从高到低读取最近被访问的路径
+    __table_args__ = (
+        db.Index("ix_site_hit_hits", "hits"),
+    )
+    
+    def __repr__(self):
+        return f"<SiteHit {self.site_id}/{self.path}: {self.hits}>"
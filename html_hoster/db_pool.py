@@ -0,0 +1,143 @@
+"""
+连接池模块 - 统计数据库连接池的获取等待时间、使用情况和连接变动
+"""
+import time
+import logging
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from html_hoster.resilience import LatencyTracker
+
+
+class PoolMetrics:
+    """单个连接池的统计数据"""
+
+    def __init__(self, name):
+        self.name = name
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.connections_opened = 0
+        self.connections_closed = 0
+        self.connections_invalidated = 0
+        self.wait_latency = LatencyTracker(window=1000)
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds):
+        """记录一次连接获取的等待时间（秒）"""
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_wait_total += seconds
+            self.checkout_wait_max = max(self.checkout_wait_max, seconds)
+        self.wait_latency.record(seconds)
+
+    def record_timeout(self):
+        """记录一次连接获取超时"""
+        with self._lock:
+            self.checkout_timeouts += 1
+        logging.warning(f"数据库连接池 {self.name} 获取连接超时")
+
+    def record_connect(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_close(self):
+        with self._lock:
+            self.connections_closed += 1
+
+    def record_invalidate(self):
+        with self._lock:
+            self.connections_invalidated += 1
+
+    def snapshot(self, pool):
+        """
+        获取当前统计数据
+
+        返回:
+            dict: 连接池大小、使用中和空闲的连接数，以及累计的获取等待和连接变动统计
+        """
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.checkout_timeouts,
+                "checkout_wait_avg_ms": round(self.checkout_wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "checkout_wait_max_ms": round(self.checkout_wait_max * 1000, 3),
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+                "connections_invalidated": self.connections_invalidated,
+            }
+
+        p95 = self.wait_latency.p95()
+        data["checkout_wait_p95_ms"] = round(p95 * 1000, 3) if p95 is not None else None
+
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            })
+        return data
+
+
+class InstrumentedQueuePool(QueuePool):
+    """记录连接获取等待时间的 QueuePool"""
+
+    metrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout()
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return record
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，保留统计数据
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+# 已注册的连接池: 名称 -> (PoolMetrics, Engine)
+_pool_metrics = {}
+_pool_metrics_lock = threading.Lock()
+
+
+def use_instrumented_pool(engine_options):
+    """为设置了连接池大小的引擎选项指定 InstrumentedQueuePool"""
+    if isinstance(engine_options, dict) and "pool_size" in engine_options:
+        engine_options.setdefault("poolclass", InstrumentedQueuePool)
+
+
+def instrument_engine(name, engine):
+    """注册引擎的连接池事件，统计连接变动和使用情况"""
+    metrics = PoolMetrics(name)
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.metrics = metrics
+
+    event.listen(engine, "connect", lambda dbapi_connection, connection_record: metrics.record_connect())
+    event.listen(engine, "close", lambda dbapi_connection, connection_record: metrics.record_close())
+    event.listen(engine, "invalidate", lambda dbapi_connection, connection_record, exception: metrics.record_invalidate())
+    event.listen(engine, "soft_invalidate", lambda dbapi_connection, connection_record, exception: metrics.record_invalidate())
+
+    with _pool_metrics_lock:
+        _pool_metrics[name] = (metrics, engine)
+    return metrics
+
+
+def get_pool_stats():
+    """获取所有已注册连接池的统计数据"""
+    with _pool_metrics_lock:
+        items = list(_pool_metrics.items())
+    return {name: metrics.snapshot(engine.pool) for name, (metrics, engine) in items}
@@ -0,0 +1,287 @@
+"""
+站点文件快速通道 - 在 Flask 之前处理已发布站点的文件请求
+
+站点文件请求的数量远多于管理页面。快速通道作为 WSGI 中间件挂在 Flask 应用之前，
+直接处理 /site/<站点ID>/<路径> 的 GET/HEAD 请求：站点信息来自站点缓存，存储服务实例
+在进程内复用，不经过 Flask 的路由、会话加载、蓝图和请求钩子。
+
+已发布站点的文件由快速通道返回，文件不存在和存储出错时直接返回与 Flask 相同的错误页面，
+不再让 Flask 重复读取存储；站点不存在、未发布（需要读取会话判断是否为站点所有者）和
+Range 请求交给 Flask 处理，保持原有的错误页面和权限检查。
+启用请求阶段计时时，快速通道同样记录数据库和存储耗时、慢请求日志，SERVER_TIMING=all 时
+返回 Server-Timing 响应头（没有会话，admin 模式不返回）。
+"""
+import os
+import stat
+import logging
+import mimetypes
+
+from flask import render_template
+from werkzeug.http import HTTP_STATUS_CODES, http_date, parse_date
+from werkzeug.security import safe_join
+from werkzeug.utils import get_content_type
+from werkzeug.wsgi import FileWrapper
+
+from html_hoster.cache import site_cache, fetch_site
+from html_hoster.logs import log_event
+from html_hoster.metrics import begin_request, end_request
+from html_hoster.offload import FileOffload
+from html_hoster.resilience import StorageUnavailableError
+from html_hoster.storage import is_safe_storage_path
+from html_hoster.timing import begin_timing, cancel_timing, finish_timing, span, timing_enabled
+from html_hoster.warmup import record_hit
+
+# 与 Flask 中 serve_site_file 的路由一致，指标按同一路由统计
+SITE_ROUTE = "/site/<site_id>/<path:filename>"
+SITE_PREFIX = "/site/"
+
+# 读取本地文件时每次发送的块大小
+FILE_CHUNK_SIZE = 64 * 1024
+
+# 与 serve_site_file 一致的错误页面: 状态码 -> (错误信息, 详细说明)
+ERROR_PAGES = {
+    404: ("文件未找到", "请求的文件 {filename} 不存在"),
+    500: ("服务器错误", "获取文件时发生错误"),
+    503: ("服务暂时不可用", "存储服务响应缓慢，请稍后再试"),
+}
+
+
+class SiteFastPath:
+    """处理已发布站点文件请求的 WSGI 中间件，其他请求交给 Flask"""
+
+    def __init__(self, app, wsgi_app):
+        """
+        初始化站点文件快速通道
+
+        Args:
+            app: Flask应用实例
+            wsgi_app: 下一层 WSGI 应用（Flask 应用及其中间件）
+        """
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.local_files = (
+            app.config["STORAGE_TYPE"].lower() == "local"
+            and app.config.get("LOCAL_STORAGE_MODE", "files") == "files"
+        )
+        self.offload = FileOffload.from_config(app.config) if self.local_files else None
+        self.metrics_enabled = app.config.get("METRICS_ENABLED", True)
+        self.timing_enabled = timing_enabled(app.config)
+        self._storage = None
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO", "")
+        method = environ.get("REQUEST_METHOD")
+        if not path.startswith(SITE_PREFIX) or (method != "GET" and method != "HEAD"):
+            return self.wsgi_app(environ, start_response)
+
+        if self.metrics_enabled:
+            begin_request()
+        timing = begin_timing() if self.timing_enabled else None
+        try:
+            result = self._serve(environ, path, method)
+        except Exception as e:
+            logging.debug(f"快速通道处理失败，交给 Flask 处理 {path}: {e}")
+            result = None
+
+        if result is None:
+            if timing is not None:
+                cancel_timing(timing)
+            return self.wsgi_app(environ, start_response)
+
+        status, headers, body, site_id, filename, size = result
+        if timing is not None:
+            server_timing = finish_timing(timing, self.app.config, method, path, SITE_ROUTE, int(status[:3]))
+            if server_timing:
+                headers = headers + [("Server-Timing", server_timing)]
+        start_response(status, headers)
+        if self.metrics_enabled:
+            end_request("site", SITE_ROUTE, method, status[:3])
+        log_event("site_file", "提供站点文件: %s/%s", site_id, filename,
+                  site_id=site_id, path=filename, status=int(status[:3]), bytes=size)
+        record_hit(site_id, filename, int(status[:3]))
+        return body
+
+    def _get_storage(self):
+        # 存储服务实例在进程内复用；并发首次创建时多创建一个实例也没有影响
+        if self._storage is None:
+            from html_hoster.storage import get_storage_service
+
+            with self.app.app_context():
+                self._storage = get_storage_service(self.app)
+        return self._storage
+
+    def lookup_site(self, site_id):
+        """获取站点访问信息，缓存未命中时才查询数据库"""
+        site = site_cache.get(site_id)
+        if site is not None:
+            return site
+        return self.fetch_site(site_id)
+
+    def fetch_site(self, site_id):
+        """在应用上下文中从数据库读取站点访问信息"""
+        with self.app.app_context():
+            return fetch_site(site_id)
+
+    def _serve(self, environ, path, method):
+        """
+        尝试直接返回站点文件
+
+        返回:
+            tuple: (状态, 响应头, 响应体, 站点ID, 文件路径, 字节数)，需要交给 Flask 处理时返回 None
+        """
+        parsed = parse_site_path(path)
+        if parsed is None:
+            return None
+        site_id, filename = parsed
+
+        site = self.lookup_site(site_id)
+        if site is None or not site.is_published:
+            return None
+        return self.serve_file(environ, method, site_id, filename)
+
+    def serve_file(self, environ, method, site_id, filename):
+        """
+        返回已发布站点中的文件
+
+        文件不存在和存储出错时返回错误页面；Range 请求等需要交给 Flask 处理时返回 None。
+        """
+        try:
+            if self.local_files:
+                return self._serve_local_file(environ, method, site_id, filename)
+            return self._serve_stored_file(environ, method, site_id, filename)
+        except StorageUnavailableError as e:
+            logging.warning(f"存储服务暂时不可用 {site_id}/{filename}: {e}")
+            return self._error_page(environ, method, 503, site_id, filename)
+        except Exception as e:
+            logging.error(f"提供站点文件失败 {site_id}/{filename}: {e}")
+            return self._error_page(environ, method, 500, site_id, filename)
+
+    def _error_page(self, environ, method, code, site_id, filename):
+        """渲染与 serve_site_file 相同的错误页面"""
+        error_message, error_detail = ERROR_PAGES[code]
+        with self.app.request_context(environ):
+            body = render_template("error.html", error_code=code, error_message=error_message,
+                                   error_detail=error_detail.format(filename=filename)).encode()
+        headers = [("Content-Type", "text/html; charset=utf-8"), ("Content-Length", str(len(body)))]
+        status = f"{code} {HTTP_STATUS_CODES[code].upper()}"
+        if method == "HEAD":
+            return status, headers, [], site_id, filename, 0
+        return status, headers, [body], site_id, filename, len(body)
+
+    def _serve_local_file(self, environ, method, site_id, filename):
+        """本地文件模式：直接发送站点目录中的文件，支持条件请求；启用卸载时交给反向代理发送"""
+        with span("storage"):
+            file_path = safe_join(self._get_storage().get_site_path(site_id), filename)
+        if file_path is None:
+            return self._error_page(environ, method, 404, site_id, filename)
+        if self.offload is not None:
+            # 不存在的文件直接返回 404（也不计入访问次数），条件请求和 Range 请求由反向代理处理
+            with span("storage"):
+                found = os.path.isfile(file_path)
+            if not found:
+                return self._error_page(environ, method, 404, site_id, filename)
+            headers = [
+                ("Content-Type", _guess_content_type(filename)),
+                ("Cache-Control", "no-cache"),
+                self.offload.header(file_path),
+                ("Content-Length", "0"),
+            ]
+            return "200 OK", headers, [], site_id, filename, 0
+        if environ.get("HTTP_RANGE"):
+            return None
+        try:
+            with span("storage"):
+                st = os.stat(file_path)
+        except OSError:
+            return self._error_page(environ, method, 404, site_id, filename)
+        if not stat.S_ISREG(st.st_mode):
+            return self._error_page(environ, method, 404, site_id, filename)
+
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        headers = [
+            ("Content-Type", _guess_content_type(filename)),
+            ("Cache-Control", "no-cache"),
+            ("ETag", etag),
+            ("Last-Modified", http_date(st.st_mtime)),
+            ("Accept-Ranges", "bytes"),
+        ]
+
+        if _not_modified(environ, etag, int(st.st_mtime)):
+            return "304 NOT MODIFIED", headers, [], site_id, filename, 0
+
+        headers.append(("Content-Length", str(st.st_size)))
+        if method == "HEAD":
+            return "200 OK", headers, [], site_id, filename, 0
+
+        file_wrapper = environ.get("wsgi.file_wrapper", FileWrapper)
+        with span("storage"):
+            body = file_wrapper(open(file_path, "rb"), FILE_CHUNK_SIZE)
+        return "200 OK", headers, body, site_id, filename, st.st_size
+
+    def _serve_stored_file(self, environ, method, site_id, filename):
+        """其他存储类型和本地打包模式：从存储服务读取文件内容"""
+        with span("storage"):
+            content, content_type = self._get_storage().download_file(f"{site_id}/{filename}")
+        if content is None:
+            return self._error_page(environ, method, 404, site_id, filename)
+
+        headers = [
+            ("Content-Type", content_type or _guess_content_type(filename, "text/html")),
+            ("Content-Length", str(len(content))),
+        ]
+        if method == "HEAD":
+            return "200 OK", headers, [], site_id, filename, 0
+        return "200 OK", headers, [content], site_id, filename, len(content)
+
+
+def parse_site_path(path):
+    """
+    从 WSGI 路径中解析站点ID和文件路径
+
+    返回:
+        tuple: (站点ID, 文件路径)，不是站点文件路径或需要由 Flask 的路由规则处理时返回 None
+    """
+    if not path.startswith(SITE_PREFIX):
+        return None
+    # 与 werkzeug 一致，WSGI 环境中的路径按 latin-1 传递，需要还原为 UTF-8
+    try:
+        path = path.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return None
+    site_id, _, filename = path[len(SITE_PREFIX):].partition("/")
+    # 空路径、目录和重复的斜杠由 Flask 的路由规则处理
+    if not site_id or not filename or filename.endswith("/") or "//" in filename:
+        return None
+    # 包含 . 或 .. 路径段的请求交给 Flask 处理，由存储服务拒绝访问站点目录之外的文件
+    if not is_safe_storage_path(f"{site_id}/{filename}"):
+        return None
+    return site_id, filename
+
+
+def _guess_content_type(filename, default="application/octet-stream"):
+    mimetype, _ = mimetypes.guess_type(filename)
+    return get_content_type(mimetype or default, "utf-8")
+
+
+def _not_modified(environ, etag, mtime):
+    """根据 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+    if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+    if if_modified_since:
+        since = parse_date(if_modified_since)
+        return since is not None and mtime <= since.timestamp()
+    return False
+
+
+def init_site_fast_path(app):
+    """在 Flask 应用之前挂载站点文件快速通道，应在其他 WSGI 中间件之后调用，使其位于最外层"""
+    if not app.config.get("SITE_FAST_PATH", True):
+        logging.info("站点文件快速通道未启用")
+        return
+
+    app.wsgi_app = SiteFastPath(app, app.wsgi_app)
+    logging.info("站点文件快速通道已启用")
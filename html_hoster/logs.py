@@ -0,0 +1,249 @@
+"""
+日志模块 - 异步批量写入的结构化日志
+
+请求线程只把日志记录放入有界队列，格式化和写入文件/控制台由后台线程按批完成，
+每批只刷新一次，磁盘刷新的延迟不会影响请求。高频日志（如站点文件访问、逐个文件的
+存储读写）通过 log_event 按类别采样，警告及以上级别的日志总是保留。
+"""
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler
+
+# 文本格式
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
+
+# 类别 -> 采样率（0~1），未配置的类别全部记录
+_sample_rates = {}
+
+
+def parse_sample_rates(value):
+    """
+    解析采样率配置，格式为“类别=采样率”，多个类别用逗号分隔
+
+    例如: site_file=0.01,storage.read=0.01
+    """
+    rates = {}
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        category, _, rate = item.partition("=")
+        try:
+            rates[category.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            raise ValueError(f"无效的日志采样率: {item}")
+    return rates
+
+
+def log_event(category, message, *args, level=logging.INFO, **fields):
+    """
+    记录一条带类别和结构化字段的日志
+
+    message 使用 % 格式，参数在后台线程中才格式化；低于 WARNING 的日志按类别的采样率记录。
+
+    Args:
+        category: 日志类别，例如 site_file、storage.read
+        message: 日志消息
+        *args: 消息参数
+        level: 日志级别
+        **fields: 结构化字段，JSON 格式输出时作为独立字段
+    """
+    logger = logging.getLogger()
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING:
+        rate = _sample_rates.get(category)
+        if rate is not None and (rate <= 0 or random.random() >= rate):
+            return
+    fields["category"] = category
+    # 直接创建记录，省去 Logger.log 查找调用位置的开销（结构化日志不输出文件名和行号）
+    record = logger.makeRecord(logger.name, level, "(unknown file)", 0, message, args, None,
+                               extra={"fields": fields})
+    logger.handle(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """将日志记录格式化为单行 JSON"""
+
+    def format(self, record):
+        data = {
+            "ts": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            for key, value in fields.items():
+                data.setdefault(key, value)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class _DeferredFlushMixin:
+    """写入时不刷新，由批量写入线程在每批结束后统一刷新"""
+
+    def emit(self, record):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class DeferredFlushFileHandler(_DeferredFlushMixin, logging.FileHandler):
+    pass
+
+
+class DeferredFlushStreamHandler(_DeferredFlushMixin, logging.StreamHandler):
+    pass
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    把日志记录放入有界队列
+
+    不在调用线程中格式化消息；队列满时丢弃低于 WARNING 的日志并计数，
+    WARNING 及以上的日志短暂等待队列空位。
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 记录只在进程内传递，保留原始参数，消息在写入线程中格式化
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                try:
+                    self.queue.put(record, timeout=1.0)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+
+class BatchingQueueListener:
+    """从队列中按批取出日志记录并写入处理器，每批刷新一次"""
+
+    _sentinel = object()
+
+    def __init__(self, log_queue, handlers, batch_size=256, queue_handler=None):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self.queue_handler = queue_handler
+        self._reported_drops = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """写完队列中剩余的日志后停止"""
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def _write(self, batch):
+        for record in batch:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+    def _report_drops(self):
+        dropped = self.queue_handler.dropped if self.queue_handler else 0
+        if dropped > self._reported_drops:
+            record = logging.LogRecord(
+                "root", logging.WARNING, __file__, 0,
+                f"日志队列已满，丢弃了 {dropped - self._reported_drops} 条日志", None, None,
+            )
+            self._reported_drops = dropped
+            self._write([record])
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            batch = []
+            while True:
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            self._report_drops()
+
+
+def setup_logging(app):
+    """
+    根据配置设置根日志记录器
+
+    与 logging.basicConfig 一致，根日志记录器已有处理器时不做修改。
+    """
+    global _sample_rates
+
+    root = logging.getLogger()
+    _sample_rates = parse_sample_rates(app.config.get("LOG_SAMPLE_RATES", ""))
+    if root.handlers:
+        return None
+
+    formatter = JsonFormatter() if app.config.get("LOG_FORMAT", "json") == "json" else logging.Formatter(TEXT_FORMAT)
+    log_file = app.config["LOG_FILE"]
+    root.setLevel(getattr(logging, app.config["LOG_LEVEL"]))
+
+    if not app.config.get("LOG_ASYNC", True):
+        handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            root.addHandler(handler)
+        return None
+
+    handlers = [DeferredFlushFileHandler(log_file), DeferredFlushStreamHandler(sys.stderr)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=app.config.get("LOG_QUEUE_SIZE", 10000))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    listener = BatchingQueueListener(
+        log_queue, handlers,
+        batch_size=app.config.get("LOG_BATCH_SIZE", 256),
+        queue_handler=queue_handler,
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    root.addHandler(queue_handler)
+    app.extensions["log_listener"] = listener
+    return listener
@@ -0,0 +1,536 @@
+"""
+指标模块 - 进程内的指标注册表，以 Prometheus 文本格式通过 /metrics 输出
+
+覆盖请求延迟、每个请求的数据库查询次数、存储操作、后台任务、缓存和数据库连接池。
+指标的子项（一组标签值）在第一次使用时创建并缓存，热路径上只需要一次字典查找和
+一次加锁的计数更新。
+"""
+import os
+import re
+import hmac
+import time
+import logging
+import threading
+import contextvars
+from bisect import bisect_left
+from functools import wraps
+
+from flask import Response, current_app, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from html_hoster.timing import current_timer
+
+# 默认的延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 未设置 METRICS_TOKEN 时允许访问 /metrics 的客户端地址
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+# 反向代理转发请求时添加的请求头
+PROXY_HEADERS = ("X-Forwarded-For", "Forwarded", "X-Real-IP")
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = value
+
+
+class _HistogramChild:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Metric:
+    """带标签的指标，labels() 返回一组标签值对应的子项"""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """获取（或创建）一组标签值对应的子项"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签: {', '.join(self.labelnames)}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        """返回 (名称后缀, 标签列表, 值) 的列表"""
+        with self._lock:
+            items = list(self._children.items())
+        return [("", list(zip(self.labelnames, values)), child.value) for values, child in items]
+
+
+class Counter(Metric):
+    """只增不减的计数"""
+
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """可增可减的当前值"""
+
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """按固定分桶统计的分布"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._children.items())
+        result = []
+        for values, child in items:
+            labels = list(zip(self.labelnames, values))
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += count
+                result.append(("_bucket", labels + [("le", _format_value(float(bound)))], cumulative))
+            result.append(("_sum", labels, total))
+            result.append(("_count", labels, cumulative))
+        return result
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.type}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector):
+        """
+        注册在输出时才读取数据的采集函数
+
+        采集函数返回 (名称, 类型, 说明, [(标签字典, 值), ...]) 的列表。
+        """
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self):
+        """以 Prometheus 文本格式输出所有指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logging.warning(f"指标采集失败 {getattr(collector, '__name__', collector)}: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# 请求
+REQUEST_DURATION = registry.histogram(
+    "html_hoster_http_request_duration_seconds", "请求处理耗时", ("blueprint", "route", "method"))
+REQUESTS_TOTAL = registry.counter(
+    "html_hoster_http_requests_total", "请求数量", ("blueprint", "route", "method", "status"))
+REQUEST_DB_QUERIES = registry.histogram(
+    "html_hoster_http_request_db_queries", "每个请求执行的数据库查询次数", ("blueprint", "route"),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
+DB_QUERIES_TOTAL = registry.counter("html_hoster_db_queries_total", "数据库查询次数")
+
+# 存储
+STORAGE_DURATION = registry.histogram(
+    "html_hoster_storage_operation_duration_seconds", "存储操作耗时", ("backend", "operation"))
+STORAGE_BYTES = registry.counter(
+    "html_hoster_storage_bytes_total", "存储操作读写的字节数", ("backend", "operation"))
+STORAGE_ERRORS = registry.counter(
+    "html_hoster_storage_errors_total", "存储操作失败次数", ("backend", "operation"))
+
+# 后台任务
+JOBS_QUEUED = registry.gauge("html_hoster_jobs_queued", "等待执行的后台任务数量")
+JOBS_IN_FLIGHT = registry.gauge("html_hoster_jobs_in_flight", "正在执行的后台任务数量")
+JOB_DURATION = registry.histogram(
+    "html_hoster_job_duration_seconds", "后台任务执行耗时", ("job",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0))
+JOBS_TOTAL = registry.counter("html_hoster_jobs_total", "完成的后台任务数量", ("job", "outcome"))
+
+
+# ---------------------------------------------------------------------------
+# 存储操作
+# ---------------------------------------------------------------------------
+
+# 需要统计的存储操作
+STORAGE_OPERATIONS = (
+    "upload_file", "upload_site", "put_content", "download_file", "download_range",
+    "delete_file", "delete_prefix", "list_files",
+)
+
+
+def _storage_bytes(operation, args, result):
+    """根据存储操作的参数和返回值计算读写的字节数"""
+    if operation == "download_file":
+        content = result[0] if isinstance(result, tuple) else result
+        return len(content) if content is not None else 0
+    if operation == "download_range":
+        return len(result) if result is not None else 0
+    if operation == "upload_file":
+        return os.path.getsize(args[0])
+    if operation == "put_content":
+        return len(args[1])
+    return 0
+
+
+def _instrument_storage_method(backend, operation, method):
+    # 指标子项在第一次调用时创建，未使用的后端不输出；多个线程同时第一次调用时只创建一次
+    children = None
+    lock = threading.Lock()
+
+    def create_children():
+        nonlocal children
+        with lock:
+            if children is None:
+                children = (
+                    STORAGE_DURATION.labels(backend, operation),
+                    STORAGE_BYTES.labels(backend, operation),
+                    STORAGE_ERRORS.labels(backend, operation),
+                )
+        return children
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        duration, transferred, errors = children or create_children()
+        # 包装存储调用底层存储时，只有最外层计入请求的存储阶段耗时
+        timer = current_timer()
+        timed = timer is not None and timer.enter("storage")
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            duration.observe(elapsed)
+            if timed:
+                timer.exit("storage", elapsed)
+        try:
+            nbytes = _storage_bytes(operation, args, result)
+        except (OSError, TypeError, IndexError):
+            nbytes = 0
+        if nbytes:
+            transferred.inc(nbytes)
+        return result
+
+    wrapper._metrics_instrumented = True
+    return wrapper
+
+
+def instrument_storage_class(cls):
+    """
+    为存储服务类的存储操作添加耗时、字节数和错误统计
+
+    后端标签取自类名（例如 LocalStorage -> local），包装类（如 ResilientStorage）和
+    被包装的后端分别统计。
+    """
+    backend = re.sub(r"Storage$", "", cls.__name__).lower() or cls.__name__.lower()
+    for operation in STORAGE_OPERATIONS:
+        method = getattr(cls, operation, None)
+        if method is None or getattr(method, "__isabstractmethod__", False):
+            continue
+        if getattr(method, "_metrics_instrumented", False):
+            continue
+        setattr(cls, operation, _instrument_storage_method(backend, operation, method))
+
+
+# ---------------------------------------------------------------------------
+# 后台任务
+# ---------------------------------------------------------------------------
+
+def track_job(fn):
+    """包装提交到后台线程池的任务，统计排队数量、执行中数量和执行耗时"""
+    job = getattr(fn, "__name__", "unknown")
+    JOBS_QUEUED.inc()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        JOBS_QUEUED.dec()
+        JOBS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            JOBS_IN_FLIGHT.dec()
+            JOB_DURATION.labels(job).observe(time.perf_counter() - start)
+            JOBS_TOTAL.labels(job, outcome).inc()
+
+    return wrapper
+
+
+# ---------------------------------------------------------------------------
+# 请求和数据库查询
+# ---------------------------------------------------------------------------
+
+# 当前请求的 [开始时间, 数据库查询次数]，不在请求中时为 None
+_request_state = contextvars.ContextVar("html_hoster_request_state", default=None)
+
+# (路由, 请求方法) -> (耗时直方图子项, 查询次数直方图子项)
+_route_children = {}
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    DB_QUERIES_TOTAL.inc()
+    state = _request_state.get()
+    if state is not None:
+        state[1] += 1
+
+
+def begin_request():
+    """开始统计一个请求，由 before_request 或不经过 Flask 的处理路径调用"""
+    _request_state.set([time.perf_counter(), 0])
+
+
+def end_request(blueprint, route, method, status):
+    """结束统计当前请求，记录耗时、查询次数和状态码"""
+    state = _request_state.get()
+    if state is None:
+        return
+    _request_state.set(None)
+
+    # 按路由规则缓存指标子项，减少每个请求的开销
+    key = (route, method)
+    children = _route_children.get(key)
+    if children is None:
+        children = (
+            REQUEST_DURATION.labels(blueprint, route, method),
+            REQUEST_DB_QUERIES.labels(blueprint, route),
+        )
+        _route_children[key] = children
+
+    duration, queries = children
+    duration.observe(time.perf_counter() - state[0])
+    queries.observe(state[1])
+    REQUESTS_TOTAL.labels(blueprint, route, method, str(status)).inc()
+
+
+def _record_request(response):
+    if _request_state.get() is None:
+        return response
+
+    # 只解析一次请求代理
+    req = request._get_current_object()
+    rule = req.url_rule
+    route = rule.rule if rule is not None else "<unmatched>"
+    end_request(req.blueprint or "app", route, req.method, response.status_code)
+    return response
+
+
+def _finish_request(exc):
+    # 请求出错且没有生成响应时不会调用 after_request
+    _request_state.set(None)
+
+
+# ---------------------------------------------------------------------------
+# 输出时采集的指标
+# ---------------------------------------------------------------------------
+
+def _collect_caches():
+    from html_hoster.cache import fragment_cache, user_cache, site_cache
+
+    families = {"hits": [], "misses": [], "entries": []}
+    for name, cache in (("fragment", fragment_cache), ("user", user_cache), ("site", site_cache)):
+        stats = cache.stats()
+        for key in families:
+            families[key].append(({"cache": name}, stats[key]))
+    return [
+        ("html_hoster_cache_hits_total", "counter", "缓存命中次数", families["hits"]),
+        ("html_hoster_cache_misses_total", "counter", "缓存未命中次数", families["misses"]),
+        ("html_hoster_cache_entries", "gauge", "缓存项数量", families["entries"]),
+    ]
+
+
+def _collect_db_pools():
+    from html_hoster.db_pool import get_pool_stats
+
+    fields = (
+        ("checked_out", "gauge", "使用中的连接数"),
+        ("checked_in", "gauge", "空闲的连接数"),
+        ("overflow", "gauge", "溢出的连接数"),
+        ("checkouts", "counter", "获取连接次数"),
+        ("checkout_timeouts", "counter", "获取连接超时次数"),
+    )
+    stats = get_pool_stats()
+    families = []
+    for field, metric_type, documentation in fields:
+        name = f"html_hoster_db_pool_{field}" + ("_total" if metric_type == "counter" else "")
+        samples = [({"pool": pool}, data[field]) for pool, data in stats.items() if field in data]
+        families.append((name, metric_type, documentation, samples))
+    return families
+
+
+def _is_local_request():
+    """
+    请求是否直接来自本机
+
+    没有受信任的反向代理（TRUSTED_PROXY_COUNT=0）时，同一台机器上的反向代理转发的请求
+    对端地址也是本机，带有转发请求头的请求不算本机请求。
+    """
+    if current_app.config.get("TRUSTED_PROXY_COUNT", 0) < 1:
+        if any(header in request.headers for header in PROXY_HEADERS):
+            return False
+    return request.remote_addr in LOCAL_ADDRESSES
+
+
+def metrics_view():
+    """
+    以 Prometheus 文本格式输出指标
+
+    设置 METRICS_TOKEN 时需要 Authorization: Bearer <token>，否则只允许本机访问。
+    """
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return Response("unauthorized\n", status=401, content_type="text/plain; charset=utf-8")
+    elif not _is_local_request():
+        return Response("forbidden\n", status=403, content_type="text/plain; charset=utf-8")
+    return Response(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_metrics(app):
+    """注册请求统计、数据库查询统计和 /metrics 端点"""
+    if not app.config.get("METRICS_ENABLED", True):
+        logging.info("指标统计未启用")
+        return
+
+    app.before_request(begin_request)
+    app.after_request(_record_request)
+    app.teardown_request(_finish_request)
+
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+
+    registry.register_collector(_collect_caches)
+    registry.register_collector(_collect_db_pools)
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    if app.config.get("METRICS_TOKEN"):
+        logging.info("指标统计已启用: /metrics")
+    else:
+        logging.info("指标统计已启用: /metrics（未设置 METRICS_TOKEN，只允许本机访问）")
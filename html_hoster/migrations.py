@@ -6,7 +6,7 @@ import logging
 import argparse
 from flask import Flask
 from html_hoster.config import load_config
-from html_hoster.database import db, migrate
+from html_hoster.database import db, install_db_driver, init_migrate
 
 
 def create_app():
@@ -15,9 +15,10 @@ def create_app():
     # 加载配置
     load_config(app)
     # 初始化数据库
+    install_db_driver(app)
     db.init_app(app)
     # 初始化迁移
-    migrate.init_app(app, db)
+    init_migrate(app)
     return app
 
 
@@ -0,0 +1,179 @@
+"""
+文件发送卸载模块 - 本地文件模式下由反向代理发送站点文件
+
+应用只做站点存在、发布状态和访问权限的检查，然后返回 X-Accel-Redirect（nginx）或
+X-Sendfile（Apache mod_xsendfile / lighttpd）响应头，文件内容由反向代理通过 sendfile
+直接发送，不再经过 Python。条件请求和 Range 请求也由反向代理处理；不存在的文件由应用
+返回 404。
+"""
+import os
+from urllib.parse import quote
+
+
+class FileOffload:
+    """根据文件路径生成交给反向代理的响应头"""
+
+    def __init__(self, mode, sites_folder, prefix="/_internal_sites/"):
+        """
+        Args:
+            mode: x-accel-redirect 或 x-sendfile
+            sites_folder: 网站目录
+            prefix: nginx 中对应网站目录的 internal location
+        """
+        self.mode = mode
+        self.sites_folder = os.path.abspath(sites_folder)
+        self.prefix = "/" + prefix.strip("/") + "/"
+
+    @classmethod
+    def from_config(cls, config):
+        """根据配置创建，未启用时返回 None"""
+        mode = config.get("LOCAL_FILE_OFFLOAD", "off")
+        if mode == "off":
+            return None
+        return cls(mode, config["SITES_FOLDER"], config.get("X_ACCEL_REDIRECT_PREFIX", "/_internal_sites/"))
+
+    def header(self, file_path):
+        """
+        获取交给反向代理发送文件的响应头
+
+        Args:
+            file_path: 已通过 safe_join 检查的文件绝对路径
+
+        返回:
+            tuple: (响应头名称, 值)
+        """
+        file_path = os.path.abspath(file_path)
+        if self.mode == "x-sendfile":
+            # mod_xsendfile 默认对路径做 URL 解码（XSendFileUnescape）
+            return "X-Sendfile", quote(file_path)
+        relative = os.path.relpath(file_path, self.sites_folder).replace(os.sep, "/")
+        return "X-Accel-Redirect", self.prefix + quote(relative)
+
+
+NGINX_TEMPLATE = """\
+# 由 python -m html_hoster proxy-config 生成
+upstream html_hoster {{
+    server {app_address};
+    keepalive 32;
+}}
+{site_upstream}
+server {{
+    listen {listen};
+    server_name {server_name};
+    client_max_body_size {max_body};
+
+    location / {{
+        proxy_pass http://html_hoster;
+{proxy_settings}
+    }}
+
+    # 指标和采样剖析只允许本机访问
+    location = /metrics {{
+{local_only}
+        proxy_pass http://html_hoster;
+{proxy_settings}
+    }}
+
+    location /api/admin/profile {{
+{local_only}
+        proxy_pass http://html_hoster;
+{proxy_settings}
+    }}
+{site_location}
+    # 应用完成权限检查后通过 X-Accel-Redirect 把站点文件交给 nginx 发送
+    location {prefix} {{
+        internal;
+        alias {sites_folder}/;
+        sendfile on;
+        tcp_nopush on;
+    }}
+}}
+"""
+
+NGINX_LOCAL_ONLY = """\
+        allow 127.0.0.1;
+        allow ::1;
+        deny all;"""
+
+NGINX_PROXY_SETTINGS = """\
+        proxy_http_version 1.1;
+        proxy_set_header Connection "";
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto $scheme;"""
+
+APACHE_TEMPLATE = """\
+# 由 python -m html_hoster proxy-config --server apache 生成
+# 需要启用 mod_proxy、mod_proxy_http 和 mod_xsendfile
+<VirtualHost *:{listen}>
+    ServerName {server_name}
+    LimitRequestBody {max_body_bytes}
+
+    # 应用完成权限检查后通过 X-Sendfile 把站点文件交给 Apache 发送
+    XSendFile On
+    XSendFilePath {sites_folder}
+
+    ProxyPreserveHost On
+
+    # 指标和采样剖析只允许本机访问
+    <Location "/metrics">
+        Require local
+    </Location>
+    <Location "/api/admin/profile">
+        Require local
+    </Location>
+
+{site_proxy}    ProxyPass / http://{app_address}/
+    ProxyPassReverse / http://{app_address}/
+</VirtualHost>
+"""
+
+
+def _address(host, port):
+    # 监听所有地址时通过本机地址访问
+    if host in ("0.0.0.0", "::", ""):
+        host = "127.0.0.1"
+    return f"[{host}]:{port}" if ":" in host else f"{host}:{port}"
+
+
+def render_proxy_config(config, server="nginx", server_name=None, listen=80, site_server=False):
+    """
+    生成与当前配置匹配的反向代理配置
+
+    Args:
+        config: Flask 配置
+        server: nginx 或 apache
+        server_name: 站点域名，默认匹配所有域名
+        listen: 反向代理监听的端口
+        site_server: 是否把 /site/ 转发到 serve-sites 启动的异步站点文件服务
+    """
+    app_address = _address(config["SERVER_HOST"], config["SERVER_PORT"])
+    site_address = _address(config["SITE_SERVER_HOST"], config["SITE_SERVER_PORT"])
+    sites_folder = os.path.abspath(config["SITES_FOLDER"])
+    max_body_bytes = config.get("MAX_CONTENT_LENGTH") or 50 * 1024 * 1024
+
+    if server == "apache":
+        server_name = server_name or "localhost"
+        site_proxy = ""
+        if site_server:
+            site_proxy = (f"    ProxyPass /site/ http://{site_address}/site/\n"
+                          f"    ProxyPassReverse /site/ http://{site_address}/site/\n")
+        return APACHE_TEMPLATE.format(
+            listen=listen, server_name=server_name, max_body_bytes=max_body_bytes,
+            sites_folder=sites_folder, site_proxy=site_proxy, app_address=app_address,
+        )
+
+    server_name = server_name or "_"
+    site_upstream = ""
+    site_location = ""
+    if site_server:
+        site_upstream = f"\nupstream html_hoster_sites {{\n    server {site_address};\n    keepalive 64;\n}}\n"
+        site_location = (f"\n    location /site/ {{\n        proxy_pass http://html_hoster_sites;\n"
+                         f"{NGINX_PROXY_SETTINGS}\n    }}\n")
+    prefix = "/" + config.get("X_ACCEL_REDIRECT_PREFIX", "/_internal_sites/").strip("/") + "/"
+    return NGINX_TEMPLATE.format(
+        app_address=app_address, site_upstream=site_upstream, listen=listen, server_name=server_name,
+        max_body=f"{max(1, max_body_bytes // (1024 * 1024))}m", proxy_settings=NGINX_PROXY_SETTINGS,
+        local_only=NGINX_LOCAL_ONLY,
+        site_location=site_location, prefix=prefix, sites_folder=sites_folder,
+    )
@@ -0,0 +1,238 @@
+"""
+站点打包模块 - 将整个站点存储为单个打包文件，并通过内存映射提供文件访问
+
+打包文件格式:
+    [文件头][文件内容...][索引]
+
+    文件头: 魔数(4字节) + 版本(2字节) + 保留(2字节) + 索引偏移(8字节) + 索引长度(8字节)
+    索引: 按路径排序的 JSON 数组，每项为 [路径, 偏移, 长度, Content-Type, sha256]
+"""
+import os
+import io
+import json
+import mmap
+import uuid
+import struct
+import bisect
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+# 打包文件魔数和版本
+PACK_MAGIC = b"HHPK"
+PACK_VERSION = 1
+PACK_SUFFIX = ".pack"
+PACK_HEADER = struct.Struct("<4sHHQQ")
+
+# 索引项
+PackEntry = namedtuple("PackEntry", ["path", "offset", "length", "content_type", "sha256"])
+
+
+class SitePackError(Exception):
+    """打包文件格式错误"""
+    pass
+
+
+def encode_pack_index(entries):
+    """将索引项序列化为 JSON 字节串"""
+    return json.dumps([list(entry) for entry in entries], ensure_ascii=False).encode("utf-8")
+
+
+def decode_pack_index(data):
+    """从 JSON 字节串解析索引项"""
+    return [PackEntry(*item) for item in json.loads(data.decode("utf-8"))]
+
+
+def find_pack_entry(entries, paths, path):
+    """在按路径排序的索引中二分查找索引项，不存在时返回 None"""
+    position = bisect.bisect_left(paths, path)
+    if position < len(paths) and paths[position] == path:
+        return entries[position]
+    return None
+
+
+def write_site_pack(pack_path, files):
+    """
+    写入站点打包文件
+
+    先写入临时文件，完成后通过 os.replace 原子替换目标文件，
+    因此发布过程中读者要么看到旧的打包文件，要么看到完整的新文件。
+
+    Args:
+        pack_path: 打包文件路径
+        files: 可迭代对象，每项为 (路径, 来源, Content-Type)，来源可以是本地文件路径或 bytes
+
+    返回:
+        int: 写入的文件数量
+    """
+    os.makedirs(os.path.dirname(pack_path), exist_ok=True)
+    tmp_path = f"{pack_path}.{uuid.uuid4().hex}.tmp"
+    entries = []
+
+    try:
+        with open(tmp_path, "wb") as pack_file:
+            # 预留文件头，写完索引后回填
+            pack_file.write(b"\0" * PACK_HEADER.size)
+
+            for path, source, content_type in files:
+                offset = pack_file.tell()
+                digest = hashlib.sha256()
+
+                if isinstance(source, (bytes, bytearray, memoryview)):
+                    src_file = io.BytesIO(source)
+                else:
+                    src_file = open(source, "rb")
+
+                with src_file:
+                    while True:
+                        chunk = src_file.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        pack_file.write(chunk)
+
+                entries.append(PackEntry(path, offset, pack_file.tell() - offset, content_type, digest.hexdigest()))
+
+            # 写入排序后的索引
+            entries.sort(key=lambda entry: entry.path)
+            index_data = encode_pack_index(entries)
+            index_offset = pack_file.tell()
+            pack_file.write(index_data)
+
+            # 回填文件头
+            pack_file.seek(0)
+            pack_file.write(PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, index_offset, len(index_data)))
+            pack_file.flush()
+            os.fsync(pack_file.fileno())
+
+        os.replace(tmp_path, pack_path)
+        return len(entries)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class SitePack:
+    """基于内存映射的站点打包文件读取器"""
+
+    def __init__(self, pack_path):
+        """打开并解析打包文件"""
+        self.pack_path = pack_path
+
+        with open(pack_path, "rb") as pack_file:
+            self._mmap = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._mmap) < PACK_HEADER.size:
+            raise SitePackError(f"打包文件过短: {pack_path}")
+
+        magic, version, _, index_offset, index_length = PACK_HEADER.unpack_from(self._mmap, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise SitePackError(f"不支持的打包文件格式: {pack_path}")
+
+        self._entries = decode_pack_index(self._mmap[index_offset:index_offset + index_length])
+        self._paths = [entry.path for entry in self._entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_entry(self, path):
+        """按路径查找索引项（二分查找），不存在时返回 None"""
+        return find_pack_entry(self._entries, self._paths, path)
+
+    def read(self, path):
+        """
+        读取文件内容
+
+        返回:
+            tuple: (内容, Content-Type)，文件不存在时返回 (None, None)
+        """
+        entry = self.get_entry(path)
+        if entry is None:
+            return None, None
+        return self._mmap[entry.offset:entry.offset + entry.length], entry.content_type
+
+    def list(self, prefix=""):
+        """列出以指定前缀开头的所有文件路径"""
+        position = bisect.bisect_left(self._paths, prefix)
+        paths = []
+        while position < len(self._paths) and self._paths[position].startswith(prefix):
+            paths.append(self._paths[position])
+            position += 1
+        return paths
+
+    def entries(self):
+        """返回所有索引项"""
+        return list(self._entries)
+
+    def replace_entry(self, path, source=None, content_type=None):
+        """
+        生成添加、替换或移除单个文件后的完整文件列表，用于重写打包文件
+
+        Args:
+            path: 站点内的文件路径
+            source: 新文件来源（本地路径或 bytes），为 None 时表示移除该文件
+            content_type: 新文件的 Content-Type
+
+        返回:
+            tuple: (可传给 write_site_pack 的文件列表, 是否发生了变更)
+        """
+        files = []
+        changed = source is not None
+        for entry in self._entries:
+            if entry.path == path:
+                changed = True
+                continue
+            content, _ = self.read(entry.path)
+            files.append((entry.path, content, entry.content_type))
+
+        if source is not None:
+            files.append((path, source, content_type))
+        return files, changed
+
+
+# 已打开的打包文件缓存: 路径 -> (文件标识, SitePack)
+_pack_cache = OrderedDict()
+_pack_cache_lock = threading.Lock()
+
+
+def open_site_pack(pack_path, max_cached=256):
+    """
+    获取打包文件读取器，已打开的打包文件会被缓存复用
+
+    缓存项以 inode、修改时间和大小作为标识，打包文件被替换后会自动重新打开。
+    被淘汰的读取器不主动关闭，由最后一个引用释放时关闭内存映射，避免影响正在读取的线程。
+
+    返回:
+        SitePack: 读取器，打包文件不存在时返回 None
+    """
+    try:
+        stat = os.stat(pack_path)
+    except FileNotFoundError:
+        with _pack_cache_lock:
+            _pack_cache.pop(pack_path, None)
+        return None
+
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _pack_cache_lock:
+        cached = _pack_cache.get(pack_path)
+        if cached and cached[0] == identity:
+            _pack_cache.move_to_end(pack_path)
+            return cached[1]
+
+    pack = SitePack(pack_path)
+    logging.debug(f"打开站点打包文件: {pack_path} ({len(pack)} 个文件)")
+
+    with _pack_cache_lock:
+        _pack_cache[pack_path] = (identity, pack)
+        _pack_cache.move_to_end(pack_path)
+        while len(_pack_cache) > max_cached:
+            _pack_cache.popitem(last=False)
+    return pack
+
+
+def evict_site_pack(pack_path):
+    """从缓存中移除打包文件读取器"""
+    with _pack_cache_lock:
+        _pack_cache.pop(pack_path, None)
@@ -0,0 +1,106 @@
+"""
+密码模块 - 在专用线程池中计算密码哈希
+
+PBKDF2/scrypt 计算耗时且占用 CPU，放到固定大小的线程池中执行，并限制排队数量，
+避免大量登录请求占满所有服务线程。
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+
+def normalize_hash_method(method):
+    """
+    补全哈希方法的默认参数，与 werkzeug 写入哈希前缀的格式一致
+
+    例如 pbkdf2 补全为 pbkdf2:sha256:<默认迭代次数>，scrypt 补全为 scrypt:32768:8:1。
+
+    Raises:
+        ValueError: 不支持的哈希方法或参数
+    """
+    name, *args = method.split(":")
+    if name == "scrypt":
+        if not args:
+            args = [2 ** 15, 8, 1]
+        elif len(args) != 3:
+            raise ValueError("scrypt 哈希方法需要 3 个参数")
+        return "scrypt:" + ":".join(str(int(arg)) for arg in args)
+    if name == "pbkdf2":
+        if len(args) > 2:
+            raise ValueError("pbkdf2 哈希方法最多 2 个参数")
+        hash_name = args[0] if args else "sha256"
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"不支持的哈希方法: {method}")
+
+
+class HashingBusyError(Exception):
+    """密码哈希线程池繁忙"""
+    pass
+
+
+class PasswordHasher:
+    """在有界线程池中执行密码哈希和校验"""
+
+    def __init__(self, method, workers=2, queue_depth=8, timeout=10.0):
+        """
+        初始化密码哈希线程池
+
+        Args:
+            method: werkzeug 的哈希方法，例如 pbkdf2:sha256:600000
+            workers: 计算哈希的线程数
+            queue_depth: 允许排队等待的请求数，超过时直接拒绝
+            timeout: 等待哈希结果的最长时间（秒）
+        """
+        self.method = method
+        # 哈希值中记录的方法前缀，用于判断是否需要升级
+        self._prefix = normalize_hash_method(method)
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            logging.warning("密码哈希线程池繁忙，拒绝请求")
+            raise HashingBusyError("服务繁忙，请稍后再试")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HashingBusyError("服务繁忙，请稍后再试")
+
+    def hash(self, password):
+        """计算密码哈希"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """校验密码"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """判断密码哈希是否使用了与当前配置不同的方法或参数"""
+        return password_hash.split("$", 1)[0] != self._prefix
+
+
+def init_password_hasher(app):
+    """根据配置创建密码哈希线程池"""
+    hasher = PasswordHasher(
+        method=app.config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000"),
+        workers=app.config.get("PASSWORD_HASH_WORKERS", 2),
+        queue_depth=app.config.get("PASSWORD_HASH_QUEUE_DEPTH", 8),
+    )
+    app.extensions["password_hasher"] = hasher
+    return hasher
+
+
+def get_password_hasher():
+    """获取当前应用的密码哈希线程池"""
+    return current_app.extensions["password_hasher"]
@@ -0,0 +1,313 @@
+"""
+多进程服务模块 - 由主进程管理多个通过 SO_REUSEPORT 监听同一端口的工作进程
+
+单个 Python 进程受 GIL 限制只能使用一个 CPU 核心。主进程启动 SERVER_PROCESSES 个工作进程，
+每个工作进程各自创建设置了 SO_REUSEPORT 的监听套接字，由内核在进程之间分配连接，
+每个进程内仍由 waitress 以 SERVER_WORKERS 个线程处理请求。
+
+工作进程以新的解释器启动（而不是 fork 主进程），重新加载时会读取最新的代码和配置。
+主进程处理以下信号:
+  - SIGHUP: 平滑重新加载，新一组工作进程正常运行后再让旧进程处理完请求退出
+  - SIGTERM/SIGINT: 让所有工作进程处理完请求后退出
+工作进程异常退出时自动重启，短时间内反复退出时逐渐延长重启间隔。
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import select
+import _thread
+import logging
+import threading
+import subprocess
+
+from werkzeug.wsgi import ClosingIterator
+
+# 等待工作进程完成启动（创建应用并开始监听）的最长时间（秒）
+STARTUP_TIMEOUT = 120.0
+# 工作进程通过该环境变量指定的管道通知主进程已开始监听
+READY_FD_ENV = "HTML_HOSTER_READY_FD"
+# 工作进程连续快速退出时重启间隔的上限（秒）
+MAX_RESTART_DELAY = 30.0
+# 主进程检查工作进程状态的间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+def reuseport_supported():
+    """当前平台是否支持 SO_REUSEPORT"""
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def create_reuseport_socket(host, port, backlog=1024):
+    """创建设置了 SO_REUSEPORT 的监听套接字"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+class _InflightRequests:
+    """统计正在处理的请求数，用于平滑退出时等待请求完成"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.active += 1
+        try:
+            result = self.wsgi_app(environ, start_response)
+        except BaseException:
+            self._done()
+            raise
+        return ClosingIterator(result, self._done)
+
+    def _done(self):
+        with self._lock:
+            self.active -= 1
+
+
+def run_worker(app, graceful_timeout=30.0):
+    """
+    在当前进程中运行一个工作进程
+
+    收到 SIGTERM 后停止接受新连接，等待正在处理的请求完成并发送完响应（最多
+    graceful_timeout 秒）后退出。
+    """
+    from waitress import create_server
+
+    host = app.config["SERVER_HOST"]
+    port = app.config["SERVER_PORT"]
+    warmer = app.extensions.get("cache_warmer")
+    if warmer is not None and app.config.get("CACHE_WARMUP_READINESS_GATE", False):
+        # 预热完成后才开始监听，内核不会把连接分配给仍是冷缓存的进程
+        warmer.wait()
+    sock = create_reuseport_socket(host, port)
+    inflight = _InflightRequests(app)
+    server = create_server(inflight, sockets=[sock], threads=app.config["SERVER_WORKERS"])
+
+    draining = threading.Event()
+
+    def drain():
+        deadline = time.monotonic() + graceful_timeout
+        while time.monotonic() < deadline:
+            # 请求处理完成后，还要等待 waitress 把缓冲区中的响应发送出去
+            pending = any(getattr(channel, "total_outbufs_len", 0) for channel in list(server._map.values()))
+            if inflight.active <= 0 and not pending:
+                break
+            time.sleep(0.05)
+        # 在主线程中触发 SIGINT 处理函数并唤醒事件循环，退出 waitress
+        _thread.interrupt_main()
+        server.pull_trigger()
+
+    def handle_term(signum, frame):
+        if draining.is_set():
+            return
+        draining.set()
+        logging.info(f"工作进程 {os.getpid()} 停止接受新连接，等待请求完成")
+        server.close()
+        threading.Thread(target=drain, name="worker-drain", daemon=True).start()
+
+    def handle_int(signum, frame):
+        # 终端的 Ctrl+C 会同时发给工作进程，由主进程统一发送 SIGTERM 平滑退出
+        if draining.is_set():
+            raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, handle_term)
+    signal.signal(signal.SIGINT, handle_int)
+    logging.info(f"工作进程 {os.getpid()} 已启动: {host}:{port}, 线程数: {app.config['SERVER_WORKERS']}")
+    _notify_ready()
+    server.run()
+    logging.info(f"工作进程 {os.getpid()} 已退出")
+
+
+def _notify_ready():
+    """通知主进程工作进程已开始监听"""
+    fd = os.environ.pop(READY_FD_ENV, None)
+    if fd is None:
+        return
+    try:
+        os.write(int(fd), b"1")
+        os.close(int(fd))
+    except OSError:
+        pass
+
+
+class _Worker:
+    __slots__ = ("process", "generation", "ready", "ready_fd")
+
+    def __init__(self, process, generation, ready_fd):
+        self.process = process
+        self.generation = generation
+        self.ready = False
+        self.ready_fd = ready_fd
+
+    def check_ready(self):
+        """检查工作进程是否已通知开始监听"""
+        if not self.ready and self.ready_fd is not None:
+            readable, _, _ = select.select([self.ready_fd], [], [], 0)
+            if readable:
+                self.ready = os.read(self.ready_fd, 1) == b"1"
+                self.close()
+        return self.ready
+
+    def close(self):
+        if self.ready_fd is not None:
+            os.close(self.ready_fd)
+            self.ready_fd = None
+
+
+class Supervisor:
+    """启动、重启和平滑重新加载工作进程"""
+
+    def __init__(self, command, processes, graceful_timeout=30.0, startup_timeout=STARTUP_TIMEOUT):
+        """
+        初始化主进程
+
+        Args:
+            command: 启动一个工作进程的命令行
+            processes: 工作进程数
+            graceful_timeout: 等待工作进程处理完请求退出的最长时间（秒），超时后强制结束
+            startup_timeout: 平滑重新加载时等待新工作进程开始监听的最长时间（秒）
+        """
+        self.command = command
+        self.processes = processes
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self.generation = 0
+        self.workers = []
+        self._stopping = False
+        self._reload = False
+        self._restart_delay = 0.0
+        self._pending_restarts = []
+
+    def _spawn(self, generation=None):
+        """启动一个工作进程，generation 默认为当前一代"""
+        generation = self.generation if generation is None else generation
+        read_fd, write_fd = os.pipe()
+        env = dict(os.environ, **{READY_FD_ENV: str(write_fd)})
+        try:
+            process = subprocess.Popen(self.command, env=env, pass_fds=(write_fd,))
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+        worker = _Worker(process, generation, read_fd)
+        self.workers.append(worker)
+        logging.info(f"启动工作进程 {process.pid} (第 {generation} 代)")
+        return worker
+
+    def _terminate(self, workers):
+        """让工作进程处理完请求后退出，超时后强制结束"""
+        for worker in workers:
+            if worker.process.poll() is None:
+                worker.process.send_signal(signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        for worker in workers:
+            try:
+                worker.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logging.warning(f"工作进程 {worker.process.pid} 未在 {self.graceful_timeout} 秒内退出，强制结束")
+                worker.process.kill()
+                worker.process.wait()
+            worker.close()
+            if worker in self.workers:
+                self.workers.remove(worker)
+
+    def _handle_reload(self):
+        """启动新一组工作进程，新进程正常运行后再停止旧进程"""
+        self._reload = False
+        old_generation = self.generation
+        self.generation += 1
+        logging.info(f"开始平滑重新加载: 启动第 {self.generation} 代工作进程")
+        new = [self._spawn() for _ in range(self.processes)]
+
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline and not self._stopping:
+            if any(w.process.poll() is not None for w in new) or all(w.check_ready() for w in new):
+                break
+            # 等待期间旧进程仍在处理请求，异常退出时照常重启
+            self._reap(old_generation)
+            time.sleep(POLL_INTERVAL)
+        if not all(w.process.poll() is None and w.check_ready() for w in new):
+            logging.error("新工作进程启动失败，保留当前工作进程")
+            self._terminate(new)
+            self.generation = old_generation
+            return
+
+        self._pending_restarts = []
+        self._terminate([worker for worker in self.workers if worker.generation != self.generation])
+        logging.info(f"平滑重新加载完成: 第 {self.generation} 代工作进程 {[w.process.pid for w in new]}")
+
+    def _reap(self, generation=None):
+        """清理退出的工作进程，generation 代（默认为当前一代）的进程异常退出时安排重启"""
+        generation = self.generation if generation is None else generation
+        now = time.monotonic()
+        for worker in list(self.workers):
+            returncode = worker.process.poll()
+            if returncode is None:
+                continue
+            self.workers.remove(worker)
+            ready = worker.check_ready()
+            worker.close()
+            if worker.generation != generation:
+                continue
+            # 开始监听之前就退出说明可能无法正常启动，逐渐延长重启间隔
+            if not ready:
+                self._restart_delay = min(max(self._restart_delay * 2, 1.0), MAX_RESTART_DELAY)
+            else:
+                self._restart_delay = 0.0
+            logging.warning(f"工作进程 {worker.process.pid} 异常退出 (退出码 {returncode})，"
+                            f"{self._restart_delay:.0f} 秒后重启")
+            self._pending_restarts.append(now + self._restart_delay)
+
+        for restart_at in list(self._pending_restarts):
+            if restart_at <= now:
+                self._pending_restarts.remove(restart_at)
+                self._spawn(generation)
+
+    def _on_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._reload = True
+        else:
+            self._stopping = True
+
+    def run(self):
+        """启动工作进程并持续管理，直到收到 SIGTERM/SIGINT"""
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+            signal.signal(sig, self._on_signal)
+
+        logging.info(f"主进程 {os.getpid()} 启动 {self.processes} 个工作进程")
+        for _ in range(self.processes):
+            self._spawn()
+
+        while not self._stopping:
+            if self._reload:
+                self._handle_reload()
+            self._reap()
+            time.sleep(POLL_INTERVAL)
+
+        logging.info("正在停止所有工作进程...")
+        self._terminate(list(self.workers))
+        logging.info("主进程已退出")
+
+
+def worker_command():
+    """启动一个工作进程的命令行"""
+    return [sys.executable, "-m", "html_hoster", "serve", "--worker"]
+
+
+def effective_processes(processes):
+    """工作进程数，0 表示使用 CPU 核数"""
+    if processes > 0:
+        return processes
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
@@ -0,0 +1,180 @@
+"""
+性能剖析模块 - 按需对所有线程进行采样剖析
+
+采样在独立的后台线程中进行，定时读取所有线程（waitress 请求线程、后台任务线程等）
+当前的调用栈并按折叠格式（collapsed stacks）汇总，结果可以直接交给 flamegraph.pl
+或 speedscope 生成火焰图。请求线程只负责启动剖析和获取结果，不等待采样结束。
+"""
+import os
+import sys
+import time
+import uuid
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+# 线程空闲等待时所在的函数（文件名, 函数名），栈顶为这些函数的样本默认不计入
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+    ("wasyncore.py", "poll"),
+}
+
+# 保留的剖析结果数量
+MAX_RESULTS = 5
+# 超过该数量的不同调用栈合并为一项
+MAX_STACKS = 20000
+# 每个调用栈最多记录的层数
+MAX_DEPTH = 128
+
+
+class ProfilerBusyError(Exception):
+    """已有剖析正在进行"""
+    pass
+
+
+class SamplingProfiler:
+    """在后台线程中定时采样所有线程的调用栈"""
+
+    def __init__(self, duration, interval, include_idle=False):
+        """
+        初始化采样剖析
+
+        Args:
+            duration: 采样时长（秒）
+            interval: 采样间隔（秒）
+            include_idle: 是否计入处于空闲等待的线程
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.duration = duration
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks = Counter()
+        self.samples = 0
+        self.truncated = 0
+        self.sampling_time = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动采样线程"""
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """提前结束采样"""
+        self._stop.set()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+            label = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _is_idle(self, frame):
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if not self.include_idle and self._is_idle(frame):
+                continue
+            frames = []
+            while frame is not None and len(frames) < MAX_DEPTH:
+                frames.append(self._label(frame.f_code))
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            stack = ";".join(reversed(frames))
+            if stack not in self.stacks and len(self.stacks) >= MAX_STACKS:
+                self.truncated += 1
+                stack = "[truncated]"
+            self.stacks[stack] += 1
+        self.samples += 1
+
+    def _run(self):
+        logging.info(f"开始采样剖析 {self.id}: 时长 {self.duration} 秒, 间隔 {self.interval * 1000:.0f} 毫秒")
+        deadline = time.monotonic() + self.duration
+        next_sample = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                start = time.perf_counter()
+                self._sample()
+                self.sampling_time += time.perf_counter() - start
+                # 采样本身耗时超过间隔时跳过错过的采样点，避免占满 CPU
+                next_sample = max(next_sample + self.interval, time.monotonic())
+                self._stop.wait(max(0.0, next_sample - time.monotonic()))
+        except Exception as e:
+            logging.error(f"采样剖析 {self.id} 失败: {e}")
+        finally:
+            self.finished_at = time.time()
+            self._labels.clear()
+            logging.info(f"采样剖析 {self.id} 结束: {self.samples} 次采样, {len(self.stacks)} 个调用栈")
+
+    def collapsed(self):
+        """以折叠格式输出调用栈，每行为“帧;帧;帧 次数”"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        """剖析状态和统计信息"""
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "id": self.id,
+            "status": "running" if self.running else "completed",
+            "duration": self.duration,
+            "interval_ms": round(self.interval * 1000, 3),
+            "include_idle": self.include_idle,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "truncated_samples": self.truncated,
+            # 采样线程占用的时间比例，即剖析本身的开销
+            "overhead": round(self.sampling_time / elapsed, 4) if elapsed else 0.0,
+        }
+
+
+_results = OrderedDict()
+_lock = threading.Lock()
+
+
+def start_profile(duration, interval, include_idle=False):
+    """
+    启动一次采样剖析，同一时间只允许一个剖析
+
+    Raises:
+        ProfilerBusyError: 已有剖析正在进行
+    """
+    with _lock:
+        if any(profile.running for profile in _results.values()):
+            raise ProfilerBusyError("已有剖析正在进行")
+        profile = SamplingProfiler(duration, interval, include_idle)
+        _results[profile.id] = profile
+        while len(_results) > MAX_RESULTS:
+            _results.popitem(last=False)
+    profile.start()
+    return profile
+
+
+def get_profile(profile_id):
+    """获取剖析结果，不存在时返回 None"""
+    with _lock:
+        return _results.get(profile_id)
@@ -0,0 +1,148 @@
+"""
+限流模块 - 基于令牌桶的请求准入控制
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+
+class TokenBucket:
+    """令牌桶，容量为 capacity，每秒补充 rate 个令牌"""
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """
+        尝试取出令牌
+
+        返回:
+            float: 0 表示成功，否则为需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            if self.rate <= 0:
+                return float("inf")
+            return (tokens - self._tokens) / self.rate
+
+    def refund(self, tokens=1):
+        """归还令牌（请求最终未被处理时）"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+
+class KeyedRateLimiter:
+    """按键（如客户端 IP）划分的令牌桶，最久未使用的桶在超过 max_keys 时被淘汰"""
+
+    def __init__(self, capacity, rate, max_keys=10000):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bucket(self, key):
+        """获取（或创建）键对应的令牌桶"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.capacity, self.rate)
+                self._buckets[key] = bucket
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+
+class RateLimitExceeded(Exception):
+    """请求超过限流"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"请求过于频繁，请 {int(retry_after) + 1} 秒后再试")
+        self.retry_after = retry_after
+
+
+class AuthRateLimiter:
+    """登录和注册的准入控制：每个客户端 IP 一个令牌桶，另有一个全局令牌桶"""
+
+    def __init__(self, per_ip_burst, per_ip_rate, global_burst, global_rate):
+        self.per_ip = KeyedRateLimiter(per_ip_burst, per_ip_rate)
+        self.global_bucket = TokenBucket(global_burst, global_rate)
+
+    def acquire(self, client_ip):
+        """
+        为一次请求取出令牌
+
+        Raises:
+            RateLimitExceeded: 客户端或全局令牌不足
+        """
+        ip_bucket = self.per_ip.bucket(client_ip)
+        wait = ip_bucket.try_acquire()
+        if wait:
+            logging.warning(f"客户端 {client_ip} 的认证请求超过限流")
+            raise RateLimitExceeded(wait)
+
+        wait = self.global_bucket.try_acquire()
+        if wait:
+            # 全局限流时不消耗客户端的令牌
+            ip_bucket.refund()
+            logging.warning("认证请求超过全局限流")
+            raise RateLimitExceeded(wait)
+
+
+def init_rate_limits(app):
+    """根据配置创建认证请求的限流器"""
+    app.extensions["auth_rate_limiter"] = AuthRateLimiter(
+        per_ip_burst=app.config.get("AUTH_RATE_LIMIT_PER_IP_BURST", 10),
+        per_ip_rate=app.config.get("AUTH_RATE_LIMIT_PER_IP_PER_MINUTE", 10) / 60.0,
+        global_burst=app.config.get("AUTH_RATE_LIMIT_GLOBAL_BURST", 30),
+        global_rate=app.config.get("AUTH_RATE_LIMIT_GLOBAL_PER_SECOND", 5),
+    )
+
+    # 部署在反向代理之后时，按受信任的代理层数从 X-Forwarded-For 获取客户端 IP，
+    # 否则所有请求共用代理的 IP 和同一个令牌桶
+    proxy_count = app.config.get("TRUSTED_PROXY_COUNT", 0)
+    if proxy_count > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count)
+        logging.info(f"按 {proxy_count} 层受信任的反向代理读取 X-Forwarded-For")
+
+
+def auth_rate_limited(on_limited):
+    """
+    为认证视图的 POST 请求添加限流
+
+    Args:
+        on_limited: 超过限流时调用，参数为 RateLimitExceeded，返回响应
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limiter = current_app.extensions.get("auth_rate_limiter")
+            if limiter is not None and request.method == "POST":
+                try:
+                    limiter.acquire(request.remote_addr or "unknown")
+                except RateLimitExceeded as e:
+                    response = current_app.make_response(on_limited(e))
+                    response.headers["Retry-After"] = str(int(e.retry_after) + 1)
+                    return response
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
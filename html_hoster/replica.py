@@ -0,0 +1,229 @@
+"""
+只读副本模块 - 将只读请求的查询路由到数据库只读副本
+
+副本以 Flask-SQLAlchemy 绑定（replica_0、replica_1 ...）的形式注册，由后台线程定期检查连通性和复制延迟。
+标记为只读的视图在没有写操作时使用健康的副本，用户刚提交写操作后的一段时间内固定使用主库，
+保证能读到自己的修改；副本延迟过大或连接失败时自动回退到主库。
+"""
+import time
+import logging
+import threading
+from functools import wraps
+
+from flask import current_app, has_app_context, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+# Flask 会话中记录固定使用主库截止时间的键
+PRIMARY_UNTIL_KEY = "db_primary_until"
+# 会话信息中记录当前事务所用副本的键
+REPLICA_ENGINE_KEY = "replica_engine"
+
+
+class RoutingSession(FlaskSession):
+    """在启用副本读取时将只读查询路由到副本的会话"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("use_replica") and not self._flushing:
+            # 写语句始终发送到主库
+            if clause is None or not getattr(clause, "is_dml", False):
+                # 同一事务内的查询使用同一个副本，保证读到一致的数据
+                engine = self.info.get(REPLICA_ENGINE_KEY)
+                if engine is None:
+                    router = get_replica_router()
+                    engine = router.choose() if router else None
+                    if engine is not None:
+                        self.info[REPLICA_ENGINE_KEY] = engine
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _release_replica(session, transaction):
+    """事务结束（提交、回滚或关闭会话）后，下一个事务重新选择副本"""
+    if transaction.parent is None:
+        session.info.pop(REPLICA_ENGINE_KEY, None)
+
+
+class ReplicaRouter:
+    """只读副本选择和健康检查"""
+
+    def __init__(self, engines, max_lag=5.0, check_interval=5.0):
+        """
+        初始化副本路由
+
+        参数:
+            engines: 副本绑定名 -> Engine
+            max_lag: 允许的最大复制延迟（秒），超过时不再使用该副本
+            check_interval: 健康检查间隔（秒）
+        """
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._healthy = set(engines)
+        self._next = 0
+        self._lock = threading.Lock()
+
+        for key, engine in engines.items():
+            event.listen(engine, "handle_error", self._on_error(key))
+
+        self._thread = threading.Thread(target=self._check_loop, name="db-replica-check", daemon=True)
+        self._thread.start()
+
+    def choose(self):
+        """轮询选择一个健康的副本，没有可用副本时返回 None"""
+        with self._lock:
+            healthy = sorted(self._healthy)
+            if not healthy:
+                return None
+            self._next = (self._next + 1) % len(healthy)
+            return self.engines[healthy[self._next]]
+
+    def mark_down(self, key, reason):
+        """将副本标记为不可用，直到下一次健康检查通过"""
+        with self._lock:
+            if key not in self._healthy:
+                return
+            self._healthy.discard(key)
+        logging.warning(f"数据库副本 {key} 不可用，回退到主库: {reason}")
+
+    def mark_up(self, key):
+        """将副本标记为可用"""
+        with self._lock:
+            if key in self._healthy:
+                return
+            self._healthy.add(key)
+        logging.info(f"数据库副本 {key} 恢复可用")
+
+    def _on_error(self, key):
+        """副本连接出错时立即将其标记为不可用"""
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+                self.mark_down(key, context.original_exception)
+        return handle_error
+
+    def measure_lag(self, engine):
+        """获取副本的复制延迟（秒）"""
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                return conn.execute(text(
+                    "SELECT CASE WHEN pg_is_in_recovery() "
+                    "THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                    "ELSE 0 END"
+                )).scalar() or 0
+
+            if engine.dialect.name == "mysql":
+                try:
+                    row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+                except (OperationalError, ProgrammingError):
+                    # MySQL 8.0.22 之前的版本
+                    row = conn.execute(text("SHOW SLAVE STATUS")).mappings().first()
+                if row is None:
+                    return 0
+                lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+                # 复制线程停止时延迟为 NULL
+                return float("inf") if lag is None else lag
+
+            conn.execute(text("SELECT 1"))
+            return 0
+
+    def check(self):
+        """检查所有副本的连通性和复制延迟"""
+        for key, engine in self.engines.items():
+            try:
+                lag = float(self.measure_lag(engine))
+            except Exception as e:
+                self.mark_down(key, e)
+                continue
+
+            if lag > self.max_lag:
+                self.mark_down(key, f"复制延迟 {lag:.1f} 秒超过 {self.max_lag} 秒")
+            else:
+                self.mark_up(key)
+
+    def _check_loop(self):
+        """健康检查线程"""
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+
+def get_replica_router():
+    """获取当前应用的副本路由，未配置副本时返回 None"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("db_replicas")
+
+
+def replica_read(view):
+    """
+    将视图标记为只读，视图中的查询优先使用副本
+
+    当前用户最近提交过写操作时仍使用主库。
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        from html_hoster.database import db
+
+        if get_replica_router() is None or flask_session.get(PRIMARY_UNTIL_KEY, 0) > time.time():
+            return view(*args, **kwargs)
+
+        db.session.info["use_replica"] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            db.session.info.pop("use_replica", None)
+    return wrapper
+
+
+def _record_write(session, flush_context):
+    """会话中发生写操作时记录下来"""
+    if session.new or session.dirty or session.deleted:
+        session.info["has_writes"] = True
+
+
+def _stick_to_primary(session):
+    """写事务提交后，当前用户在一段时间内固定使用主库"""
+    if not session.info.pop("has_writes", False):
+        return
+    if not has_request_context() or get_replica_router() is None:
+        return
+    sticky_seconds = current_app.config.get("DB_REPLICA_STICKY_SECONDS", 10)
+    flask_session[PRIMARY_UNTIL_KEY] = time.time() + sticky_seconds
+
+
+def _discard_write(session):
+    """事务回滚时丢弃写操作记录"""
+    session.info.pop("has_writes", None)
+
+
+def init_replicas(app, db):
+    """根据配置注册只读副本"""
+    replica_urls = [url.strip() for url in app.config.get("DB_REPLICA_URLS", "").split(",") if url.strip()]
+    if not replica_urls:
+        return None
+
+    if app.config["DB_TYPE"] == "sqlite":
+        logging.warning("SQLite 不支持只读副本，忽略 DB_REPLICA_URLS")
+        return None
+
+    with app.app_context():
+        engines = {key: engine for key, engine in db.engines.items() if isinstance(key, str) and key.startswith("replica_")}
+
+    router = ReplicaRouter(
+        engines,
+        max_lag=app.config.get("DB_REPLICA_MAX_LAG", 5.0),
+        check_interval=app.config.get("DB_REPLICA_CHECK_INTERVAL", 5.0),
+    )
+    app.extensions["db_replicas"] = router
+
+    if not event.contains(Session, "after_flush", _record_write):
+        event.listen(Session, "after_flush", _record_write)
+        event.listen(Session, "after_commit", _stick_to_primary)
+        event.listen(Session, "after_rollback", _discard_write)
+
+    logging.info(f"已启用 {len(engines)} 个数据库只读副本")
+    return router
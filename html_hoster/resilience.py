@@ -0,0 +1,215 @@
+"""
+弹性模块 - 为远程存储读取提供延迟统计、对冲请求、熔断和降级缓存
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class StorageUnavailableError(Exception):
+    """存储后端不可用（熔断中或读取超时）"""
+    pass
+
+
+class LatencyTracker:
+    """记录最近若干次成功请求的耗时，用于计算 p95 延迟"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._p95 = None
+        self._dirty = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """记录一次请求耗时（秒）"""
+        with self._lock:
+            self._samples.append(seconds)
+            self._dirty += 1
+
+    def p95(self):
+        """
+        获取 p95 延迟（秒），样本不足时返回 None
+
+        为降低开销，每累计一定数量的新样本才重新排序计算。
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            if self._p95 is None or self._dirty >= self.min_samples:
+                ordered = sorted(self._samples)
+                self._p95 = ordered[int(len(ordered) * 0.95) - 1]
+                self._dirty = 0
+            return self._p95
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败达到阈值后进入打开状态，在冷却时间内直接拒绝请求；冷却结束后进入半开状态，
+    只放行一个试探请求，成功则关闭熔断，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """判断是否允许发起请求"""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        """记录一次成功请求"""
+        with self._lock:
+            self._failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                logging.info("存储后端恢复，关闭熔断")
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        """记录一次失败请求"""
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"存储后端连续失败 {self._failures} 次，打开熔断 {self.reset_timeout} 秒")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class FallbackCache:
+    """按字节数限制大小的 LRU 缓存，保存最近成功读取的内容，在后端不可用时降级使用"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, key, content, content_type=None):
+        """缓存内容，过大的内容不缓存"""
+        if content is None or len(content) > self.max_bytes // 8:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old[0])
+            self._items[key] = (content, content_type)
+            self._total_bytes += len(content)
+            while self._total_bytes > self.max_bytes and self._items:
+                _, (evicted, _) = self._items.popitem(last=False)
+                self._total_bytes -= len(evicted)
+
+    def get(self, key):
+        """获取缓存内容，不存在时返回 None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+
+class BackendHealth:
+    """单个存储后端的延迟统计、熔断器和降级缓存"""
+
+    def __init__(self, failure_threshold, reset_timeout, fallback_cache_bytes):
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.fallback = FallbackCache(fallback_cache_bytes)
+
+
+# 存储后端状态: 后端标识 -> BackendHealth
+_backend_health = {}
+_backend_health_lock = threading.Lock()
+
+# 执行远程读取的共享线程池
+_io_executor = None
+_io_executor_lock = threading.Lock()
+
+
+def get_backend_health(key, failure_threshold=5, reset_timeout=30.0, fallback_cache_bytes=64 * 1024 * 1024):
+    """获取（或创建）存储后端的状态，同一后端在所有请求间共享"""
+    with _backend_health_lock:
+        health = _backend_health.get(key)
+        if health is None:
+            health = BackendHealth(failure_threshold, reset_timeout, fallback_cache_bytes)
+            _backend_health[key] = health
+        return health
+
+
+def get_io_executor(max_workers=16):
+    """获取执行远程读取的共享线程池"""
+    global _io_executor
+    with _io_executor_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="storage-io")
+        return _io_executor
+
+
+def hedged_call(executor, fn, hedge_delay, timeout):
+    """
+    执行带对冲的调用
+
+    先发起一次调用，若在 hedge_delay 秒内未完成则再发起一次相同的调用，返回最先成功的结果。
+    调用方最多等待 timeout 秒，超时后抛出 TimeoutError，未完成的调用继续在线程池中运行，
+    不会占用请求线程。
+
+    Args:
+        executor: 线程池
+        fn: 无参数的调用
+        hedge_delay: 发起对冲调用前的等待时间（秒），为 None 时不对冲
+        timeout: 总超时时间（秒）
+    """
+    deadline = time.monotonic() + timeout
+    first = executor.submit(fn)
+
+    wait_time = timeout if hedge_delay is None else min(hedge_delay, timeout)
+    done, _ = wait([first], timeout=wait_time)
+    if done:
+        return first.result()
+
+    pending = {first}
+    if hedge_delay is not None:
+        pending.add(executor.submit(fn))
+
+    error = None
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+
+    if error is not None and not pending:
+        raise error
+    raise TimeoutError(f"远程读取超过 {timeout} 秒未完成")
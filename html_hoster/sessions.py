@@ -0,0 +1,371 @@
+"""
+会话模块 - 服务端会话存储
+
+Cookie 中只保存签名后的会话ID，会话数据保存在服务端（内存、SQLite 或文件系统）。
+会话数据在第一次访问时才从存储中加载，不使用会话的请求不会读取存储；
+会话内容没有变化时也不会写回存储。
+"""
+import os
+import re
+import time
+import uuid
+import sqlite3
+import secrets
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature
+from werkzeug.datastructures import CallbackDict
+
+# 会话ID格式（secrets.token_urlsafe 生成的字符）
+SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{32,64}$")
+
+
+class SessionStore(ABC):
+    """会话存储抽象基类，保存序列化后的会话数据"""
+
+    # 清理过期会话的间隔（秒）
+    cleanup_interval = 300
+
+    def __init__(self):
+        self._last_cleanup = time.monotonic()
+
+    @abstractmethod
+    def get(self, sid, ttl=None):
+        """
+        读取会话数据，不存在或已过期时返回 None
+
+        Args:
+            sid: 会话ID
+            ttl: 设置时把会话的过期时间延长为读取后 ttl 秒（滑动过期）
+        """
+        pass
+
+    @abstractmethod
+    def set(self, sid, data, ttl):
+        """写入会话数据，ttl 秒后过期"""
+        pass
+
+    @abstractmethod
+    def delete(self, sid):
+        """删除会话"""
+        pass
+
+    def cleanup(self):
+        """清理过期会话"""
+        pass
+
+    def maybe_cleanup(self):
+        """距离上次清理超过 cleanup_interval 时清理过期会话"""
+        now = time.monotonic()
+        if now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        try:
+            self.cleanup()
+        except Exception as e:
+            logging.warning(f"清理过期会话失败: {e}")
+
+
+class MemorySessionStore(SessionStore):
+    """进程内存会话存储，多进程部署时各进程的会话互不共享"""
+
+    def __init__(self):
+        super().__init__()
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid, ttl=None):
+        now = time.time()
+        with self._lock:
+            item = self._items.get(sid)
+            if item is None or item[0] < now:
+                return None
+            if ttl is not None:
+                self._items[sid] = (now + ttl, item[1])
+        return item[1]
+
+    def set(self, sid, data, ttl):
+        with self._lock:
+            self._items[sid] = (time.time() + ttl, data)
+        self.maybe_cleanup()
+
+    def delete(self, sid):
+        with self._lock:
+            self._items.pop(sid, None)
+
+    def cleanup(self):
+        now = time.time()
+        with self._lock:
+            for sid in [sid for sid, (expires_at, _) in self._items.items() if expires_at < now]:
+                del self._items[sid]
+
+
+class SqliteSessionStore(SessionStore):
+    """SQLite 会话存储，每个线程使用独立的连接"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = str(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid, ttl=None):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at >= ?", (sid, now)
+        ).fetchone()
+        if row and ttl is not None:
+            conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (now + ttl, sid))
+        return row[0] if row else None
+
+    def set(self, sid, data, ttl):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+            (sid, data, time.time() + ttl),
+        )
+        self.maybe_cleanup()
+
+    def delete(self, sid):
+        self._connect().execute("DELETE FROM sessions WHERE id = ?", (sid,))
+
+    def cleanup(self):
+        self._connect().execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+
+
+class FilesystemSessionStore(SessionStore):
+    """
+    文件系统会话存储，每个会话一个文件
+
+    文件的修改时间设置为会话的过期时间，检查过期和清理时只需要 stat。
+    """
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = str(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def get(self, sid, ttl=None):
+        path = self._path(sid)
+        now = time.time()
+        try:
+            if os.stat(path).st_mtime < now:
+                return None
+            with open(path, "rb") as f:
+                data = f.read()
+            if ttl is not None:
+                os.utime(path, (now + ttl, now + ttl))
+            return data
+        except FileNotFoundError:
+            return None
+
+    def set(self, sid, data, ttl):
+        path = self._path(sid)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            expires_at = time.time() + ttl
+            os.utime(tmp_path, (expires_at, expires_at))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.maybe_cleanup()
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self):
+        now = time.time()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < now:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """服务端会话，数据在第一次访问时才从存储中加载"""
+
+    def __init__(self, sid, loader=None, new=False):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(None, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.accessed = False
+        self.stale_sid = None
+        self._loader = loader
+
+    @property
+    def loaded(self):
+        return self._loader is None
+
+    def _ensure_loaded(self):
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            data = loader()
+            if data:
+                dict.update(self, data)
+            self.accessed = True
+
+    def regenerate(self):
+        """
+        更换会话ID，保留会话数据
+
+        登录后调用，避免会话固定攻击。旧的会话在保存时删除。
+        """
+        self._ensure_loaded()
+        if not self.new:
+            self.stale_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+def _lazy(name):
+    method = getattr(CallbackDict, name)
+
+    def wrapper(self, *args, **kwargs):
+        self._ensure_loaded()
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+for _name in (
+    "__getitem__", "__contains__", "__iter__", "__len__", "__bool__", "__repr__",
+    "get", "keys", "values", "items", "copy",
+    "__setitem__", "__delitem__", "pop", "popitem", "setdefault", "update", "clear",
+):
+    if hasattr(CallbackDict, _name):
+        setattr(ServerSession, _name, _lazy(_name))
+
+
+class ServerSessionInterface(SessionInterface):
+    """使用服务端存储的 Flask 会话接口"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="html-hoster-session")
+
+    def _load(self, sid, ttl):
+        data = self.store.get(sid, ttl)
+        if data is None:
+            return None
+        try:
+            return self.serializer.loads(data.decode("utf-8") if isinstance(data, bytes) else data)
+        except Exception as e:
+            logging.warning(f"会话数据无法解析，已丢弃: {e}")
+            return None
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode("ascii")
+            except BadSignature:
+                sid = None
+            if sid and SESSION_ID_PATTERN.match(sid):
+                # 读取会话时延长过期时间，活跃用户的会话不会在使用中过期
+                ttl = int(app.permanent_session_lifetime.total_seconds())
+                return ServerSession(sid, loader=lambda: self._load(sid, ttl))
+        return ServerSession(secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.stale_sid:
+            self.store.delete(session.stale_sid)
+
+        # 会话未被修改时不需要写回存储
+        if not session.modified:
+            return
+
+        if not session:
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       samesite=samesite, httponly=httponly)
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        self.store.set(session.sid, self.serializer.dumps(dict(session)).encode("utf-8"), ttl)
+
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid).decode("ascii"),
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
+
+
+def create_session_store(app):
+    """根据配置创建会话存储，SESSION_TYPE=cookie 时返回 None"""
+    session_type = app.config.get("SESSION_TYPE", "cookie")
+    if session_type == "memory":
+        return MemorySessionStore()
+    if session_type == "sqlite":
+        return SqliteSessionStore(app.config["SESSION_SQLITE_PATH"])
+    if session_type == "filesystem":
+        return FilesystemSessionStore(app.config["SESSION_FILE_DIR"])
+    return None
+
+
+def init_sessions(app):
+    """启用服务端会话"""
+    store = create_session_store(app)
+    if store is None:
+        logging.info("使用签名 Cookie 会话")
+        return None
+    app.session_interface = ServerSessionInterface(store)
+    logging.info(f"使用服务端会话存储: {app.config['SESSION_TYPE']}")
+    return store
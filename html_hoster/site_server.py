@@ -0,0 +1,306 @@
+"""
+异步站点文件服务 - serve-sites 子命令启动的 asyncio HTTP 服务器
+
+专门提供 /site/<站点ID>/<路径> 的访问，管理页面仍由 Flask（waitress）进程提供。
+连接由事件循环处理，空闲的长连接不占用线程；本地文件通过 sendfile 直接从文件发送到
+套接字。打开文件和远程存储读取、站点缓存未命中时的数据库查询，以及未发布站点、Range
+请求等需要 Flask 处理的请求，在固定大小的线程池中执行，与快速通道共用站点缓存、存储服务实例和
+错误页面。
+"""
+import io
+import sys
+import time
+import signal
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import unquote_to_bytes
+
+from werkzeug.http import HTTP_STATUS_CODES
+
+from html_hoster.cache import site_cache
+from html_hoster.fastpath import SiteFastPath, SITE_PREFIX, SITE_ROUTE, parse_site_path
+from html_hoster.logs import log_event
+from html_hoster.metrics import begin_request, end_request
+from html_hoster.warmup import record_hit
+
+# 请求行和请求头的最大长度
+MAX_HEADER_BYTES = 64 * 1024
+# GET/HEAD 请求允许携带并丢弃的最大请求体
+MAX_DISCARD_BODY = 64 * 1024
+
+
+class _SendfileBody:
+    """替代 wsgi.file_wrapper，保留文件对象，由事件循环通过 sendfile 发送"""
+
+    def __init__(self, filelike, block_size=None):
+        self.filelike = filelike
+
+    def close(self):
+        self.filelike.close()
+
+
+class SiteServer:
+    """基于 asyncio 的站点文件 HTTP/1.1 服务器，支持长连接"""
+
+    def __init__(self, app, threads=32, max_connections=10000, keepalive_timeout=15.0):
+        """
+        初始化站点文件服务器
+
+        Args:
+            app: Flask应用实例
+            threads: 执行阻塞操作（远程存储、数据库、Flask 回退）的线程数
+            max_connections: 最大并发连接数
+            keepalive_timeout: 长连接空闲超时（秒），也是读取请求头的超时
+        """
+        self.app = app
+        wsgi_app = app.wsgi_app
+        # 回退到 Flask 时跳过快速通道，避免重复尝试
+        self.flask_app = wsgi_app.wsgi_app if isinstance(wsgi_app, SiteFastPath) else wsgi_app
+        self.fast_path = SiteFastPath(app, self.flask_app)
+        self.metrics_enabled = app.config.get("METRICS_ENABLED", True)
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="site-server")
+        self.connections = 0
+        self._server = None
+        self._date = (0, "")
+
+    async def serve(self, host, port):
+        """启动服务器，直到收到 SIGINT/SIGTERM"""
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(self.executor)
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+
+        self._server = await asyncio.start_server(
+            self._handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=2048,
+        )
+        logging.info(f"站点文件服务已启动: {host}:{port}, 线程数: {self.executor._max_workers}, "
+                     f"最大连接数: {self.max_connections}")
+        await stop.wait()
+
+        logging.info("正在停止站点文件服务...")
+        self._server.close()
+        try:
+            # 等待处理中的请求完成，空闲的长连接在超时后关闭
+            await asyncio.wait_for(self._server.wait_closed(), self.keepalive_timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.executor.shutdown(wait=False)
+        logging.info("站点文件服务已停止")
+
+    async def _handle_connection(self, reader, writer):
+        if self.connections >= self.max_connections:
+            writer.close()
+            return
+        self.connections += 1
+        peer = writer.get_extra_info("peername")
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+                except asyncio.LimitOverrunError:
+                    await self._send_error(writer, 431, keep_alive=False)
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                parsed = _parse_head(head, peer)
+                if parsed is None:
+                    await self._send_error(writer, 400, keep_alive=False)
+                    break
+                environ, keep_alive = parsed
+                environ["SERVER_PORT"] = str(writer.get_extra_info("sockname")[1])
+
+                if not await self._discard_body(reader, environ):
+                    await self._send_error(writer, 400, keep_alive=False)
+                    break
+                keep_alive = await self._handle_request(environ, writer, keep_alive)
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logging.error(f"站点文件服务处理连接失败: {e}")
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _discard_body(self, reader, environ):
+        """站点文件只接受 GET/HEAD，丢弃请求体；无法确定请求体长度时返回 False"""
+        if "HTTP_TRANSFER_ENCODING" in environ:
+            return False
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return False
+        if length < 0 or length > MAX_DISCARD_BODY:
+            return False
+        if length:
+            await reader.readexactly(length)
+        return True
+
+    async def _handle_request(self, environ, writer, keep_alive):
+        """处理一个请求，返回连接是否可以继续使用"""
+        method = environ["REQUEST_METHOD"]
+        path = environ["PATH_INFO"]
+        if not path.startswith(SITE_PREFIX):
+            await self._send_error(writer, 404, keep_alive)
+            return keep_alive
+        if method != "GET" and method != "HEAD":
+            await self._send_error(writer, 405, keep_alive, [("Allow", "GET, HEAD")])
+            return keep_alive
+
+        loop = asyncio.get_running_loop()
+        if self.metrics_enabled:
+            begin_request()
+        result = None
+        parsed = parse_site_path(path)
+        if parsed is not None:
+            site_id, filename = parsed
+            try:
+                site = site_cache.get(site_id)
+                if site is None:
+                    site = await loop.run_in_executor(None, self.fast_path.fetch_site, site_id)
+                if site is not None and site.is_published:
+                    environ["wsgi.file_wrapper"] = _SendfileBody
+                    # stat、open 和错误页面渲染都可能阻塞（例如网络文件系统），在线程池中执行，
+                    # 文件内容仍由事件循环通过 sendfile 发送
+                    result = await loop.run_in_executor(
+                        None, self.fast_path.serve_file, environ, method, site_id, filename,
+                    )
+            except Exception as e:
+                logging.debug(f"站点文件服务处理失败，交给 Flask 处理 {path}: {e}")
+                result = None
+
+        if result is None:
+            status, headers, body = await loop.run_in_executor(None, self._call_flask, environ)
+            await self._send(writer, status, headers, body, keep_alive)
+            return keep_alive
+
+        status, headers, body, site_id, filename, size = result
+        await self._send(writer, status, headers, body, keep_alive)
+        if self.metrics_enabled:
+            end_request("site", SITE_ROUTE, method, status[:3])
+        log_event("site_file", "提供站点文件: %s/%s", site_id, filename,
+                  site_id=site_id, path=filename, status=int(status[:3]), bytes=size)
+        record_hit(site_id, filename, int(status[:3]))
+        return keep_alive
+
+    def _call_flask(self, environ):
+        """在线程池中调用 Flask 应用，返回完整的响应"""
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        environ.pop("wsgi.file_wrapper", None)
+        result = self.flask_app(environ, start_response)
+        try:
+            body = b"".join(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        status, headers = response
+        if environ["REQUEST_METHOD"] != "HEAD" and not any(k.lower() == "content-length" for k, _ in headers):
+            headers = headers + [("Content-Length", str(len(body)))]
+        return status, headers, [body] if body else []
+
+    def _http_date(self):
+        now = int(time.time())
+        if self._date[0] != now:
+            self._date = (now, formatdate(now, usegmt=True))
+        return self._date[1]
+
+    async def _send(self, writer, status, headers, body, keep_alive):
+        lines = [f"HTTP/1.1 {status}", f"Date: {self._http_date()}", "Server: html-hoster"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+
+        if isinstance(body, _SendfileBody):
+            try:
+                await asyncio.get_running_loop().sendfile(writer.transport, body.filelike)
+            finally:
+                body.close()
+        else:
+            for chunk in body:
+                writer.write(chunk)
+        await writer.drain()
+
+    async def _send_error(self, writer, code, keep_alive, headers=None):
+        message = HTTP_STATUS_CODES.get(code, "Error")
+        body = f"{code} {message}\n".encode()
+        headers = [("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", str(len(body)))] + (headers or [])
+        await self._send(writer, f"{code} {message.upper()}", headers, [body], keep_alive)
+
+
+def _parse_head(head, peer):
+    """
+    解析请求行和请求头，生成 WSGI 环境
+
+    返回:
+        tuple: (environ, 是否保持连接)，请求格式错误时返回 None
+    """
+    lines = head[:-4].decode("latin-1").split("\r\n")
+    parts = lines[0].split(" ")
+    if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+        return None
+    method, target, version = parts
+    path, _, query = target.partition("?")
+
+    environ = {
+        "REQUEST_METHOD": method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": unquote_to_bytes(path).decode("latin-1"),
+        "QUERY_STRING": query,
+        "REQUEST_URI": target,
+        "SERVER_NAME": "localhost",
+        "SERVER_PROTOCOL": version,
+        "REMOTE_ADDR": peer[0] if peer else "",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if not sep:
+            return None
+        key = name.strip().upper().replace("-", "_")
+        value = value.strip()
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = value
+            continue
+        key = "HTTP_" + key
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+
+    host = environ.get("HTTP_HOST")
+    if host:
+        environ["SERVER_NAME"] = host.rsplit(":", 1)[0]
+
+    connection = environ.get("HTTP_CONNECTION", "").lower()
+    if version == "HTTP/1.0":
+        keep_alive = "keep-alive" in connection
+    else:
+        keep_alive = "close" not in connection
+    return environ, keep_alive
+
+
+def run_site_server(app):
+    """按配置启动站点文件服务，阻塞直到收到停止信号"""
+    server = SiteServer(
+        app,
+        threads=app.config.get("SITE_SERVER_THREADS", 32),
+        max_connections=app.config.get("SITE_SERVER_MAX_CONNECTIONS", 10000),
+        keepalive_timeout=app.config.get("SITE_SERVER_KEEPALIVE_TIMEOUT", 15),
+    )
+    asyncio.run(server.serve(app.config["SITE_SERVER_HOST"], app.config["SITE_SERVER_PORT"]))
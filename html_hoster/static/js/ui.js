@@ -321,122 +321,193 @@ document.addEventListener('DOMContentLoaded', function() {
         return new bootstrap.Tooltip(tooltipTriggerEl);
     });
     
-    // 查找所有处于 pending 状态的站点
-    const pendingSites = document.querySelectorAll('tr[data-status="pending"]');
-    
-    // 如果有处于 pending 状态的站点，开始轮询
-    if (pendingSites.length > 0) {
-        pendingSites.forEach(site => {
-            const siteId = site.getAttribute('data-site-id');
-            if (siteId) {
-                pollSiteStatus(siteId);
-            }
-        });
-    }
+    // 查找所有处于 pending 状态的站点，通过一个轮询器批量查询
+    document.querySelectorAll('tr[data-status="pending"]').forEach(site => {
+        const siteId = site.getAttribute('data-site-id');
+        if (siteId) {
+            siteStatusPoller.add(siteId);
+        }
+    });
 });
 
-// 轮询站点状态
-function pollSiteStatus(siteId) {
-    const pollInterval = 3000; // 3秒轮询一次
-    const maxAttempts = 60; // 最多轮询60次（3分钟）
-    let attempts = 0;
-    
-    const statusCell = document.querySelector(`tr[data-site-id="${siteId}"] td:nth-child(4)`);
-    const actionsCell = document.querySelector(`tr[data-site-id="${siteId}"] td:nth-child(5)`);
-    
-    if (!statusCell || !actionsCell) return;
+// 批量轮询站点状态，状态没有变化时逐渐延长间隔，有变化时恢复最短间隔
+const siteStatusPoller = {
+    minInterval: 1000,     // 最短轮询间隔 1 秒
+    maxInterval: 15000,    // 最长轮询间隔 15 秒
+    backoff: 1.5,          // 状态未变化时间隔的增长倍数
+    timeout: 180000,       // 单个站点最多轮询 3 分钟
+    batchSize: 100,        // 单次请求最多查询的站点数量（与服务端限制一致）
+    
+    pending: new Map(),    // 站点ID -> 开始轮询的时间
+    etags: new Map(),      // 请求 URL -> 上次响应的 ETag
+    interval: 1000,
+    timer: null,
+    
+    // 添加需要轮询的站点
+    add(siteId) {
+        if (!this.pending.has(siteId)) {
+            this.pending.set(siteId, Date.now());
+        }
+        this.interval = this.minInterval;
+        this.schedule();
+    },
+    
+    schedule() {
+        if (this.timer !== null || this.pending.size === 0) return;
+        this.timer = setTimeout(() => {
+            this.timer = null;
+            this.poll();
+        }, this.interval);
+    },
+    
+    // 查询一批站点状态，状态未变化（304）时返回 null
+    fetchBatch(ids) {
+        const url = `/api/sites/status?ids=${ids.map(encodeURIComponent).join(',')}`;
+        const headers = {};
+        if (this.etags.has(url)) {
+            headers['If-None-Match'] = this.etags.get(url);
+        }
+        return fetch(url, { headers: headers, cache: 'no-store' })
+            .then(response => {
+                if (response.status === 304) return null;
+                const etag = response.headers.get('ETag');
+                if (etag) {
+                    this.etags.set(url, etag);
+                }
+                return response.json();
+            });
+    },
     
-    const interval = setInterval(() => {
-        attempts++;
+    poll() {
+        // 页面不可见时暂停，重新可见时再查询
+        if (document.hidden) {
+            document.addEventListener('visibilitychange', () => this.schedule(), { once: true });
+            return;
+        }
         
-        fetch(`/api/site/${siteId}/status`)
-            .then(response => response.json())
-            .then(data => {
-                if (data.success) {
-                    const site = data.data;
-                    
-                    // 更新状态单元格
-                    if (site.status === 'completed') {
-                        statusCell.innerHTML = `
-                            <div class="form-check form-switch">
-                                <input class="form-check-input toggle-publish-status" type="checkbox" role="switch" 
-                                       id="publish-status-${site.id}" 
-                                       data-site-id="${site.id}" 
-                                       ${site.is_published ? 'checked' : ''}>
-                                <label class="form-check-label" for="publish-status-${site.id}">
-                                    <span class="publish-status-label ${site.is_published ? 'text-success' : 'text-secondary'}">
-                                        ${site.is_published ? '已发布' : '未发布'}
-                                    </span>
-                                </label>
-                            </div>
-                        `;
-                        
-                        // 更新操作单元格，添加查看和预览按钮
-                        actionsCell.innerHTML = `
-                            <div class="btn-group btn-group-sm">
-                                <a href="${site.oss_url}" target="_blank" class="btn btn-outline-primary">
-                                    <i class="bi bi-eye"></i> 查看
-                                </a>
-                                <button class="btn btn-outline-info preview-site-btn" data-site-id="${site.id}" data-site-url="${site.oss_url}">
-                                    <i class="bi bi-window"></i> 预览
-                                </button>
-                                <button class="btn btn-outline-secondary rename-site-btn" data-site-id="${site.id}" data-site-name="${site.name}">
-                                    <i class="bi bi-pencil"></i> 重命名
-                                </button>
-                                <button class="btn btn-outline-danger delete-site-btn" data-site-id="${site.id}" data-site-name="${site.name}">
-                                    <i class="bi bi-trash"></i> 删除
-                                </button>
-                            </div>
-                        `;
-                        
-                        // 停止轮询
-                        clearInterval(interval);
-                        
-                        // 初始化新按钮的事件监听器
-                        initButtonListeners();
-                        
-                        // 显示成功提示
-                        showToast('成功', `站点 "${site.name}" 已成功发布！`, 'success');
-                        
-                    } else if (site.status === 'failed') {
-                        statusCell.innerHTML = `
-                            <span class="badge bg-danger">处理失败</span>
-                            <i class="bi bi-info-circle text-danger" data-bs-toggle="tooltip" title="${site.error_message || '未知错误'}"></i>
-                        `;
-                        
-                        // 停止轮询
-                        clearInterval(interval);
-                        
-                        // 初始化工具提示
-                        var tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
-                        tooltipTriggerList.map(function (tooltipTriggerEl) {
-                            return new bootstrap.Tooltip(tooltipTriggerEl);
-                        });
-                        
-                        // 显示错误提示
-                        showToast('失败', `站点 "${site.name}" 处理失败: ${site.error_message || '未知错误'}`, 'danger');
-                    }
-                    
-                    // 更新行的状态属性
-                    const row = document.querySelector(`tr[data-site-id="${siteId}"]`);
-                    if (row) {
-                        row.setAttribute('data-status', site.status);
-                    }
+        const ids = Array.from(this.pending.keys());
+        const batches = [];
+        for (let i = 0; i < ids.length; i += this.batchSize) {
+            batches.push(this.fetchBatch(ids.slice(i, i + this.batchSize)));
+        }
+        
+        Promise.all(batches)
+            .then(results => {
+                let changed = false;
+                results.forEach(data => {
+                    if (!data || !data.success) return;
+                    data.data.forEach(site => {
+                        if (site.status !== 'pending' && this.pending.has(site.id)) {
+                            this.pending.delete(site.id);
+                            renderSiteStatus(site);
+                            changed = true;
+                        }
+                    });
+                    // 站点已被删除
+                    data.missing.forEach(siteId => this.pending.delete(siteId));
+                });
+                if (changed) {
+                    this.etags.clear();
                 }
+                this.interval = changed
+                    ? this.minInterval
+                    : Math.min(this.interval * this.backoff, this.maxInterval);
             })
             .catch(error => {
                 console.error('轮询站点状态失败:', error);
+                this.interval = Math.min(this.interval * this.backoff, this.maxInterval);
+            })
+            .finally(() => {
+                this.expire();
+                this.schedule();
             });
-        
-        // 如果达到最大尝试次数，停止轮询
-        if (attempts >= maxAttempts) {
-            clearInterval(interval);
-            statusCell.innerHTML = `
-                <span class="badge bg-secondary">超时</span>
-            `;
+    },
+    
+    // 超过最长轮询时间的站点停止轮询
+    expire() {
+        const now = Date.now();
+        this.pending.forEach((startedAt, siteId) => {
+            if (now - startedAt < this.timeout) return;
+            this.pending.delete(siteId);
+            const statusCell = document.querySelector(`tr[data-site-id="${siteId}"] td:nth-child(4)`);
+            if (statusCell) {
+                statusCell.innerHTML = `
+                    <span class="badge bg-secondary">超时</span>
+                `;
+            }
             showToast('超时', '站点状态轮询超时，请刷新页面查看最新状态', 'warning');
-        }
-    }, pollInterval);
+        });
+    }
+};
+
+// 根据查询到的站点状态更新表格行
+function renderSiteStatus(site) {
+    const statusCell = document.querySelector(`tr[data-site-id="${site.id}"] td:nth-child(4)`);
+    const actionsCell = document.querySelector(`tr[data-site-id="${site.id}"] td:nth-child(5)`);
+    
+    if (!statusCell || !actionsCell) return;
+    
+    // 更新状态单元格
+    if (site.status === 'completed') {
+        statusCell.innerHTML = `
+            <div class="form-check form-switch">
+                <input class="form-check-input toggle-publish-status" type="checkbox" role="switch" 
+                       id="publish-status-${site.id}" 
+                       data-site-id="${site.id}" 
+                       ${site.is_published ? 'checked' : ''}>
+                <label class="form-check-label" for="publish-status-${site.id}">
+                    <span class="publish-status-label ${site.is_published ? 'text-success' : 'text-secondary'}">
+                        ${site.is_published ? '已发布' : '未发布'}
+                    </span>
+                </label>
+            </div>
+        `;
+        
+        // 更新操作单元格，添加查看和预览按钮
+        actionsCell.innerHTML = `
+            <div class="btn-group btn-group-sm">
+                <a href="${site.oss_url}" target="_blank" class="btn btn-outline-primary">
+                    <i class="bi bi-eye"></i> 查看
+                </a>
+                <button class="btn btn-outline-info preview-site-btn" data-site-id="${site.id}" data-site-url="${site.oss_url}">
+                    <i class="bi bi-window"></i> 预览
+                </button>
+                <button class="btn btn-outline-secondary rename-site-btn" data-site-id="${site.id}" data-site-name="${site.name}">
+                    <i class="bi bi-pencil"></i> 重命名
+                </button>
+                <button class="btn btn-outline-danger delete-site-btn" data-site-id="${site.id}" data-site-name="${site.name}">
+                    <i class="bi bi-trash"></i> 删除
+                </button>
+            </div>
+        `;
+        
+        // 初始化新按钮的事件监听器
+        initButtonListeners();
+        
+        // 显示成功提示
+        showToast('成功', `站点 "${site.name}" 已成功发布！`, 'success');
+        
+    } else if (site.status === 'failed') {
+        statusCell.innerHTML = `
+            <span class="badge bg-danger">处理失败</span>
+            <i class="bi bi-info-circle text-danger" data-bs-toggle="tooltip" title="${site.error_message || '未知错误'}"></i>
+        `;
+        
+        // 初始化工具提示
+        var tooltipTriggerList = [].slice.call(document.querySelectorAll('[data-bs-toggle="tooltip"]'));
+        tooltipTriggerList.map(function (tooltipTriggerEl) {
+            return new bootstrap.Tooltip(tooltipTriggerEl);
+        });
+        
+        // 显示错误提示
+        showToast('失败', `站点 "${site.name}" 处理失败: ${site.error_message || '未知错误'}`, 'danger');
+    }
+    
+    // 更新行的状态属性
+    const row = document.querySelector(`tr[data-site-id="${site.id}"]`);
+    if (row) {
+        row.setAttribute('data-status', site.status);
+    }
 }
 
 // 初始化按钮事件监听器
@@ -2,17 +2,82 @@
 存储服务模块 - 支持多种对象存储服务
 """
 import os
+import re
+import time
+import uuid
 import logging
 import shutil
+import threading
+from collections import OrderedDict
 from abc import ABC, abstractmethod
 from urllib.parse import urlparse
 import mimetypes
 from flask import current_app, send_from_directory
+from werkzeug.security import safe_join
+from html_hoster.pack import (
+    PACK_SUFFIX, SitePack, write_site_pack, open_site_pack, evict_site_pack,
+    encode_pack_index, decode_pack_index, find_pack_entry,
+)
+from html_hoster.resilience import StorageUnavailableError, get_backend_health, get_io_executor, hedged_call
+from html_hoster.metrics import instrument_storage_class
+from html_hoster.logs import log_event
+
+
+# 网站目录分片的最大深度
+MAX_SHARD_DEPTH = 4
+# 站点ID格式（uuid4），用于在网站目录中识别站点目录
+SITE_ID_PATTERN = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+
+
+def shard_site_path(site_id, depth=0, width=2):
+    """
+    计算站点在网站目录中的分片相对路径
+    
+    例如 depth=2, width=2 时，站点 abcdef12-... 对应 ab/cd/abcdef12-...
+    
+    Args:
+        site_id: 站点ID
+        depth: 分片层级数，0 表示不分片
+        width: 每一级分片目录名的字符数
+    
+    返回:
+        str: 使用 / 分隔的相对路径
+    """
+    if depth <= 0:
+        return site_id
+    # 只使用字母和数字计算分片，避免路径穿越
+    key = re.sub(r"[^0-9a-zA-Z]", "", site_id).lower().ljust(depth * width, "0")
+    shards = [key[i * width:(i + 1) * width] for i in range(depth)]
+    return "/".join(shards + [site_id])
+
+
+def is_safe_storage_path(remote_path):
+    """存储路径（<site_id>/<path>）是否不包含空的路径段、. 和 ..，可以安全地映射到本地目录"""
+    return all(part not in ("", ".", "..") for part in remote_path.replace("\\", "/").split("/"))
+
+
+def iter_site_files(source_dir):
+    """
+    遍历本地站点目录中的所有文件
+    
+    返回:
+        生成器，每项为 (本地文件路径, 使用 / 分隔的相对路径)
+    """
+    for root, _, filenames in os.walk(source_dir):
+        for filename in filenames:
+            local_path = os.path.join(root, filename)
+            relative_path = os.path.relpath(local_path, source_dir).replace("\\", "/")
+            yield local_path, relative_path
 
 
 class StorageService(ABC):
     """存储服务抽象基类"""
     
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 每个存储后端的操作耗时、字节数和错误次数计入 /metrics
+        instrument_storage_class(cls)
+    
     @abstractmethod
     def upload_file(self, local_path, remote_path, content_type=None):
         """上传文件到存储服务"""
@@ -47,6 +112,35 @@ class StorageService(ABC):
     def delete_prefix(self, prefix):
         """删除指定前缀的所有文件（批量删除）"""
         pass
+    
+    def download_range(self, remote_path, start, end):
+        """
+        按字节范围下载文件内容（包含 start 和 end）
+        
+        返回:
+            bytes: 文件内容，文件不存在时返回 None
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持范围下载")
+    
+    def upload_site(self, site_id, source_dir):
+        """
+        上传整个站点目录，默认逐个文件上传
+        
+        Args:
+            site_id: 站点ID
+            source_dir: 本地站点目录
+        
+        返回:
+            int: 上传的文件数量
+        """
+        uploaded_files = 0
+        for local_path, relative_path in iter_site_files(source_dir):
+            remote_path = f"{site_id}/{relative_path}"
+            content_type, _ = mimetypes.guess_type(local_path)
+            self.upload_file(local_path, remote_path, content_type)
+            uploaded_files += 1
+            log_event("storage.write", "上传文件到存储服务: %s", remote_path, path=remote_path)
+        return uploaded_files
 
 
 class AliOssStorage(StorageService):
@@ -89,7 +183,7 @@ class AliOssStorage(StorageService):
             else:
                 raise FileNotFoundError(f"本地文件不存在: {local_path}")
             
-            logging.info(f"成功上传文件到OSS: {remote_path}")
+            log_event("storage.write", "成功上传文件到OSS: %s", remote_path, path=remote_path)
             return True
         except Exception as e:
             logging.error(f"上传文件到OSS失败 {remote_path}: {e}")
@@ -109,7 +203,7 @@ class AliOssStorage(StorageService):
             # 获取Content-Type
             content_type = result.headers.get('Content-Type')
             
-            logging.info(f"成功从OSS下载文件: {remote_path}")
+            log_event("storage.read", "成功从OSS下载文件: %s", remote_path, path=remote_path)
             return content, content_type
         except oss2.exceptions.NoSuchKey:
             logging.warning(f"OSS文件不存在: {remote_path}")
@@ -118,6 +212,25 @@ class AliOssStorage(StorageService):
             logging.error(f"从OSS下载文件失败 {remote_path}: {e}")
             raise
     
+    def download_range(self, remote_path, start, end):
+        """按字节范围从OSS下载文件"""
+        import oss2
+        
+        # 规范化路径
+        remote_path = os.path.join(self.prefix, remote_path).replace("\\", "/")
+        
+        try:
+            result = self.bucket.get_object(remote_path, byte_range=(start, end))
+            content = result.read()
+            logging.debug(f"成功从OSS范围下载文件: {remote_path} [{start}-{end}]")
+            return content
+        except oss2.exceptions.NoSuchKey:
+            logging.warning(f"OSS文件不存在: {remote_path}")
+            return None
+        except Exception as e:
+            logging.error(f"从OSS范围下载文件失败 {remote_path} [{start}-{end}]: {e}")
+            raise
+    
     def delete_file(self, remote_path):
         """从OSS删除文件"""
         import oss2
@@ -250,7 +363,7 @@ class S3Storage(StorageService):
             else:
                 raise FileNotFoundError(f"本地文件不存在: {local_path}")
             
-            logging.info(f"成功上传文件到S3: {remote_path}")
+            log_event("storage.write", "成功上传文件到S3: %s", remote_path, path=remote_path)
             return True
         except Exception as e:
             logging.error(f"上传文件到S3失败 {remote_path}: {e}")
@@ -266,7 +379,7 @@ class S3Storage(StorageService):
             content = response['Body'].read()
             content_type = response.get('ContentType')
             
-            logging.info(f"成功从S3下载文件: {remote_path}")
+            log_event("storage.read", "成功从S3下载文件: %s", remote_path, path=remote_path)
             return content, content_type
         except self.s3.exceptions.NoSuchKey:
             logging.warning(f"S3文件不存在: {remote_path}")
@@ -275,6 +388,23 @@ class S3Storage(StorageService):
             logging.error(f"从S3下载文件失败 {remote_path}: {e}")
             raise
     
+    def download_range(self, remote_path, start, end):
+        """按字节范围从S3下载文件"""
+        # 规范化路径
+        remote_path = os.path.join(self.prefix, remote_path).replace("\\", "/")
+        
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=remote_path, Range=f"bytes={start}-{end}")
+            content = response['Body'].read()
+            logging.debug(f"成功从S3范围下载文件: {remote_path} [{start}-{end}]")
+            return content
+        except self.s3.exceptions.NoSuchKey:
+            logging.warning(f"S3文件不存在: {remote_path}")
+            return None
+        except Exception as e:
+            logging.error(f"从S3范围下载文件失败 {remote_path} [{start}-{end}]: {e}")
+            raise
+    
     def delete_file(self, remote_path):
         """从S3删除文件"""
         # 规范化路径
@@ -411,7 +541,7 @@ class SupabaseStorage(StorageService):
             else:
                 raise FileNotFoundError(f"本地文件不存在: {local_path}")
             
-            logging.info(f"成功上传文件到Supabase: {remote_path}")
+            log_event("storage.write", "成功上传文件到Supabase: %s", remote_path, path=remote_path)
             return True
         except Exception as e:
             logging.error(f"上传文件到Supabase失败 {remote_path}: {e}")
@@ -429,7 +559,7 @@ class SupabaseStorage(StorageService):
             # 获取Content-Type
             content_type = None  # Supabase API不直接返回Content-Type，需要额外请求
             
-            logging.info(f"成功从Supabase下载文件: {remote_path}")
+            log_event("storage.read", "成功从Supabase下载文件: %s", remote_path, path=remote_path)
             return response, content_type
         except Exception as e:
             logging.error(f"从Supabase下载文件失败 {remote_path}: {e}")
@@ -520,6 +650,10 @@ class LocalStorage(StorageService):
         """初始化本地文件存储服务"""
         self.upload_folder = app.config["UPLOAD_FOLDER"]
         self.sites_folder = app.config["SITES_FOLDER"]  # 新增网站存储目录
+        self.shard_depth = app.config.get("SITES_SHARD_DEPTH", 0)
+        self.shard_width = app.config.get("SITES_SHARD_WIDTH", 2)
+        self.pack_mode = app.config.get("LOCAL_STORAGE_MODE", "files") == "pack"
+        self.pack_cache_size = app.config.get("LOCAL_PACK_CACHE_SIZE", 256)
         self.base_url = app.config.get("SERVER_NAME", "localhost:5000")
         self.scheme = "http"
         
@@ -528,10 +662,126 @@ class LocalStorage(StorageService):
         os.makedirs(self.sites_folder, exist_ok=True)  # 确保网站目录存在
         logging.info(f"初始化本地文件存储服务: 上传目录={self.upload_folder}, 网站目录={self.sites_folder}")
     
+    def _shard_path(self, site_id, depth=None):
+        """获取站点在指定分片深度下的绝对路径"""
+        depth = self.shard_depth if depth is None else depth
+        return os.path.join(self.sites_folder, shard_site_path(site_id, depth, self.shard_width))
+    
+    def _locate(self, site_id, suffix=""):
+        """
+        查找站点目录（或打包文件）的实际路径
+        
+        优先使用当前配置的分片布局；在重新分片迁移期间，站点可能仍位于其他布局下，
+        此时回退查找其他分片深度，保证迁移过程中站点可以继续访问。
+        """
+        exists = os.path.isfile if suffix else os.path.isdir
+        target = self._shard_path(site_id) + suffix
+        if exists(target):
+            return target
+        
+        for depth in range(MAX_SHARD_DEPTH + 1):
+            if depth == self.shard_depth:
+                continue
+            candidate = self._shard_path(site_id, depth) + suffix
+            if exists(candidate):
+                return candidate
+        
+        return target
+    
+    def get_site_path(self, site_id):
+        """获取站点目录的实际路径"""
+        return self._locate(site_id)
+    
+    def get_pack_path(self, site_id):
+        """获取站点打包文件的实际路径"""
+        return self._locate(site_id, PACK_SUFFIX)
+    
+    def _open_pack(self, site_id):
+        """打开站点打包文件，不存在时返回 None"""
+        return open_site_pack(self.get_pack_path(site_id), self.pack_cache_size)
+    
+    def _write_pack(self, site_id, files):
+        """按当前分片布局写入站点打包文件"""
+        pack_path = self._shard_path(site_id) + PACK_SUFFIX
+        count = write_site_pack(pack_path, files)
+        evict_site_pack(pack_path)
+        return count
+    
+    def upload_site(self, site_id, source_dir):
+        """上传整个站点目录；打包模式下写入单个打包文件"""
+        if not self.pack_mode:
+            return super().upload_site(site_id, source_dir)
+        
+        files = []
+        for local_path, relative_path in iter_site_files(source_dir):
+            content_type, _ = mimetypes.guess_type(local_path)
+            files.append((relative_path, local_path, content_type))
+        
+        try:
+            count = self._write_pack(site_id, files)
+            logging.info(f"成功写入站点打包文件: {site_id} ({count} 个文件)")
+            return count
+        except Exception as e:
+            logging.error(f"写入站点打包文件失败 {site_id}: {e}")
+            raise
+    
+    def _resolve_path(self, remote_path, for_write=False):
+        """
+        将 <site_id>/<path> 形式的存储路径映射为网站目录下的实际路径
+        
+        返回:
+            str: 实际路径；站点ID或文件路径会跳出站点目录（如包含 ..）时返回 None
+        """
+        site_id, _, relative_path = remote_path.replace("\\", "/").partition("/")
+        if site_id in ("", ".", ".."):
+            return None
+        site_path = self._shard_path(site_id) if for_write else self.get_site_path(site_id)
+        if not relative_path.strip("/"):
+            return site_path
+        # 路径来自请求 URL，不能访问站点目录之外的文件
+        return safe_join(site_path, relative_path)
+    
+    def _repack(self, site_id, path, source=None, content_type=None):
+        """
+        重写打包文件以添加、替换或移除单个文件
+        
+        Args:
+            site_id: 站点ID
+            path: 站点内的文件路径
+            source: 新文件来源（本地路径），为 None 时表示移除该文件
+            content_type: 新文件的 Content-Type
+        
+        返回:
+            bool: 是否发生了变更
+        """
+        content_type = content_type or mimetypes.guess_type(path)[0]
+        pack = self._open_pack(site_id)
+        if pack is not None:
+            files, changed = pack.replace_entry(path, source, content_type)
+        else:
+            files = [(path, source, content_type)] if source is not None else []
+            changed = source is not None
+        
+        if changed:
+            self._write_pack(site_id, files)
+        return changed
+    
     def upload_file(self, local_path, remote_path, content_type=None):
         """上传文件到本地存储"""
-        # 规范化路径 - 存储到网站目录
-        dest_path = os.path.join(self.sites_folder, remote_path)
+        if self.pack_mode:
+            site_id, _, relative_path = remote_path.replace("\\", "/").partition("/")
+            try:
+                self._repack(site_id, relative_path, local_path, content_type)
+                log_event("storage.write", "成功写入文件到站点打包文件: %s", remote_path, path=remote_path)
+                return True
+            except Exception as e:
+                logging.error(f"写入文件到站点打包文件失败 {remote_path}: {e}")
+                raise
+        
+        # 规范化路径 - 存储到网站目录（按分片布局）
+        dest_path = self._resolve_path(remote_path, for_write=True)
+        if dest_path is None:
+            raise ValueError(f"非法的存储路径: {remote_path}")
         dest_dir = os.path.dirname(dest_path)
         
         try:
@@ -557,7 +807,7 @@ class LocalStorage(StorageService):
                     with open(dest_path, 'wb') as dest_file:
                         dest_file.write(content)
                     
-                    logging.info(f"成功复制文件到网站存储目录: {dest_path}")
+                    log_event("storage.write", "成功复制文件到网站存储目录: %s", dest_path, path=dest_path)
                     return True
                     
                 except (PermissionError, OSError) as e:
@@ -576,10 +826,43 @@ class LocalStorage(StorageService):
             logging.error(f"复制文件到网站存储目录失败 {dest_path}: {e}")
             raise
     
+    def put_content(self, remote_path, content):
+        """
+        将内存中的文件内容写入网站目录
+        
+        先写入临时文件再原子替换，并发读取时不会读到不完整的文件。
+        """
+        dest_path = self._resolve_path(remote_path, for_write=True)
+        if dest_path is None:
+            raise ValueError(f"非法的存储路径: {remote_path}")
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, 'wb') as dest_file:
+                dest_file.write(content)
+            os.replace(tmp_path, dest_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
     def download_file(self, remote_path):
         """从本地存储获取文件内容"""
+        if self.pack_mode:
+            site_id, _, relative_path = remote_path.replace("\\", "/").partition("/")
+            pack = self._open_pack(site_id)
+            if pack is not None:
+                content, content_type = pack.read(relative_path)
+                if content is None:
+                    logging.warning(f"站点打包文件中不存在文件: {remote_path}")
+                return content, content_type
+            # 未打包的站点回退到普通文件读取
+        
         # 规范化路径 - 从网站目录读取
-        file_path = os.path.join(self.sites_folder, remote_path)
+        file_path = self._resolve_path(remote_path)
+        if file_path is None:
+            logging.warning(f"拒绝访问网站目录之外的路径: {remote_path}")
+            return None, None
         
         try:
             if os.path.exists(file_path):
@@ -589,7 +872,7 @@ class LocalStorage(StorageService):
                 # 根据文件扩展名猜测Content-Type
                 content_type, _ = mimetypes.guess_type(file_path)
                 
-                logging.info(f"成功从网站存储目录读取文件: {file_path}")
+                log_event("storage.read", "成功从网站存储目录读取文件: %s", file_path, path=file_path)
                 return content, content_type
             else:
                 logging.warning(f"网站文件不存在: {file_path}")
@@ -600,8 +883,22 @@ class LocalStorage(StorageService):
     
     def delete_file(self, remote_path):
         """从本地存储删除文件"""
+        if self.pack_mode:
+            site_id, _, relative_path = remote_path.replace("\\", "/").partition("/")
+            if os.path.isfile(self.get_pack_path(site_id)):
+                try:
+                    removed = self._repack(site_id, relative_path)
+                    logging.info(f"从站点打包文件删除文件: {remote_path} ({'成功' if removed else '文件不存在'})")
+                    return removed
+                except Exception as e:
+                    logging.error(f"从站点打包文件删除文件失败 {remote_path}: {e}")
+                    raise
+        
         # 规范化路径 - 从网站目录删除
-        file_path = os.path.join(self.sites_folder, remote_path)
+        file_path = self._resolve_path(remote_path)
+        if file_path is None:
+            logging.warning(f"拒绝删除网站目录之外的路径: {remote_path}")
+            return False
         
         try:
             if os.path.exists(file_path):
@@ -625,8 +922,20 @@ class LocalStorage(StorageService):
     
     def list_files(self, prefix):
         """列出指定前缀的所有文件"""
+        if self.pack_mode:
+            site_id, _, relative_prefix = prefix.replace("\\", "/").partition("/")
+            pack = self._open_pack(site_id)
+            if pack is not None:
+                files = [f"{site_id}/{path}" for path in pack.list(relative_prefix)]
+                logging.info(f"成功列出站点打包文件: {len(files)} 个")
+                return files
+        
         # 规范化路径 - 从网站目录列出
-        prefix_path = os.path.join(self.sites_folder, prefix)
+        site_id = prefix.replace("\\", "/").split("/", 1)[0]
+        site_path = self.get_site_path(site_id)
+        prefix_path = self._resolve_path(prefix)
+        if prefix_path is None:
+            return []
         
         try:
             files = []
@@ -634,9 +943,9 @@ class LocalStorage(StorageService):
                 for root, _, filenames in os.walk(prefix_path):
                     for filename in filenames:
                         file_path = os.path.join(root, filename)
-                        # 计算相对路径
-                        relative_path = os.path.relpath(file_path, self.sites_folder)
-                        files.append(relative_path.replace("\\", "/"))
+                        # 计算相对路径（不包含分片目录）
+                        relative_path = os.path.relpath(file_path, site_path).replace("\\", "/")
+                        files.append(f"{site_id}/{relative_path}")
             
             logging.info(f"成功列出网站存储目录文件: {len(files)} 个")
             return files
@@ -656,28 +965,682 @@ class LocalStorage(StorageService):
     def delete_prefix(self, prefix):
         """删除指定前缀的所有文件（批量删除）"""
         # 规范化路径
-        full_prefix = os.path.join(self.sites_folder, prefix).replace("\\", "/")
+        full_prefix = self._resolve_path(prefix)
+        if full_prefix is None:
+            raise ValueError(f"非法的存储路径: {prefix}")
         
         try:
-            # 获取所有文件
-            files = []
-            for root, _, filenames in os.walk(full_prefix):
-                for filename in filenames:
-                    file_path = os.path.join(root, filename)
-                    files.append(file_path)
+            # 删除站点打包文件（只有删除整个站点时才会命中）
+            if "/" not in prefix.replace("\\", "/").strip("/"):
+                pack_path = self.get_pack_path(prefix.strip("/\\"))
+                evict_site_pack(pack_path)
+                if os.path.isfile(pack_path):
+                    os.remove(pack_path)
+                    self._prune_empty_dirs(os.path.dirname(pack_path))
             
-            # 批量删除文件
-            for file_path in files:
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
+            # 删除整个目录树
+            if os.path.isdir(full_prefix):
+                shutil.rmtree(full_prefix)
+            elif os.path.isfile(full_prefix):
+                os.remove(full_prefix)
+            
+            # 清理空的分片目录
+            self._prune_empty_dirs(os.path.dirname(full_prefix))
             
             logging.info(f"成功从网站存储目录删除前缀为 {full_prefix} 的所有文件")
             return True
         except Exception as e:
             logging.error(f"从网站存储目录删除前缀为 {full_prefix} 的所有文件失败: {e}")
             raise
+    
+    def _prune_empty_dirs(self, path):
+        """自下而上删除网站目录中的空目录，直到网站根目录为止"""
+        root = os.path.abspath(self.sites_folder)
+        path = os.path.abspath(path)
+        while path != root and path.startswith(root + os.sep):
+            try:
+                os.rmdir(path)
+            except OSError:
+                # 目录非空或已被删除
+                break
+            path = os.path.dirname(path)
+    
+    def _iter_site_entries(self):
+        """遍历网站目录，返回所有 (站点ID, 路径, 后缀) 三元组，不区分当前分片布局"""
+        stack = [(self.sites_folder, 0)]
+        while stack:
+            path, depth = stack.pop()
+            try:
+                entries = list(os.scandir(path))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.endswith(PACK_SUFFIX) and entry.is_file(follow_symlinks=False):
+                    site_id = entry.name[:-len(PACK_SUFFIX)]
+                    if SITE_ID_PATTERN.match(site_id):
+                        yield site_id, entry.path, PACK_SUFFIX
+                    continue
+                if not entry.is_dir(follow_symlinks=False):
+                    continue
+                if SITE_ID_PATTERN.match(entry.name):
+                    yield entry.name, entry.path, ""
+                elif depth < MAX_SHARD_DEPTH and len(entry.name) <= 4 and entry.name.isalnum():
+                    # 分片目录，继续向下查找
+                    stack.append((entry.path, depth + 1))
+    
+    def reshard(self, dry_run=False):
+        """
+        按当前分片配置重新组织网站目录（在线迁移）
+        
+        每个站点目录（或打包文件）通过一次 os.rename 原子移动到新位置，迁移期间
+        get_site_path/get_pack_path 会回退查找旧布局，因此无需停机。
+        
+        Args:
+            dry_run: 为 True 时只统计需要移动的站点，不实际移动
+        
+        返回:
+            int: 已移动（或需要移动）的站点数量
+        """
+        moved = 0
+        for site_id, current_path, suffix in list(self._iter_site_entries()):
+            target_path = self._shard_path(site_id) + suffix
+            if os.path.normpath(current_path) == os.path.normpath(target_path):
+                continue
+            
+            if os.path.exists(target_path):
+                logging.warning(f"目标目录已存在，跳过站点 {site_id}: {target_path}")
+                continue
+            
+            if not dry_run:
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                os.rename(current_path, target_path)
+                self._prune_empty_dirs(os.path.dirname(current_path))
+                logging.debug(f"移动站点目录: {current_path} -> {target_path}")
+            moved += 1
+        
+        logging.info(f"网站目录重新分片完成: {'需要移动' if dry_run else '已移动'} {moved} 个站点")
+        return moved
+
+
+# 站点打包索引缓存: 站点ID -> (过期时间, 索引项列表, 路径列表)，索引不存在时列表为 None
+_bundle_index_cache = OrderedDict()
+_bundle_index_cache_lock = threading.Lock()
+# 单文件写入需要下载、重写并上传整个打包对象，同一站点的写入按站点ID分段加锁串行执行
+_bundle_write_locks = [threading.Lock() for _ in range(64)]
+
+
+class BundleStorage(StorageService):
+    """
+    远程打包存储服务实现
+    
+    每个站点在远程存储中保存为一个打包对象 <site_id>.pack 和一个索引对象 <site_id>.index.json，
+    发布和删除只需要少量请求；读取单个文件时使用缓存的索引定位，通过范围请求获取内容。
+    未打包的站点（切换模式前发布的站点）回退到底层存储逐个文件访问。
+    """
+    
+    BUNDLE_SUFFIX = PACK_SUFFIX
+    INDEX_SUFFIX = ".index.json"
+    
+    def __init__(self, app, backend):
+        """
+        初始化远程打包存储服务
+        
+        Args:
+            app: Flask应用实例
+            backend: 支持范围下载的底层存储服务（OSS/S3）
+        """
+        self.backend = backend
+        self.upload_folder = app.config["UPLOAD_FOLDER"]
+        self.index_cache_size = app.config.get("BUNDLE_INDEX_CACHE_SIZE", 1024)
+        self.index_cache_ttl = app.config.get("BUNDLE_INDEX_CACHE_TTL", 300)
+        logging.info(f"初始化远程打包存储服务: {type(backend).__name__}")
+    
+    def _get_index(self, site_id):
+        """
+        获取站点索引，优先使用内存缓存
+        
+        返回:
+            tuple: (索引项列表, 路径列表)，站点未打包时返回 (None, None)
+        """
+        now = time.monotonic()
+        with _bundle_index_cache_lock:
+            cached = _bundle_index_cache.get(site_id)
+            if cached and cached[0] > now:
+                _bundle_index_cache.move_to_end(site_id)
+                return cached[1], cached[2]
+        
+        content, _ = self.backend.download_file(f"{site_id}{self.INDEX_SUFFIX}")
+        if content is None:
+            entries, paths = None, None
+        else:
+            entries = decode_pack_index(content)
+            paths = [entry.path for entry in entries]
+        
+        with _bundle_index_cache_lock:
+            _bundle_index_cache[site_id] = (now + self.index_cache_ttl, entries, paths)
+            _bundle_index_cache.move_to_end(site_id)
+            while len(_bundle_index_cache) > self.index_cache_size:
+                _bundle_index_cache.popitem(last=False)
+        return entries, paths
+    
+    def _evict_index(self, site_id):
+        """从缓存中移除站点索引"""
+        with _bundle_index_cache_lock:
+            _bundle_index_cache.pop(site_id, None)
+    
+    def _upload_pack(self, site_id, files):
+        """在本地生成打包文件并上传打包对象和索引对象"""
+        tmp_base = os.path.join(self.upload_folder, f"{site_id}.{uuid.uuid4().hex}")
+        pack_path = tmp_base + self.BUNDLE_SUFFIX
+        index_path = tmp_base + self.INDEX_SUFFIX
+        
+        try:
+            count = write_site_pack(pack_path, files)
+            with open(index_path, "wb") as index_file:
+                index_file.write(encode_pack_index(SitePack(pack_path).entries()))
+            
+            # 先上传打包对象，再上传索引对象，索引存在即表示发布完成
+            self.backend.upload_file(pack_path, f"{site_id}{self.BUNDLE_SUFFIX}", "application/octet-stream")
+            self.backend.upload_file(index_path, f"{site_id}{self.INDEX_SUFFIX}", "application/json")
+            self._evict_index(site_id)
+            return count
+        finally:
+            for path in (pack_path, index_path):
+                if os.path.exists(path):
+                    os.remove(path)
+    
+    def _download_pack(self, site_id):
+        """下载整个打包对象到本地临时文件并打开，站点未打包时返回 None"""
+        content, _ = self.backend.download_file(f"{site_id}{self.BUNDLE_SUFFIX}")
+        if content is None:
+            return None
+        
+        pack_path = os.path.join(self.upload_folder, f"{site_id}.{uuid.uuid4().hex}{self.BUNDLE_SUFFIX}")
+        with open(pack_path, "wb") as pack_file:
+            pack_file.write(content)
+        try:
+            return SitePack(pack_path)
+        finally:
+            # 内存映射在文件删除后仍然有效（Windows 下删除失败时保留临时文件）
+            try:
+                os.remove(pack_path)
+            except OSError:
+                pass
+    
+    def _write_lock(self, site_id):
+        """获取站点的写入锁（仅在当前进程内串行化）"""
+        return _bundle_write_locks[hash(site_id) % len(_bundle_write_locks)]
+    
+    def _load_pack_for_write(self, site_id):
+        """
+        在写入锁内重新读取索引并下载打包对象
+        
+        返回:
+            SitePack: 站点的打包对象，站点未打包或打包对象已被删除时返回 None
+        """
+        # 丢弃缓存的索引，确保基于其他写入完成后的最新打包对象修改
+        self._evict_index(site_id)
+        entries, _ = self._get_index(site_id)
+        if entries is None:
+            return None
+        
+        pack = self._download_pack(site_id)
+        if pack is None:
+            logging.warning(f"站点索引存在但打包对象缺失，回退到逐个文件访问: {site_id}")
+            self._evict_index(site_id)
+        return pack
+    
+    def upload_site(self, site_id, source_dir):
+        """上传整个站点目录为一个打包对象"""
+        files = []
+        for local_path, relative_path in iter_site_files(source_dir):
+            content_type, _ = mimetypes.guess_type(local_path)
+            files.append((relative_path, local_path, content_type))
+        
+        try:
+            count = self._upload_pack(site_id, files)
+            logging.info(f"成功上传站点打包对象: {site_id} ({count} 个文件)")
+            return count
+        except Exception as e:
+            logging.error(f"上传站点打包对象失败 {site_id}: {e}")
+            raise
+    
+    def upload_file(self, local_path, remote_path, content_type=None):
+        """上传单个文件；站点已打包时重写打包对象"""
+        site_id, _, relative_path = remote_path.replace("\\", "/").partition("/")
+        with self._write_lock(site_id):
+            pack = self._load_pack_for_write(site_id)
+            if pack is None:
+                return self.backend.upload_file(local_path, remote_path, content_type)
+            
+            files, _ = pack.replace_entry(relative_path, local_path, content_type or mimetypes.guess_type(local_path)[0])
+            self._upload_pack(site_id, files)
+        log_event("storage.write", "成功写入文件到站点打包对象: %s", remote_path, path=remote_path)
+        return True
+    
+    def download_file(self, remote_path):
+        """通过索引和范围请求读取单个文件"""
+        site_id, _, relative_path = remote_path.replace("\\", "/").partition("/")
+        entries, paths = self._get_index(site_id)
+        if entries is None:
+            return self.backend.download_file(remote_path)
+        
+        entry = find_pack_entry(entries, paths, relative_path)
+        if entry is None:
+            logging.warning(f"站点打包对象中不存在文件: {remote_path}")
+            return None, None
+        
+        if entry.length == 0:
+            return b"", entry.content_type
+        
+        content = self.backend.download_range(
+            f"{site_id}{self.BUNDLE_SUFFIX}", entry.offset, entry.offset + entry.length - 1
+        )
+        if content is None:
+            # 打包对象已被删除，索引缓存过期
+            self._evict_index(site_id)
+            return None, None
+        return content, entry.content_type
+    
+    def delete_file(self, remote_path):
+        """删除单个文件；站点已打包时重写打包对象"""
+        site_id, _, relative_path = remote_path.replace("\\", "/").partition("/")
+        entries, paths = self._get_index(site_id)
+        if entries is None:
+            return self.backend.delete_file(remote_path)
+        
+        if find_pack_entry(entries, paths, relative_path) is None:
+            return False
+        
+        with self._write_lock(site_id):
+            pack = self._load_pack_for_write(site_id)
+            if pack is None:
+                return self.backend.delete_file(remote_path)
+            
+            files, removed = pack.replace_entry(relative_path)
+            if not removed:
+                return False
+            self._upload_pack(site_id, files)
+        logging.info(f"从站点打包对象删除文件: {remote_path}")
+        return True
+    
+    def list_files(self, prefix):
+        """列出指定前缀的所有文件"""
+        site_id, _, relative_prefix = prefix.replace("\\", "/").partition("/")
+        entries, paths = self._get_index(site_id)
+        if entries is None:
+            return self.backend.list_files(prefix)
+        return [f"{site_id}/{path}" for path in paths if path.startswith(relative_prefix)]
+    
+    def get_file_url(self, remote_path):
+        """打包存储的文件只能通过应用访问，返回相对URL"""
+        return f"/site/{remote_path}"
+    
+    def get_site_url(self, site_id):
+        """获取站点的访问URL"""
+        return self.get_file_url(f"{site_id}/index.html")
+    
+    def delete_prefix(self, prefix):
+        """删除站点：打包站点只需删除打包对象和索引对象"""
+        site_id = prefix.replace("\\", "/").strip("/").split("/", 1)[0]
+        entries, _ = self._get_index(site_id)
+        self._evict_index(site_id)
+        
+        if entries is None or "/" in prefix.strip("/\\"):
+            return self.backend.delete_prefix(prefix)
+        
+        # 先删除索引对象，使站点立即不可见
+        self.backend.delete_file(f"{site_id}{self.INDEX_SUFFIX}")
+        self.backend.delete_file(f"{site_id}{self.BUNDLE_SUFFIX}")
+        logging.info(f"成功删除站点打包对象: {site_id}")
+        return True
+
+
+class LocalCacheIndex:
+    """
+    本地热副本的访问记录和磁盘配额管理
+    
+    以站点为单位记录本地副本大小和最近访问顺序，超出配额时按最久未访问的顺序淘汰。
+    首次使用时扫描网站目录，以目录修改时间作为初始访问顺序；访问时按一定间隔更新目录
+    修改时间，使访问顺序在重启后得以保留。
+    """
+    
+    # 更新目录修改时间的最小间隔（秒）
+    TOUCH_INTERVAL = 60
+    
+    def __init__(self, quota_bytes):
+        self.quota_bytes = quota_bytes
+        self._sites = OrderedDict()  # 站点ID -> [大小, 上次更新修改时间]
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+    
+    def _load(self, local):
+        """扫描网站目录，建立初始记录（调用方持有锁）"""
+        found = []
+        for site_id, path, _ in local._iter_site_entries():
+            size = 0
+            for root, _, filenames in os.walk(path):
+                for filename in filenames:
+                    try:
+                        size += os.path.getsize(os.path.join(root, filename))
+                    except OSError:
+                        pass
+            found.append((os.path.getmtime(path), site_id, size))
+        
+        for _, site_id, size in sorted(found):
+            self._sites[site_id] = [size, 0.0]
+            self._total_bytes += size
+        self._loaded = True
+        logging.info(f"加载本地热副本记录: {len(self._sites)} 个站点, {self._total_bytes} 字节")
+    
+    def touch(self, local, site_id):
+        """记录站点被访问"""
+        now = time.time()
+        with self._lock:
+            if not self._loaded:
+                self._load(local)
+            record = self._sites.get(site_id)
+            if record is None:
+                return
+            self._sites.move_to_end(site_id)
+            if now - record[1] < self.TOUCH_INTERVAL:
+                return
+            record[1] = now
+        
+        try:
+            os.utime(local.get_site_path(site_id))
+        except OSError:
+            pass
+    
+    def add(self, local, site_id, nbytes):
+        """
+        记录站点新增的本地数据量
+        
+        返回:
+            list: 需要淘汰的站点ID（不包含当前站点）
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load(local)
+            record = self._sites.setdefault(site_id, [0, 0.0])
+            record[0] += nbytes
+            self._total_bytes += nbytes
+            self._sites.move_to_end(site_id)
+            
+            evicted = []
+            for candidate in list(self._sites):
+                if self._total_bytes <= self.quota_bytes:
+                    break
+                if candidate == site_id:
+                    continue
+                self._total_bytes -= self._sites.pop(candidate)[0]
+                evicted.append(candidate)
+            return evicted
+    
+    def remove(self, site_id):
+        """移除站点记录"""
+        with self._lock:
+            record = self._sites.pop(site_id, None)
+            if record is not None:
+                self._total_bytes -= record[0]
+
+
+# 每个网站目录对应一个本地热副本记录
+_local_cache_indexes = {}
+_local_cache_indexes_lock = threading.Lock()
+
+
+class TieredStorage(StorageService):
+    """
+    分层存储服务实现
+    
+    远程存储为持久数据源，本地网站目录保存热副本：写入同时写到远程和本地，读取时优先
+    使用本地副本，本地缺失时从远程获取并写入本地。本地副本按访问时间和磁盘配额淘汰。
+    """
+    
+    def __init__(self, app, remote):
+        """
+        初始化分层存储服务
+        
+        Args:
+            app: Flask应用实例
+            remote: 作为持久存储的远程存储服务
+        """
+        self.remote = remote
+        self.local = LocalStorage(app)
+        # 本地副本按文件逐个缓存，不使用打包模式
+        self.local.pack_mode = False
+        
+        quota_bytes = app.config.get("TIERED_LOCAL_QUOTA_MB", 10240) * 1024 * 1024
+        sites_folder = os.path.abspath(self.local.sites_folder)
+        with _local_cache_indexes_lock:
+            if sites_folder not in _local_cache_indexes:
+                _local_cache_indexes[sites_folder] = LocalCacheIndex(quota_bytes)
+            self.cache_index = _local_cache_indexes[sites_folder]
+    
+    def _record_local(self, site_id, nbytes):
+        """记录本地副本新增的数据量，并淘汰超出配额的站点"""
+        for evicted_site_id in self.cache_index.add(self.local, site_id, nbytes):
+            try:
+                self.local.delete_prefix(evicted_site_id)
+                logging.info(f"淘汰站点本地副本: {evicted_site_id}")
+            except Exception as e:
+                logging.warning(f"淘汰站点本地副本失败 {evicted_site_id}: {e}")
+    
+    def upload_site(self, site_id, source_dir):
+        """上传整个站点目录到远程存储，并写入本地副本"""
+        count = self.remote.upload_site(site_id, source_dir)
+        
+        try:
+            self.local.upload_site(site_id, source_dir)
+            size = sum(os.path.getsize(local_path) for local_path, _ in iter_site_files(source_dir))
+            self._record_local(site_id, size)
+        except Exception as e:
+            # 本地副本写入失败不影响发布，访问时会从远程获取
+            logging.warning(f"写入站点本地副本失败 {site_id}: {e}")
+        return count
+    
+    def upload_file(self, local_path, remote_path, content_type=None):
+        """上传文件到远程存储，并写入本地副本"""
+        self.remote.upload_file(local_path, remote_path, content_type)
+        
+        try:
+            self.local.upload_file(local_path, remote_path, content_type)
+            self._record_local(remote_path.replace("\\", "/").split("/", 1)[0], os.path.getsize(local_path))
+        except Exception as e:
+            logging.warning(f"写入本地副本失败 {remote_path}: {e}")
+        return True
+    
+    def download_file(self, remote_path):
+        """优先从本地副本读取文件，本地缺失时从远程获取并写入本地"""
+        # 路径来自请求 URL，包含 .. 等路径段时既不读取本地副本，也不从远程获取后写入本地
+        if not is_safe_storage_path(remote_path):
+            logging.warning(f"拒绝访问非法的存储路径: {remote_path}")
+            return None, None
+        site_id = remote_path.replace("\\", "/").split("/", 1)[0]
+        
+        content, content_type = self.local.download_file(remote_path)
+        if content is not None:
+            self.cache_index.touch(self.local, site_id)
+            return content, content_type
+        
+        content, content_type = self.remote.download_file(remote_path)
+        if content is None:
+            return None, None
+        
+        try:
+            self.local.put_content(remote_path, content)
+            self._record_local(site_id, len(content))
+            log_event("storage.read", "从远程存储获取文件并写入本地副本: %s", remote_path, path=remote_path)
+        except Exception as e:
+            logging.warning(f"写入本地副本失败 {remote_path}: {e}")
+        return content, content_type
+    
+    def delete_file(self, remote_path):
+        """从远程存储和本地副本删除文件"""
+        result = self.remote.delete_file(remote_path)
+        self.local.delete_file(remote_path)
+        return result
+    
+    def list_files(self, prefix):
+        """以远程存储为准列出文件"""
+        return self.remote.list_files(prefix)
+    
+    def get_file_url(self, remote_path):
+        """文件通过应用从本地副本提供，返回相对URL"""
+        return f"/site/{remote_path}"
+    
+    def get_site_url(self, site_id):
+        """获取站点的访问URL"""
+        return self.get_file_url(f"{site_id}/index.html")
+    
+    def delete_prefix(self, prefix):
+        """从远程存储和本地副本删除指定前缀的所有文件"""
+        result = self.remote.delete_prefix(prefix)
+        
+        try:
+            self.local.delete_prefix(prefix)
+        except Exception as e:
+            logging.warning(f"删除本地副本失败 {prefix}: {e}")
+        if "/" not in prefix.replace("\\", "/").strip("/"):
+            self.cache_index.remove(prefix.strip("/\\"))
+        return result
+
+
+class ResilientStorage(StorageService):
+    """
+    远程存储读取保护
+    
+    包装远程存储服务，读取时统计延迟；请求慢于 p95 延迟时发起对冲请求，并限制请求线程的
+    最长等待时间。后端连续失败时熔断，熔断期间直接失败而不占用请求线程；后端不可用时
+    优先使用最近成功读取的缓存内容。写入和删除操作直接交给底层存储。
+    """
+    
+    def __init__(self, app, backend):
+        """
+        初始化远程存储读取保护
+        
+        Args:
+            app: Flask应用实例
+            backend: 远程存储服务
+        """
+        self.backend = backend
+        self.read_timeout = app.config.get("STORAGE_READ_TIMEOUT", 10.0)
+        self.hedge_enabled = app.config.get("STORAGE_HEDGE_ENABLED", True)
+        self.hedge_min_delay = app.config.get("STORAGE_HEDGE_MIN_DELAY_MS", 50) / 1000
+        self.executor = get_io_executor(app.config.get("STORAGE_IO_WORKERS", 16))
+        
+        backend_key = f"{type(backend).__name__}:{getattr(backend, 'bucket_name', '')}"
+        self.health = get_backend_health(
+            backend_key,
+            failure_threshold=app.config.get("STORAGE_BREAKER_FAILURE_THRESHOLD", 5),
+            reset_timeout=app.config.get("STORAGE_BREAKER_RESET_TIMEOUT", 30.0),
+            fallback_cache_bytes=app.config.get("STORAGE_FALLBACK_CACHE_MB", 64) * 1024 * 1024,
+        )
+    
+    def _hedge_delay(self):
+        """根据 p95 延迟计算对冲请求的等待时间，样本不足或未启用时不对冲"""
+        if not self.hedge_enabled:
+            return None
+        p95 = self.health.latency.p95()
+        return None if p95 is None else max(p95, self.hedge_min_delay)
+    
+    def _guarded_read(self, cache_key, fn):
+        """
+        在熔断、超时和对冲保护下执行读取
+        
+        返回:
+            tuple: (内容, Content-Type)
+        """
+        health = self.health
+        if not health.breaker.allow():
+            cached = health.fallback.get(cache_key)
+            if cached is not None:
+                logging.warning(f"存储后端熔断中，使用缓存内容: {cache_key}")
+                return cached
+            raise StorageUnavailableError("存储后端暂时不可用")
+        
+        start = time.monotonic()
+        try:
+            content, content_type = hedged_call(self.executor, fn, self._hedge_delay(), self.read_timeout)
+        except Exception as e:
+            health.breaker.record_failure()
+            cached = health.fallback.get(cache_key)
+            if cached is not None:
+                logging.warning(f"远程读取失败，使用缓存内容 {cache_key}: {e}")
+                return cached
+            if isinstance(e, TimeoutError):
+                raise StorageUnavailableError(str(e)) from e
+            raise
+        
+        health.latency.record(time.monotonic() - start)
+        health.breaker.record_success()
+        health.fallback.put(cache_key, content, content_type)
+        return content, content_type
+    
+    def download_file(self, remote_path):
+        """在读取保护下从远程存储下载文件"""
+        return self._guarded_read(remote_path, lambda: self.backend.download_file(remote_path))
+    
+    def download_range(self, remote_path, start, end):
+        """在读取保护下从远程存储按范围下载文件"""
+        content, _ = self._guarded_read(
+            (remote_path, start, end),
+            lambda: (self.backend.download_range(remote_path, start, end), None),
+        )
+        return content
+    
+    def upload_file(self, local_path, remote_path, content_type=None):
+        """上传文件到远程存储"""
+        return self.backend.upload_file(local_path, remote_path, content_type)
+    
+    def upload_site(self, site_id, source_dir):
+        """上传整个站点目录到远程存储"""
+        return self.backend.upload_site(site_id, source_dir)
+    
+    def delete_file(self, remote_path):
+        """从远程存储删除文件"""
+        return self.backend.delete_file(remote_path)
+    
+    def list_files(self, prefix):
+        """列出指定前缀的所有文件"""
+        return self.backend.list_files(prefix)
+    
+    def get_file_url(self, remote_path):
+        """获取文件的访问URL"""
+        return self.backend.get_file_url(remote_path)
+    
+    def get_site_url(self, site_id):
+        """获取站点的访问URL"""
+        return self.backend.get_site_url(site_id)
+    
+    def delete_prefix(self, prefix):
+        """删除指定前缀的所有文件（批量删除）"""
+        return self.backend.delete_prefix(prefix)
+
+
+def _create_storage(app, storage_type):
+    """按存储类型创建存储服务实例"""
+    remote_mode = app.config.get("REMOTE_STORAGE_MODE", "files").lower()
+    
+    if storage_type == "oss":
+        storage = ResilientStorage(app, AliOssStorage(app))
+        return BundleStorage(app, storage) if remote_mode == "bundle" else storage
+    elif storage_type == "s3":
+        storage = ResilientStorage(app, S3Storage(app))
+        return BundleStorage(app, storage) if remote_mode == "bundle" else storage
+    elif storage_type == "supabase":
+        return ResilientStorage(app, SupabaseStorage(app))
+    elif storage_type == "local":
+        return LocalStorage(app)
+    elif storage_type == "tiered":
+        remote_type = app.config.get("TIERED_REMOTE_TYPE", "oss").lower()
+        if remote_type in ("local", "tiered"):
+            raise ValueError(f"分层存储的远程后端不能是: {remote_type}")
+        return TieredStorage(app, _create_storage(app, remote_type))
+    else:
+        raise ValueError(f"不支持的存储类型: {storage_type}")
 
 
 def get_storage_service(app=None):
@@ -697,13 +1660,4 @@ def get_storage_service(app=None):
     
     storage_type = app.config["STORAGE_TYPE"].lower()
     
-    if storage_type == "oss":
-        return AliOssStorage(app)
-    elif storage_type == "s3":
-        return S3Storage(app)
-    elif storage_type == "supabase":
-        return SupabaseStorage(app)
-    elif storage_type == "local":
-        return LocalStorage(app)
-    else:
-        raise ValueError(f"不支持的存储类型: {storage_type}") 
\ No newline at end of file
+    return _create_storage(app, storage_type)
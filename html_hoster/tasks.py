@@ -4,22 +4,32 @@
 import os
 import zipfile
 import logging
-import uuid
-import mimetypes
 import shutil
 from flask import current_app
+from flask_executor import Executor
 
 from html_hoster.storage import get_storage_service
-from html_hoster.database import db, Site
+from html_hoster.database import Site, run_write
+from html_hoster.usage import collect_site_stats, check_quota, record_site_published
+from html_hoster.metrics import JOBS_QUEUED, track_job
+
 
 def init_executor(app):
     """初始化 Flask-Executor 与 Flask 应用集成"""
-    from flask_executor import Executor
     executor = Executor(app)
-    app.config['EXECUTOR_TYPE'] = 'thread'
-    app.config['EXECUTOR_MAX_WORKERS'] = 4
+    app.executor = executor
     return executor
 
+
+def submit_job(fn, *args, **kwargs):
+    """提交后台任务，统计排队数量、执行中数量和执行耗时"""
+    try:
+        return current_app.extensions["executor"].submit(track_job(fn), *args, **kwargs)
+    except Exception:
+        # 提交失败的任务不会执行，撤销排队计数
+        JOBS_QUEUED.dec()
+        raise
+
 def process_zip_upload(zip_path, site_id, site_name, user_id):
     """处理 ZIP 文件上传的后台任务"""
     logging.info(f"开始处理 ZIP 上传任务: {site_id}")
@@ -53,37 +63,16 @@ def process_zip_upload(zip_path, site_id, site_name, user_id):
         if not index_html_path:
             raise ValueError("ZIP 包中没有找到 index.html 文件")
         
+        # 统计站点用量并检查用户配额
+        stats = collect_site_stats(extract_path, compressed_bytes=os.path.getsize(zip_path))
+        check_quota(user_id, stats["total_bytes"], site_id=site_id)
+        
         # 获取存储服务
         storage = get_storage_service(current_app)
         
-        # 上传到存储服务
-        uploaded_files = 0
-        file_list = []
-        
-        # 首先收集所有文件路径
-        for root, dirs, files in os.walk(extract_path):
-            for filename in files:
-                local_path = os.path.join(root, filename)
-                relative_path = os.path.relpath(local_path, extract_path)
-                remote_path = f"{site_id}/{relative_path}"
-                content_type, _ = mimetypes.guess_type(filename)
-                
-                file_list.append({
-                    'local_path': local_path,
-                    'remote_path': remote_path,
-                    'content_type': content_type
-                })
-        
-        # 上传文件，如果任何一个文件上传失败，则回滚所有操作
+        # 上传到存储服务，如果任何一个文件上传失败，则回滚所有操作
         try:
-            for file_info in file_list:
-                storage.upload_file(
-                    file_info['local_path'], 
-                    file_info['remote_path'], 
-                    file_info['content_type']
-                )
-                uploaded_files += 1
-                logging.info(f"上传文件到存储服务: {file_info['remote_path']}")
+            uploaded_files = storage.upload_site(site_id, extract_path)
         except Exception as e:
             # 上传失败，删除已上传的文件
             logging.error(f"上传文件失败，开始回滚: {e}")
@@ -97,15 +86,10 @@ def process_zip_upload(zip_path, site_id, site_name, user_id):
         site_url = storage.get_site_url(site_id)
         
         # 更新站点记录
-        with current_app.app_context():
-            site = Site.query.get(site_id)
-            if site:
-                site.oss_url = site_url
-                site.status = "completed"
-                db.session.commit()
-                logging.info(f"成功创建站点: {site_name} (ID: {site_id})")
-            else:
-                logging.error(f"找不到站点记录: {site_id}")
+        if run_write(_complete_site, site_id, site_url, stats):
+            logging.info(f"成功创建站点: {site_name} (ID: {site_id})")
+        else:
+            logging.error(f"找不到站点记录: {site_id}")
         
     except Exception as e:
         logging.error(f"处理 ZIP 上传任务失败: {e}")
@@ -137,13 +121,17 @@ def process_html_paste(html_code, site_id, site_name, user_id):
         with open(index_html_path, "w", encoding="utf-8") as f:
             f.write(html_code)
         
+        # 统计站点用量并检查用户配额
+        stats = collect_site_stats(extract_path)
+        check_quota(user_id, stats["total_bytes"], site_id=site_id)
+        
         # 获取存储服务
         storage = get_storage_service(current_app)
         
         # 上传到存储服务
         remote_path = f"{site_id}/index.html"
         try:
-            storage.upload_file(index_html_path, remote_path)
+            storage.upload_site(site_id, extract_path)
             logging.info(f"成功上传粘贴的 HTML 到存储服务: {remote_path}")
         except Exception as e:
             logging.error(f"存储服务上传失败: {e}")
@@ -158,15 +146,10 @@ def process_html_paste(html_code, site_id, site_name, user_id):
         site_url = storage.get_site_url(site_id)
         
         # 更新站点记录
-        with current_app.app_context():
-            site = Site.query.get(site_id)
-            if site:
-                site.oss_url = site_url
-                site.status = "completed"
-                db.session.commit()
-                logging.info(f"成功创建粘贴站点: {site_name}")
-            else:
-                logging.error(f"找不到站点记录: {site_id}")
+        if run_write(_complete_site, site_id, site_url, stats):
+            logging.info(f"成功创建粘贴站点: {site_name}")
+        else:
+            logging.error(f"找不到站点记录: {site_id}")
         
     except Exception as e:
         logging.error(f"处理 HTML 粘贴任务失败: {e}")
@@ -184,17 +167,33 @@ def process_html_paste(html_code, site_id, site_name, user_id):
             logging.error(f"清理临时文件失败: {e}")
 
 
+def _complete_site(site_id, site_url, stats):
+    """将站点标记为处理完成并记录用量，站点记录不存在时返回 False"""
+    site = Site.query.get(site_id)
+    if not site:
+        return False
+    site.oss_url = site_url
+    site.status = "completed"
+    record_site_published(site, stats)
+    return True
+
+
+def _set_site_status(site_id, status, error_message=None):
+    """设置站点状态，站点记录不存在时返回 False"""
+    site = Site.query.get(site_id)
+    if not site:
+        return False
+    site.status = status
+    if error_message:
+        site.error_message = error_message
+    return True
+
+
 def update_site_status(site_id, status, error_message=None):
     """更新站点状态"""
     try:
-        with current_app.app_context():
-            site = Site.query.get(site_id)
-            if site:
-                site.status = status
-                if error_message:
-                    site.error_message = error_message
-                db.session.commit()
-                logging.info(f"更新站点 {site_id} 状态为 {status}")
+        if run_write(_set_site_status, site_id, status, error_message):
+            logging.info(f"更新站点 {site_id} 状态为 {status}")
     except Exception as e:
         logging.error(f"更新站点状态失败: {e}")
 
@@ -0,0 +1,253 @@
+"""
+计时模块 - 按请求记录数据库、存储和模板渲染等阶段的耗时
+
+各阶段耗时通过 Server-Timing 响应头返回（可只对管理员返回），总耗时超过阈值时
+记录一条结构化的慢请求日志（slow_request 类别，总是记录）。
+"""
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+from flask import current_app, request, session, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from html_hoster.logs import log_event
+
+# 当前请求的计时器，不在请求中时为 None
+_current_timer = contextvars.ContextVar("html_hoster_request_timer", default=None)
+
+# Server-Timing 中各阶段的顺序: 请求解析和会话加载、数据库、存储、模板渲染
+PHASES = ("wsgi", "db", "storage", "render")
+
+
+class RequestTimer:
+    """记录一个请求各阶段的累计耗时"""
+
+    __slots__ = ("start", "dispatch_start", "spans", "queries", "_active", "_starts")
+
+    def __init__(self, start):
+        self.start = start
+        self.dispatch_start = None
+        self.spans = {}
+        self.queries = 0
+        self._active = set()
+        self._starts = {}
+
+    def enter(self, name):
+        """
+        开始一个阶段
+
+        返回:
+            bool: 是否为最外层的调用；嵌套调用（如包装存储调用底层存储）不重复计时
+        """
+        if name in self._active:
+            return False
+        self._active.add(name)
+        return True
+
+    def exit(self, name, seconds):
+        """结束最外层的阶段并累计耗时"""
+        self._active.discard(name)
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def start_span(self, name):
+        """开始一个阶段，与 end_span 配对使用，用于开始和结束在不同回调中的阶段"""
+        if self.enter(name):
+            self._starts[name] = time.perf_counter()
+
+    def end_span(self, name):
+        start = self._starts.pop(name, None)
+        if start is not None:
+            self.exit(name, time.perf_counter() - start)
+
+
+def current_timer():
+    """获取当前请求的计时器，计时未启用或不在请求中时返回 None"""
+    return _current_timer.get()
+
+
+@contextmanager
+def span(name):
+    """将代码块的耗时计入当前请求的指定阶段"""
+    timer = _current_timer.get()
+    if timer is None or not timer.enter(name):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.exit(name, time.perf_counter() - start)
+
+
+class TimingMiddleware:
+    """WSGI 中间件，在请求进入应用前创建计时器"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        token = _current_timer.set(RequestTimer(time.perf_counter()))
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            _current_timer.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.queries += 1
+        conn.info["html_hoster_query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("html_hoster_query_start", None)
+    timer = _current_timer.get()
+    if start is not None and timer is not None:
+        timer.spans["db"] = timer.spans.get("db", 0.0) + time.perf_counter() - start
+
+
+def _before_render(sender, template, context, **extra):
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.start_span("render")
+
+
+def _after_render(sender, template, context, **extra):
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.end_span("render")
+
+
+def _mark_dispatch():
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.dispatch_start = time.perf_counter()
+
+
+def _server_timing_allowed():
+    mode = current_app.config.get("SERVER_TIMING", "off")
+    if mode == "all":
+        return True
+    if mode == "admin":
+        from html_hoster.cache import get_cached_user
+
+        # 没有会话 Cookie 的请求不可能是管理员；服务端会话在请求中未被读取时也不为此加载
+        if not request.cookies.get(current_app.session_interface.get_cookie_name(current_app)):
+            return False
+        if not getattr(session, "loaded", True):
+            return False
+        user = get_cached_user(session.get("user_id"))
+        return bool(user and user.is_admin)
+    return False
+
+
+def _format_server_timing(timer, total):
+    # 响应头只能使用 ASCII 字符
+    entries = []
+    for name in PHASES:
+        seconds = timer.spans.get(name)
+        if seconds is None:
+            continue
+        entry = f"{name};dur={seconds * 1000:.2f}"
+        if name == "db":
+            entry += f';desc="{timer.queries} queries"'
+        entries.append(entry)
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+def _log_slow_request(config, timer, total, method, path, route, status):
+    """总耗时超过 SLOW_REQUEST_THRESHOLD_MS 时记录慢请求日志"""
+    threshold = config.get("SLOW_REQUEST_THRESHOLD_MS", 0)
+    if threshold and total * 1000 >= threshold:
+        log_event(
+            "slow_request", "慢请求 %s %s 耗时 %.2f 毫秒", method, path, total * 1000,
+            level=logging.WARNING,
+            method=method,
+            path=path,
+            route=route,
+            status=status,
+            total_ms=round(total * 1000, 2),
+            db_queries=timer.queries,
+            spans_ms={name: round(seconds * 1000, 2) for name, seconds in timer.spans.items()},
+        )
+
+
+def _finish_timing(response):
+    timer = _current_timer.get()
+    if timer is None:
+        return response
+
+    # 先判断是否返回响应头，查询管理员身份的耗时也计入本次请求
+    send_header = _server_timing_allowed()
+    total = time.perf_counter() - timer.start
+    if timer.dispatch_start is not None:
+        timer.spans["wsgi"] = timer.dispatch_start - timer.start
+
+    _log_slow_request(current_app.config, timer, total, request.method, request.path,
+                      request.url_rule.rule if request.url_rule is not None else None, response.status_code)
+
+    if send_header:
+        response.headers["Server-Timing"] = _format_server_timing(timer, total)
+    return response
+
+
+def timing_enabled(config):
+    """是否启用请求阶段计时"""
+    return config.get("SERVER_TIMING", "off") != "off" or bool(config.get("SLOW_REQUEST_THRESHOLD_MS", 0))
+
+
+def begin_timing():
+    """
+    为不经过 Flask 的请求（站点文件快速通道）开始计时
+
+    返回:
+        用于 finish_timing 的令牌
+    """
+    return _current_timer.set(RequestTimer(time.perf_counter()))
+
+
+def cancel_timing(token):
+    """放弃计时，请求交给 Flask 处理时由 TimingMiddleware 重新计时"""
+    _current_timer.reset(token)
+
+
+def finish_timing(token, config, method, path, route, status):
+    """
+    结束 begin_timing 开始的计时，超过阈值时记录慢请求日志
+
+    没有会话，SERVER_TIMING=admin 时不返回响应头。
+
+    返回:
+        str: Server-Timing 响应头的值，不返回响应头时为 None
+    """
+    timer = _current_timer.get()
+    _current_timer.reset(token)
+    total = time.perf_counter() - timer.start
+    _log_slow_request(config, timer, total, method, path, route, status)
+    if config.get("SERVER_TIMING", "off") == "all":
+        return _format_server_timing(timer, total)
+    return None
+
+
+def init_timing(app):
+    """注册请求阶段计时，SERVER_TIMING=off 且未设置慢请求阈值时不启用"""
+    if not timing_enabled(app.config):
+        logging.info("请求阶段计时未启用")
+        return
+
+    app.wsgi_app = TimingMiddleware(app.wsgi_app)
+    app.before_request(_mark_dispatch)
+    app.after_request(_finish_timing)
+
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    logging.info(f"请求阶段计时已启用: Server-Timing={app.config.get('SERVER_TIMING')}, "
+                 f"慢请求阈值={app.config.get('SLOW_REQUEST_THRESHOLD_MS')}ms")
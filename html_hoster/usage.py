@@ -0,0 +1,160 @@
+"""
+用量模块 - 记录站点的文件数量和大小，维护用户的用量汇总并检查配额
+"""
+import os
+import logging
+
+from flask import current_app
+from sqlalchemy import select, update, func
+
+from html_hoster.database import db, Site, User
+from html_hoster.storage import iter_site_files
+
+
+# 已处理完成（不再占用进行中名额）的站点状态
+FINISHED_STATUSES = ("completed", "failed")
+
+
+class QuotaExceededError(Exception):
+    """用户的站点数量或存储用量超过配额"""
+    pass
+
+
+def collect_site_stats(source_dir, compressed_bytes=None):
+    """
+    统计本地站点目录的用量
+
+    Args:
+        source_dir: 本地站点目录
+        compressed_bytes: 上传内容的原始大小（ZIP 包大小），为 None 时等于文件总大小
+
+    返回:
+        dict: file_count、total_bytes 和 compressed_bytes
+    """
+    file_count = 0
+    total_bytes = 0
+    for local_path, _ in iter_site_files(source_dir):
+        file_count += 1
+        total_bytes += os.path.getsize(local_path)
+    return {
+        "file_count": file_count,
+        "total_bytes": total_bytes,
+        "compressed_bytes": total_bytes if compressed_bytes is None else compressed_bytes,
+    }
+
+
+def check_quota(user_id, incoming_bytes=0, new_site=True, site_id=None):
+    """
+    检查用户配额，读取用户记录上的用量汇总和进行中的站点数量
+
+    已发布的站点计入用户记录上的站点数量；上传后尚未处理完成的站点也会占用站点数量配额，
+    避免并发上传同时通过检查。
+
+    Args:
+        user_id: 用户ID
+        incoming_bytes: 即将写入的字节数
+        new_site: 是否会新增一个站点
+        site_id: 已写入记录的进行中站点，统计进行中的站点时不重复计入
+
+    Raises:
+        QuotaExceededError: 超过站点数量或存储用量配额
+    """
+    if user_id is None:
+        return
+
+    max_sites = current_app.config.get("USER_MAX_SITES", 0)
+    quota_bytes = current_app.config.get("USER_QUOTA_MB", 0) * 1024 * 1024
+    if not max_sites and not quota_bytes:
+        return
+
+    usage = db.session.execute(
+        select(User.site_count, User.total_bytes).where(User.id == user_id)
+    ).one_or_none()
+    if usage is None:
+        return
+
+    site_count, total_bytes = usage
+    if max_sites and new_site:
+        in_progress = select(func.count(Site.id)).where(
+            Site.user_id == user_id, Site.status.notin_(FINISHED_STATUSES)
+        )
+        if site_id is not None:
+            in_progress = in_progress.where(Site.id != site_id)
+        site_count += db.session.execute(in_progress).scalar_one()
+        if site_count >= max_sites:
+            raise QuotaExceededError(f"站点数量已达到上限 {max_sites} 个")
+    if quota_bytes and total_bytes + incoming_bytes > quota_bytes:
+        raise QuotaExceededError(f"存储用量超过配额 {quota_bytes // (1024 * 1024)} MB")
+
+
+def add_pending_site(site, incoming_bytes=0):
+    """
+    写入进行中的站点记录并占用站点数量配额
+
+    先提交记录再检查配额，并发的上传请求都能看到彼此占用的名额；超过配额时删除记录。
+
+    Raises:
+        QuotaExceededError: 超过站点数量或存储用量配额
+    """
+    db.session.add(site)
+    db.session.commit()
+    try:
+        check_quota(site.user_id, incoming_bytes, site_id=site.id)
+    except QuotaExceededError:
+        db.session.delete(site)
+        db.session.commit()
+        raise
+
+
+def add_user_usage(user_id, site_count, total_bytes):
+    """增量更新用户的用量汇总，在站点发布和删除时调用"""
+    if user_id is None:
+        return
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(site_count=User.site_count + site_count, total_bytes=User.total_bytes + total_bytes)
+    )
+
+
+def record_site_published(site, stats):
+    """记录站点用量，并计入所属用户的用量汇总"""
+    site.file_count = stats["file_count"]
+    site.total_bytes = stats["total_bytes"]
+    site.compressed_bytes = stats["compressed_bytes"]
+    add_user_usage(site.user_id, 1, stats["total_bytes"])
+
+
+def record_site_deleted(site):
+    """从所属用户的用量汇总中扣除站点用量"""
+    if site.status == "completed":
+        add_user_usage(site.user_id, -1, -(site.total_bytes or 0))
+
+
+def recount_user_usage():
+    """
+    根据站点记录重新计算所有用户的用量汇总，用于修正汇总数据
+
+    返回:
+        int: 更新的用户数量
+    """
+    totals = {
+        user_id: (count, total_bytes or 0)
+        for user_id, count, total_bytes in db.session.execute(
+            select(Site.user_id, func.count(Site.id), func.sum(Site.total_bytes))
+            .where(Site.user_id.isnot(None), Site.status == "completed")
+            .group_by(Site.user_id)
+        )
+    }
+
+    updated = 0
+    for user in User.query.all():
+        site_count, total_bytes = totals.get(user.id, (0, 0))
+        if user.site_count != site_count or user.total_bytes != total_bytes:
+            logging.info(f"修正用户 {user.username} 的用量: {user.site_count} -> {site_count} 个站点, "
+                         f"{user.total_bytes} -> {total_bytes} 字节")
+            user.site_count = site_count
+            user.total_bytes = total_bytes
+            updated += 1
+    db.session.commit()
+    return updated
@@ -2,15 +2,31 @@
 视图模块 - 使用Blueprint组织路由
 """
 import os
+import json
 import uuid
+import base64
 import zipfile
 import logging
-from flask import Blueprint, render_template, request, redirect, url_for, jsonify, session, current_app, g, send_from_directory
+from datetime import datetime
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, session, current_app, g, send_from_directory, Response, stream_with_context
+from sqlalchemy import select, or_, and_, func, text
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
 import mimetypes
 from html_hoster.storage import get_storage_service
+from html_hoster.resilience import StorageUnavailableError
 from html_hoster.database import db, Site
-from html_hoster.auth import login_required
+from html_hoster.auth import login_required, admin_required
+from html_hoster.cache import fragment_cache, get_cached_user, get_cached_site
+from html_hoster.offload import FileOffload
+from html_hoster.replica import replica_read
+from html_hoster.db_pool import get_pool_stats
+from html_hoster.usage import QuotaExceededError, add_pending_site, check_quota, record_site_deleted
+from html_hoster.timing import span
+from html_hoster.logs import log_event
+from html_hoster.profiler import ProfilerBusyError, start_profile, get_profile
+from html_hoster.warmup import record_hit, warmup_pending
 
 # 创建Blueprint
 main_bp = Blueprint('main', __name__)
@@ -24,23 +40,71 @@ def get_storage():
     return g.storage
 
 @main_bp.route("/")
+@replica_read
 def index():
     """首页"""
     logging.info("访问首页")
+    user_id = session.get('user_id')
+    site_count = 0
     try:
-        user_id = session.get('user_id')
         if user_id:
-            # 获取当前用户的站点
-            sites = Site.query.filter_by(user_id=user_id).order_by(Site.created_at.desc()).all()
+            # 获取当前用户的站点（分页）
+            site_count, sites_html = render_user_sites("_index_sites.html", user_id, "main.index")
         else:
             # 未登录用户不显示任何站点
-            sites = []
-        logging.info(f"从数据库获取了 {len(sites)} 个站点")
+            sites_html = render_template("_index_sites.html", sites=[], page=1, pages=0)
+        logging.info(f"用户共有 {site_count} 个站点")
     except Exception as e:
         logging.error(f"数据库查询失败: {e}")
-        sites = []
+        sites_html = render_template("_index_sites.html", sites=[], page=1, pages=0)
     
-    return render_template("index.html", sites=sites)
+    return render_template("index.html", site_count=site_count, sites_html=sites_html)
+
+
+def get_user_site_summary(user_id):
+    """
+    通过一次聚合查询获取用户的站点数量和最近更新时间
+
+    返回:
+        tuple: (站点数量, 最近更新时间)
+    """
+    return db.session.execute(
+        select(func.count(Site.id), func.max(Site.updated_at)).where(Site.user_id == user_id)
+    ).one()
+
+
+def render_user_sites(template, user_id, endpoint):
+    """
+    渲染用户站点列表的一页，渲染结果按用户缓存
+
+    页码取自请求参数 page，超出范围时使用最近的有效页。缓存键包含站点数量和最近更新时间，
+    因此其他进程修改站点后缓存也会失效；本进程内的修改由会话提交事件直接使缓存失效。
+
+    返回:
+        tuple: (站点数量, 渲染后的 HTML 片段)
+    """
+    per_page = current_app.config.get("SITES_PAGE_SIZE", 20)
+    generation = fragment_cache.generation(user_id)
+    site_count, last_updated = get_user_site_summary(user_id)
+
+    pages = max(1, -(-site_count // per_page))
+    page = min(max(request.args.get("page", 1, type=int) or 1, 1), pages)
+
+    cache_key = (template, page, per_page, site_count, last_updated)
+    sites_html = fragment_cache.get(user_id, cache_key)
+    if sites_html is not None:
+        return site_count, sites_html
+
+    sites = (
+        Site.query.filter_by(user_id=user_id)
+        .order_by(Site.created_at.desc(), Site.id.desc())
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+        .all()
+    )
+    sites_html = render_template(template, sites=sites, page=page, pages=pages, pagination_endpoint=endpoint)
+    fragment_cache.set(user_id, cache_key, sites_html, generation=generation)
+    return site_count, sites_html
 
 
 @main_bp.route("/paste_site", methods=["POST"])
@@ -58,6 +122,12 @@ def paste_site():
         if len(html_code) > 1024 * 1024:  # 1MB
             return jsonify({"success": False, "msg": "HTML代码太大，最大支持 1MB"}), 400
         
+        # 检查用户配额
+        try:
+            check_quota(session.get('user_id'), len(html_code.encode("utf-8")))
+        except QuotaExceededError as e:
+            return jsonify({"success": False, "msg": str(e)}), 403
+        
         site_id = str(uuid.uuid4())
         
         # 如果没有提供站点名称，生成默认名称
@@ -77,12 +147,14 @@ def paste_site():
             user_id=session.get('user_id'),
             status="pending"
         )
-        db.session.add(new_site)
-        db.session.commit()
+        try:
+            add_pending_site(new_site, len(html_code.encode("utf-8")))
+        except QuotaExceededError as e:
+            return jsonify({"success": False, "msg": str(e)}), 403
         
         # 启动异步任务处理 HTML 粘贴
-        from html_hoster.tasks import process_html_paste
-        current_app.executor.submit(process_html_paste, html_code, site_id, site_name, session.get('user_id'))
+        from html_hoster.tasks import process_html_paste, submit_job
+        submit_job(process_html_paste, html_code, site_id, site_name, session.get('user_id'))
         
         logging.info(f"已提交 HTML 粘贴任务: {site_name} (ID: {site_id})")
         return redirect(url_for("main.index"))
@@ -109,6 +181,12 @@ def upload_file():
         if not file.filename.endswith(".zip"):
             return jsonify({"success": False, "msg": "只支持ZIP格式文件"}), 400
         
+        # 检查用户配额（解压后的大小在后台任务中再次检查）
+        try:
+            check_quota(session.get('user_id'), request.content_length or 0)
+        except QuotaExceededError as e:
+            return jsonify({"success": False, "msg": str(e)}), 403
+        
         # 生成站点ID和安全的文件名
         site_id = str(uuid.uuid4())
         
@@ -160,12 +238,15 @@ def upload_file():
                 user_id=session.get('user_id'),
                 status="pending"
             )
-            db.session.add(new_site)
-            db.session.commit()
+            try:
+                add_pending_site(new_site, request.content_length or 0)
+            except QuotaExceededError as e:
+                os.remove(zip_path)
+                return jsonify({"success": False, "msg": str(e)}), 403
             
             # 启动异步任务处理 ZIP 文件
-            from html_hoster.tasks import process_zip_upload
-            current_app.executor.submit(process_zip_upload, zip_path, site_id, site_name, session.get('user_id'))
+            from html_hoster.tasks import process_zip_upload, submit_job
+            submit_job(process_zip_upload, zip_path, site_id, site_name, session.get('user_id'))
             
             logging.info(f"已提交 ZIP 上传任务: {site_name} (ID: {site_id})")
             return redirect(url_for("main.index"))
@@ -183,11 +264,12 @@ def upload_file():
 
 
 @site_bp.route("/<site_id>/<path:filename>")
+@replica_read
 def serve_site_file(site_id, filename):
     """提供站点文件访问"""
     try:
-        # 检查站点是否存在及其发布状态
-        site = Site.query.get(site_id)
+        # 检查站点是否存在及其发布状态（使用站点缓存，与快速通道一致）
+        site = get_cached_site(site_id)
         if not site:
             return render_template("error.html", 
                                 error_code=404,
@@ -204,12 +286,33 @@ def serve_site_file(site_id, filename):
         # 检查使用的存储类型
         storage_type = current_app.config.get("STORAGE_TYPE", "").lower()
         
-        if storage_type == "local":
-            # 对于本地存储，直接从sites目录提供文件
-            site_path = os.path.join(current_app.config["SITES_FOLDER"], site_id)
-            return send_from_directory(site_path, filename)
+        local_mode = current_app.config.get("LOCAL_STORAGE_MODE", "files")
+        
+        if storage_type == "local" and local_mode == "files":
+            # 对于本地存储，直接从sites目录提供文件（按分片布局定位站点目录）
+            offload = FileOffload.from_config(current_app.config)
+            with span("storage"):
+                site_path = get_storage().get_site_path(site_id)
+                if offload is not None:
+                    # 只做权限检查，文件内容由反向代理发送
+                    file_path = safe_join(site_path, filename)
+                    # 不存在的文件直接返回 404，也不计入访问次数
+                    if file_path is None or not os.path.isfile(file_path):
+                        raise NotFound()
+                    guessed_type, _ = mimetypes.guess_type(filename)
+                    response = Response(b"", mimetype=guessed_type or "application/octet-stream")
+                    response.headers["Cache-Control"] = "no-cache"
+                    header, value = offload.header(file_path)
+                    response.headers[header] = value
+                else:
+                    response = send_from_directory(site_path, filename)
+            log_event("site_file", "提供站点文件: %s/%s", site_id, filename,
+                      site_id=site_id, path=filename, status=response.status_code)
+            if site.is_published:
+                record_hit(site_id, filename, response.status_code)
+            return response
         else:
-            # 其他存储类型，从存储服务获取文件
+            # 其他存储类型（以及本地打包模式），从存储服务获取文件
             content, content_type = get_storage().download_file(f"{site_id}/{filename}")
             
             if content is None:
@@ -219,7 +322,6 @@ def serve_site_file(site_id, filename):
                                     error_detail=f"请求的文件 {filename} 不存在"), 404
             
             # 设置响应
-            from flask import Response
             response = Response(content)
             
             # 设置Content-Type
@@ -231,8 +333,23 @@ def serve_site_file(site_id, filename):
                 if guessed_type:
                     response.headers["Content-Type"] = guessed_type
             
+            log_event("site_file", "提供站点文件: %s/%s", site_id, filename,
+                      site_id=site_id, path=filename, status=response.status_code, bytes=len(content))
+            if site.is_published:
+                record_hit(site_id, filename, response.status_code)
             return response
         
+    except NotFound:
+        return render_template("error.html", 
+                             error_code=404,
+                             error_message="文件未找到",
+                             error_detail=f"请求的文件 {filename} 不存在"), 404
+    except StorageUnavailableError as e:
+        logging.warning(f"存储服务暂时不可用 {site_id}/{filename}: {e}")
+        return render_template("error.html", 
+                             error_code=503,
+                             error_message="服务暂时不可用",
+                             error_detail="存储服务响应缓慢，请稍后再试"), 503
     except Exception as e:
         logging.error(f"提供站点文件失败 {site_id}/{filename}: {e}")
         return render_template("error.html", 
@@ -268,7 +385,8 @@ def delete_site(site_id):
             logging.error(f"删除存储服务文件失败: {e}")
             # 继续删除数据库记录
         
-        # 删除数据库记录
+        # 删除数据库记录，并从用户的用量汇总中扣除
+        record_site_deleted(site)
         db.session.delete(site)
         db.session.commit()
         
@@ -317,17 +435,127 @@ def rename_site(site_id):
         return jsonify({"success": False, "msg": "重命名站点失败"}), 500
 
 
+# 站点列表 API 可选择的字段
+SITE_API_FIELDS = (
+    "id", "name", "oss_url", "created_at", "updated_at", "description",
+    "is_published", "user_id", "status", "error_message",
+    "file_count", "total_bytes", "compressed_bytes",
+)
+# 站点列表 API 的分页大小
+SITE_API_DEFAULT_LIMIT = 50
+SITE_API_MAX_LIMIT = 500
+
+
+def _encode_cursor(created_at, site_id):
+    """将 (created_at, id) 编码为分页游标"""
+    payload = json.dumps([created_at.isoformat(), site_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """解析分页游标，返回 (created_at, id)，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, site_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(site_id)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+
+def _site_row_to_dict(row, fields):
+    """将查询结果行转换为字典，只包含请求的字段"""
+    data = {}
+    for field in fields:
+        value = getattr(row, field)
+        data[field] = value.isoformat() if isinstance(value, datetime) else value
+    return data
+
+
 @main_bp.route("/api/sites", methods=["GET"])
+@replica_read
 def api_list_sites():
-    """API: 获取站点列表"""
+    """
+    API: 获取站点列表
+    
+    查询参数:
+        limit: 每页数量，默认 50，最大 500
+        cursor: 上一页返回的 next_cursor
+        fields: 逗号分隔的字段列表，默认返回全部字段
+        owner: me（默认，只返回当前用户的站点）或 all（仅管理员）；未登录时只返回已发布的站点
+        format: json（默认）或 ndjson（流式导出全部匹配的站点，不分页）
+    """
     try:
-        sites = Site.query.order_by(Site.created_at.desc()).all()
-        sites_data = [site.to_dict() for site in sites]
+        # 解析字段
+        fields_param = request.args.get("fields", "").strip()
+        if fields_param:
+            fields = [field.strip() for field in fields_param.split(",") if field.strip()]
+            unknown = [field for field in fields if field not in SITE_API_FIELDS]
+            if unknown:
+                return jsonify({"success": False, "msg": f"不支持的字段: {', '.join(unknown)}"}), 400
+        else:
+            fields = list(SITE_API_FIELDS)
+        
+        # 解析分页参数
+        try:
+            limit = int(request.args.get("limit", SITE_API_DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({"success": False, "msg": "limit 必须是整数"}), 400
+        limit = max(1, min(limit, SITE_API_MAX_LIMIT))
+        
+        cursor = request.args.get("cursor")
+        try:
+            cursor_position = _decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({"success": False, "msg": str(e)}), 400
+        
+        # 只查询需要的列，分页所需的 created_at 和 id 总是查询
+        columns = [getattr(Site, field) for field in dict.fromkeys(fields + ["created_at", "id"])]
+        query = select(*columns)
+        
+        # 按调用者身份过滤
+        user_id = session.get('user_id')
+        owner = request.args.get("owner", "me")
+        if not user_id:
+            query = query.where(Site.is_published.is_(True))
+        elif owner == "all":
+            user = get_cached_user(user_id)
+            if not user or not user.is_admin:
+                return jsonify({"success": False, "msg": "需要管理员权限"}), 403
+        else:
+            query = query.where(Site.user_id == user_id)
+        
+        # 基于 (created_at, id) 的游标分页
+        if cursor_position:
+            created_at, site_id = cursor_position
+            query = query.where(or_(
+                Site.created_at < created_at,
+                and_(Site.created_at == created_at, Site.id < site_id),
+            ))
+        query = query.order_by(Site.created_at.desc(), Site.id.desc())
+        
+        if request.args.get("format") == "ndjson":
+            # 流式导出，逐批从数据库读取，内存占用不随站点数量增长
+            def generate():
+                result = db.session.execute(query.execution_options(yield_per=1000))
+                for row in result:
+                    yield json.dumps(_site_row_to_dict(row, fields), ensure_ascii=False) + "\n"
+            
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        
+        rows = db.session.execute(query.limit(limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        sites_data = [_site_row_to_dict(row, fields) for row in rows]
+        
+        next_cursor = None
+        if has_more and rows[-1].created_at is not None:
+            next_cursor = _encode_cursor(rows[-1].created_at, rows[-1].id)
         
         return jsonify({
             "success": True,
             "data": sites_data,
-            "count": len(sites_data)
+            "count": len(sites_data),
+            "next_cursor": next_cursor
         })
         
     except Exception as e:
@@ -340,12 +568,25 @@ def health_check():
     """健康检查"""
     try:
         # 检查数据库连接
-        db.session.execute("SELECT 1")
-        
-        return jsonify({
+        db.session.execute(text("SELECT 1"))
+        
+        warmer = current_app.extensions.get("cache_warmer")
+        # 启用就绪检查时，缓存预热完成前不接收流量
+        if warmup_pending(current_app):
+            return jsonify({
+                "status": "warming",
+                "message": "正在预热缓存",
+                "warmup": warmer.summary()
+            }), 503
+        
+        result = {
             "status": "ok",
-            "message": "服务正常"
-        })
+            "message": "服务正常",
+            "db_pool": get_pool_stats()
+        }
+        if warmer is not None:
+            result["warmup"] = warmer.summary()
+        return jsonify(result)
         
     except Exception as e:
         logging.error(f"健康检查失败: {e}")
@@ -355,6 +596,65 @@ def health_check():
         }), 500
 
 
+@main_bp.route("/api/admin/profile", methods=["POST"])
+@admin_required
+def api_start_profile():
+    """
+    API: 启动采样剖析（仅管理员）
+    
+    查询参数:
+        seconds: 采样时长，默认 10 秒，最长 PROFILER_MAX_SECONDS
+        interval_ms: 采样间隔，默认 10 毫秒，最短 PROFILER_MIN_INTERVAL_MS
+        idle: 为 1 时计入处于空闲等待的线程
+    
+    剖析在后台进行，立即返回剖析ID，通过 /api/admin/profile/<id> 获取结果。
+    """
+    if not current_app.config.get("PROFILER_ENABLED", True):
+        return jsonify({"success": False, "msg": "采样剖析未启用"}), 404
+    
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        interval_ms = float(request.args.get("interval_ms", 10))
+    except ValueError:
+        return jsonify({"success": False, "msg": "seconds 和 interval_ms 必须是数字"}), 400
+    seconds = max(0.1, min(seconds, current_app.config.get("PROFILER_MAX_SECONDS", 60)))
+    interval_ms = max(interval_ms, current_app.config.get("PROFILER_MIN_INTERVAL_MS", 5))
+    
+    try:
+        profile = start_profile(seconds, interval_ms / 1000, include_idle=request.args.get("idle") == "1")
+    except ProfilerBusyError as e:
+        return jsonify({"success": False, "msg": str(e)}), 409
+    
+    logging.info(f"管理员 {session.get('username')} 启动采样剖析 {profile.id}")
+    return jsonify({"success": True, "data": profile.summary()}), 202
+
+
+@main_bp.route("/api/admin/profile/<profile_id>", methods=["GET"])
+@admin_required
+def api_get_profile(profile_id):
+    """
+    API: 获取采样剖析结果（仅管理员）
+    
+    查询参数:
+        format: json（默认，返回状态和统计信息）或 collapsed（折叠格式的调用栈，可用于生成火焰图）
+    
+    剖析尚未结束时返回 202。
+    """
+    profile = get_profile(profile_id)
+    if profile is None:
+        return jsonify({"success": False, "msg": "剖析不存在"}), 404
+    
+    if profile.running:
+        return jsonify({"success": True, "data": profile.summary()}), 202
+    
+    if request.args.get("format") == "collapsed":
+        response = Response(profile.collapsed(), content_type="text/plain; charset=utf-8")
+        response.headers["Content-Disposition"] = f"attachment; filename=profile-{profile.id}.folded"
+        return response
+    
+    return jsonify({"success": True, "data": profile.summary()})
+
+
 @main_bp.route("/toggle_site_visibility/<site_id>", methods=["POST"])
 @login_required
 def toggle_site_publish_status(site_id):
@@ -388,6 +688,7 @@ def toggle_site_publish_status(site_id):
 
 
 @main_bp.route("/api/site/<site_id>/status", methods=["GET"])
+@replica_read
 def api_site_status(site_id):
     """API: 获取站点状态"""
     try:
@@ -409,4 +710,49 @@ def api_site_status(site_id):
         
     except Exception as e:
         logging.error(f"API获取站点状态失败: {e}")
-        return jsonify({"success": False, "msg": "获取站点状态失败"}), 500 
\ No newline at end of file
+        return jsonify({"success": False, "msg": "获取站点状态失败"}), 500 
+
+# 批量状态 API 单次最多查询的站点数量
+SITE_STATUS_MAX_IDS = 100
+# 批量状态 API 返回的字段
+SITE_STATUS_FIELDS = ("id", "name", "status", "error_message", "oss_url", "is_published")
+
+
+@main_bp.route("/api/sites/status", methods=["GET"])
+@replica_read
+def api_sites_status():
+    """
+    API: 批量获取站点状态
+    
+    查询参数:
+        ids: 逗号分隔的站点ID，也可以重复传入，最多 SITE_STATUS_MAX_IDS 个
+    
+    所有站点通过一次 IN 查询获取，响应带 ETag，状态没有变化时返回 304。
+    """
+    try:
+        ids = []
+        for value in request.args.getlist("ids"):
+            ids.extend(site_id.strip() for site_id in value.split(",") if site_id.strip())
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return jsonify({"success": False, "msg": "缺少 ids 参数"}), 400
+        if len(ids) > SITE_STATUS_MAX_IDS:
+            return jsonify({"success": False, "msg": f"一次最多查询 {SITE_STATUS_MAX_IDS} 个站点"}), 400
+        
+        columns = [getattr(Site, field) for field in SITE_STATUS_FIELDS]
+        rows = db.session.execute(select(*columns).where(Site.id.in_(ids))).all()
+        found = {row.id: _site_row_to_dict(row, SITE_STATUS_FIELDS) for row in rows}
+        
+        response = jsonify({
+            "success": True,
+            "data": [found[site_id] for site_id in ids if site_id in found],
+            "missing": [site_id for site_id in ids if site_id not in found],
+        })
+        # 允许缓存但每次都要验证，客户端可以带 If-None-Match 获取 304
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.add_etag()
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        logging.error(f"API批量获取站点状态失败: {e}")
+        return jsonify({"success": False, "msg": "获取站点状态失败"}), 500
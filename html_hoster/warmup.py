@@ -0,0 +1,357 @@
+"""
+缓存预热模块 - 记录站点文件的访问次数，服务启动时预热访问最多的站点
+
+站点文件请求在内存中按路径累计访问次数，由后台线程定期合并写入 site_hit 表（多个进程和
+实例共用）。新实例启动时，后台预热任务按访问次数从高到低读取最近被访问的路径，在限速下
+批量读取站点信息，并通过存储服务读取已发布站点的文件，填充进程内的存储缓存（打包文件、远程
+打包索引、降级缓存）和分层存储的本地副本，避免所有新实例同时以冷缓存访问存储桶。
+站点信息同时写入站点缓存，但默认只保留 SITE_CACHE_TTL（5 秒），预热完成后很快过期，
+持续有效的只有存储缓存。
+启用就绪检查时，预热完成前 /health 返回 503，多进程模式下的工作进程在预热完成后才开始监听。
+"""
+import time
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+
+# site_hit 表中路径的最大长度，更长的路径不记录
+MAX_PATH_LENGTH = 512
+# 预热时每次查询的站点数
+SITE_BATCH_SIZE = 500
+# 写入访问次数时每条批量语句的路径数
+HIT_WRITE_BATCH_SIZE = 500
+# 计入访问次数的响应状态码
+HIT_STATUSES = (200, 206, 304)
+
+
+class HitCounter:
+    """在内存中累计站点文件的访问次数，由后台线程定期写入数据库"""
+
+    def __init__(self, max_paths=10000):
+        self.enabled = False
+        self.max_paths = max_paths
+        self.dropped = 0
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, site_id, path):
+        """记录一次访问；一个写入周期内的路径数达到上限后，只累计已有路径的次数"""
+        if not self.enabled or len(path) > MAX_PATH_LENGTH:
+            return
+        key = (site_id, path)
+        with self._lock:
+            if key in self._counts:
+                self._counts[key] += 1
+            elif len(self._counts) < self.max_paths:
+                self._counts[key] = 1
+            else:
+                self.dropped += 1
+
+    def drain(self):
+        """取出并清空累计的访问次数"""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return counts
+
+
+hit_counter = HitCounter()
+
+
+def record_hit(site_id, path, status):
+    """记录一次站点文件访问，只计入找到了文件的请求，避免不存在的路径占满路径数上限"""
+    if status in HIT_STATUSES:
+        hit_counter.record(site_id, path)
+
+
+def _upsert_hits_statement(dialect_name):
+    """
+    生成按主键累加访问次数的批量 upsert 语句
+
+    返回:
+        Insert: 可以批量执行的语句，数据库不支持 upsert 时返回 None
+    """
+    from html_hoster.database import SiteHit
+
+    table = SiteHit.__table__
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update(
+            hits=table.c.hits + stmt.inserted.hits, last_hit_at=stmt.inserted.last_hit_at
+        )
+
+    if dialect_name in ("postgresql", "sqlite"):
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=[table.c.site_id, table.c.path],
+            set_={"hits": table.c.hits + stmt.excluded.hits, "last_hit_at": stmt.excluded.last_hit_at},
+        )
+    return None
+
+
+def _write_hits(counts, now):
+    """把一个周期内的访问次数累加到 site_hit 表"""
+    from sqlalchemy import update
+    from html_hoster.database import db, SiteHit
+
+    rows = [
+        {"site_id": site_id, "path": path, "hits": hits, "last_hit_at": now}
+        for (site_id, path), hits in counts.items()
+    ]
+    stmt = _upsert_hits_statement(db.session.get_bind(mapper=SiteHit).dialect.name)
+    if stmt is not None:
+        # 分批执行，每批一条多行语句
+        for start in range(0, len(rows), HIT_WRITE_BATCH_SIZE):
+            db.session.execute(stmt, rows[start:start + HIT_WRITE_BATCH_SIZE])
+        return len(rows)
+
+    for row in rows:
+        result = db.session.execute(
+            update(SiteHit)
+            .where(SiteHit.site_id == row["site_id"], SiteHit.path == row["path"])
+            .values(hits=SiteHit.hits + row["hits"], last_hit_at=now)
+        )
+        if result.rowcount == 0:
+            db.session.add(SiteHit(**row))
+    return len(rows)
+
+
+class HitFlusher:
+    """定期把内存中的访问次数写入数据库"""
+
+    def __init__(self, app, counter, interval=60.0):
+        self.app = app
+        self.counter = counter
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="site-hit-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """写入当前累计的访问次数，返回写入的路径数"""
+        from sqlalchemy.exc import IntegrityError
+        from html_hoster.database import run_write
+
+        counts = self.counter.drain()
+        if not counts:
+            return 0
+        now = datetime.utcnow()
+        with self.app.app_context():
+            # 不支持 upsert 的数据库中，其他进程同时插入同一路径时主键冲突，重试一次即可改为累加
+            for attempt in range(2):
+                try:
+                    return run_write(_write_hits, counts, now)
+                except IntegrityError:
+                    if attempt:
+                        logging.warning(f"写入站点文件访问次数失败，丢弃 {len(counts)} 个路径的记录")
+                except Exception as e:
+                    logging.warning(f"写入站点文件访问次数失败: {e}")
+                    break
+        return 0
+
+    def stop(self):
+        """停止定期写入，并写入剩余的访问次数"""
+        self._stop.set()
+        self.flush()
+
+
+def top_paths(limit, window_hours):
+    """
+    读取最近被访问、访问次数最多的站点文件路径
+
+    返回:
+        list: [(站点ID, 文件路径), ...]，按访问次数从高到低排列
+    """
+    from sqlalchemy import select
+    from html_hoster.database import db, SiteHit
+
+    since = datetime.utcnow() - timedelta(hours=window_hours)
+    rows = db.session.execute(
+        select(SiteHit.site_id, SiteHit.path)
+        .where(SiteHit.last_hit_at >= since)
+        .order_by(SiteHit.hits.desc())
+        .limit(limit)
+    ).all()
+    return [(row.site_id, row.path) for row in rows]
+
+
+class CacheWarmer:
+    """按访问次数从高到低预热存储缓存（站点缓存只在 SITE_CACHE_TTL 内有效）"""
+
+    def __init__(self, app, top_n=200, rate=20.0, window_hours=168, timeout=120.0):
+        """
+        初始化缓存预热
+
+        Args:
+            app: Flask应用实例
+            top_n: 预热的路径数
+            rate: 每秒最多发起的数据库查询和存储读取次数
+            window_hours: 只预热最近多少小时内被访问过的路径
+            timeout: 预热的最长时间（秒），超时后停止
+        """
+        from html_hoster.ratelimit import TokenBucket
+
+        self.app = app
+        self.top_n = top_n
+        self.window_hours = window_hours
+        self.timeout = timeout
+        self.bucket = TokenBucket(max(1.0, rate), rate)
+        self.done = threading.Event()
+        self.stats = {"sites": 0, "files": 0, "bytes": 0, "errors": 0, "seconds": 0.0}
+        self._thread = None
+
+    def _acquire(self, deadline):
+        """按限速等待，超过预热的最长时间时返回 False"""
+        while True:
+            wait = self.bucket.try_acquire()
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def _prefetch_sites(self, site_ids, deadline):
+        """分批读取站点信息写入站点缓存，返回已发布的站点ID集合"""
+        from html_hoster.cache import prefetch_sites
+
+        published = set()
+        for start in range(0, len(site_ids), SITE_BATCH_SIZE):
+            if not self._acquire(deadline):
+                break
+            found = prefetch_sites(site_ids[start:start + SITE_BATCH_SIZE])
+            published.update(site_id for site_id, site in found.items() if site.is_published)
+        return published
+
+    def run(self, dry_run=False):
+        """
+        执行预热，返回统计信息
+
+        Args:
+            dry_run: 只读取需要预热的路径，不读取站点信息和文件
+        """
+        from html_hoster.resilience import StorageUnavailableError
+        from html_hoster.storage import get_storage_service
+
+        start = time.monotonic()
+        deadline = start + self.timeout
+        try:
+            with self.app.app_context():
+                try:
+                    paths = top_paths(self.top_n, self.window_hours)
+                except Exception as e:
+                    logging.warning(f"读取站点文件访问次数失败，跳过缓存预热: {e}")
+                    return self.stats
+                if dry_run:
+                    self.stats["paths"] = paths
+                    return self.stats
+
+                site_ids = list(dict.fromkeys(site_id for site_id, _ in paths))
+                published = self._prefetch_sites(site_ids, deadline)
+
+                storage = get_storage_service(self.app)
+                for site_id, path in paths:
+                    if site_id not in published:
+                        continue
+                    if not self._acquire(deadline):
+                        logging.warning(f"缓存预热超过 {self.timeout} 秒，停止预热")
+                        break
+                    try:
+                        content, _ = storage.download_file(f"{site_id}/{path}")
+                    except StorageUnavailableError as e:
+                        # 存储服务不可用时不继续请求，避免加重后端负担
+                        logging.warning(f"存储服务不可用，停止预热文件: {e}")
+                        self.stats["errors"] += 1
+                        break
+                    except Exception as e:
+                        logging.debug(f"预热文件失败 {site_id}/{path}: {e}")
+                        self.stats["errors"] += 1
+                        continue
+                    if content is not None:
+                        self.stats["files"] += 1
+                        self.stats["bytes"] += len(content)
+
+                # 读取文件需要一段时间，最后重新读取站点信息，使站点缓存在预热完成时最新
+                # （站点缓存只保留 SITE_CACHE_TTL 秒，只能覆盖预热完成后最初的请求）
+                if published and time.monotonic() < deadline:
+                    self.stats["sites"] = len(self._prefetch_sites(list(published), deadline))
+            return self.stats
+        finally:
+            self.stats["seconds"] = round(time.monotonic() - start, 3)
+            self.done.set()
+
+    def _run_background(self):
+        try:
+            stats = self.run()
+            logging.info(f"缓存预热完成: 站点 {stats['sites']} 个, 文件 {stats['files']} 个, "
+                         f"{stats['bytes']} 字节, 失败 {stats['errors']} 次, 耗时 {stats['seconds']} 秒")
+        except Exception as e:
+            logging.error(f"缓存预热失败: {e}")
+            self.done.set()
+
+    def start(self):
+        """在后台线程中执行预热"""
+        self._thread = threading.Thread(target=self._run_background, name="cache-warmup", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """等待预热完成，返回是否已完成"""
+        return self.done.wait(timeout)
+
+    def summary(self):
+        """预热状态，用于健康检查"""
+        return {"done": self.done.is_set(), **self.stats}
+
+
+def create_cache_warmer(app):
+    """按配置创建缓存预热"""
+    return CacheWarmer(
+        app,
+        top_n=app.config.get("CACHE_WARMUP_TOP_N", 200),
+        rate=app.config.get("CACHE_WARMUP_RATE", 20.0),
+        window_hours=app.config.get("CACHE_WARMUP_WINDOW_HOURS", 168),
+        timeout=app.config.get("CACHE_WARMUP_TIMEOUT", 120.0),
+    )
+
+
+def start_cache_warmup(app):
+    """服务启动时在后台预热缓存，未启用时返回 None"""
+    if not app.config.get("CACHE_WARMUP", True):
+        return None
+    warmer = create_cache_warmer(app).start()
+    app.extensions["cache_warmer"] = warmer
+    logging.info(f"开始缓存预热: 最多 {warmer.top_n} 个路径, 每秒 {warmer.bucket.rate} 次读取")
+    return warmer
+
+
+def warmup_pending(app):
+    """启用就绪检查且预热尚未完成时返回 True"""
+    if not app.config.get("CACHE_WARMUP_READINESS_GATE", False):
+        return False
+    warmer = app.extensions.get("cache_warmer")
+    return warmer is not None and not warmer.done.is_set()
+
+
+def init_warmup(app):
+    """初始化站点文件访问次数记录"""
+    if not app.config.get("SITE_HIT_TRACKING", True):
+        hit_counter.enabled = False
+        logging.info("站点文件访问次数记录未启用")
+        return
+
+    hit_counter.max_paths = app.config.get("SITE_HIT_MAX_PATHS", 10000)
+    hit_counter.enabled = True
+    flusher = HitFlusher(app, hit_counter, interval=app.config.get("SITE_HIT_FLUSH_INTERVAL", 60))
+    app.extensions["site_hit_flusher"] = flusher
+    # 进程退出时写入最后一个周期的访问次数
+    atexit.register(flusher.stop)
+    logging.info(f"站点文件访问次数记录已启用，每 {flusher.interval} 秒写入数据库")
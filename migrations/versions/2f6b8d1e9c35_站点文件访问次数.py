@@ -0,0 +1,35 @@
+"""站点文件访问次数
+
+Revision ID: 2f6b8d1e9c35
+Revises: 5e7a9b3c2d41
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2f6b8d1e9c35"
+down_revision = "5e7a9b3c2d41"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "site_hit",
+        sa.Column("site_id", sa.String(length=36), nullable=False),
+        sa.Column("path", sa.String(length=512), nullable=False),
+        sa.Column("hits", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("last_hit_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("site_id", "path"),
+    )
+    # 启动预热时按访问次数从高到低读取
+    op.create_index("ix_site_hit_hits", "site_hit", ["hits"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_site_hit_hits", table_name="site_hit")
+    op.drop_table("site_hit")
@@ -0,0 +1,51 @@
+"""站点和用户用量统计
+
+Revision ID: 5e7a9b3c2d41
+Revises: 8c1d2e7f4a90
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5e7a9b3c2d41"
+down_revision = "8c1d2e7f4a90"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("site", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("file_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("total_bytes", sa.BigInteger(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("compressed_bytes", sa.BigInteger(), nullable=False, server_default="0"))
+
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("site_count", sa.Integer(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("total_bytes", sa.BigInteger(), nullable=False, server_default="0"))
+
+    # 已有站点的文件大小未知，用户的站点数量按已发布的站点计算
+    user = sa.table("user", sa.column("id"), sa.column("site_count"))
+    site = sa.table("site", sa.column("user_id"), sa.column("status"))
+    op.execute(
+        user.update().values(
+            site_count=sa.select(sa.func.count())
+            .select_from(site)
+            .where(site.c.user_id == user.c.id, site.c.status == "completed")
+            .scalar_subquery()
+        )
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.drop_column("total_bytes")
+        batch_op.drop_column("site_count")
+
+    with op.batch_alter_table("site", schema=None) as batch_op:
+        batch_op.drop_column("compressed_bytes")
+        batch_op.drop_column("total_bytes")
+        batch_op.drop_column("file_count")
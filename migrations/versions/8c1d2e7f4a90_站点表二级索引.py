@@ -0,0 +1,36 @@
+"""站点表二级索引
+
+Revision ID: 8c1d2e7f4a90
+Revises: 3b42050e4e2f
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "8c1d2e7f4a90"
+down_revision = "3b42050e4e2f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 按用户列出站点（首页、个人资料、user_id IS NULL 检查）
+    op.create_index(
+        "ix_site_user_id_created_at", "site", ["user_id", "created_at"], unique=False
+    )
+    # 按创建时间排序和分页（站点列表 API）
+    op.create_index("ix_site_created_at_id", "site", ["created_at", "id"], unique=False)
+    # 查找处理中或失败的任务
+    op.create_index(
+        "ix_site_status_created_at", "site", ["status", "created_at"], unique=False
+    )
+
+
+def downgrade():
+    op.drop_index("ix_site_status_created_at", table_name="site")
+    op.drop_index("ix_site_created_at_id", table_name="site")
+    op.drop_index("ix_site_user_id_created_at", table_name="site")
@@ -0,0 +1,38 @@
+"""加长密码哈希字段
+
+Revision ID: 9a4c6e2b7d18
+Revises: 2f6b8d1e9c35
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9a4c6e2b7d18"
+down_revision = "2f6b8d1e9c35"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # scrypt 哈希长度为 162 个字符，超过原来的 128
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.alter_column(
+            "password_hash",
+            existing_type=sa.String(length=128),
+            type_=sa.String(length=256),
+            existing_nullable=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.alter_column(
+            "password_hash",
+            existing_type=sa.String(length=256),
+            type_=sa.String(length=128),
+            existing_nullable=False,
+        )
@@ -0,0 +1,78 @@
+"""
+测试共用的 fixture
+
+应用使用临时目录中的 SQLite 数据库和本地存储，配置通过环境变量传入。
+"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """按环境变量创建应用，返回创建函数"""
+
+    def factory(**env):
+        values = {
+            "FLASK_ENV": "development",
+            "DB_TYPE": "sqlite",
+            "STORAGE_TYPE": "local",
+            "SQLITE_DB_PATH": str(tmp_path / "app.db"),
+            "SITES_FOLDER": str(tmp_path / "sites"),
+            "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+            "SESSION_FILE_DIR": str(tmp_path / "sessions"),
+            "SESSION_SQLITE_PATH": str(tmp_path / "sessions.db"),
+            "LOG_FILE": str(tmp_path / "app.log"),
+            "LOG_LEVEL": "WARNING",
+            "LOG_ASYNC": "false",
+            "SITE_HIT_TRACKING": "false",
+            "CACHE_WARMUP": "false",
+        }
+        values.update({key: str(value) for key, value in env.items()})
+        for key, value in values.items():
+            monkeypatch.setenv(key, value)
+
+        from html_hoster.__main__ import create_app
+        from html_hoster.database import db
+
+        app = create_app()
+        app.config["TESTING"] = True
+        with app.app_context():
+            db.create_all()
+        return app
+
+    return factory
+
+
+@pytest.fixture
+def create_site(tmp_path):
+    """把文件上传到存储并创建站点记录，返回创建函数"""
+
+    def factory(app, files, is_published=True, user_id=None, status="completed"):
+        from html_hoster.database import db, Site
+        from html_hoster.storage import get_storage_service
+
+        site_id = str(uuid.uuid4())
+        source_dir = tmp_path / f"source-{site_id}"
+        for path, content in files.items():
+            file_path = source_dir / path
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_bytes(content.encode() if isinstance(content, str) else content)
+
+        with app.app_context():
+            if files:
+                get_storage_service(app).upload_site(site_id, str(source_dir))
+            db.session.add(Site(id=site_id, name=f"site-{site_id[:8]}", oss_url=f"/site/{site_id}/index.html",
+                                is_published=is_published, status=status, user_id=user_id))
+            db.session.commit()
+        return site_id
+
+    return factory
+
+
+@pytest.fixture
+def secret_file(tmp_path):
+    """网站目录之外的文件，用于检查路径穿越"""
+    path = tmp_path / "secret.txt"
+    path.write_text("top secret")
+    return path
@@ -0,0 +1,172 @@
+"""站点文件快速通道的测试"""
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from html_hoster.fastpath import SiteFastPath, parse_site_path
+from html_hoster.resilience import StorageUnavailableError
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/site/abc/index.html", ("abc", "index.html")),
+    ("/site/abc/css/main.css", ("abc", "css/main.css")),
+    # WSGI 路径按 latin-1 传递，需要还原为 UTF-8
+    ("/site/abc/" + "页面.html".encode("utf-8").decode("latin-1"), ("abc", "页面.html")),
+    ("/site/abc", None),
+    ("/site/abc/", None),
+    ("/site//index.html", None),
+    ("/site/abc/css/", None),
+    ("/site/abc/css//main.css", None),
+    ("/static/main.css", None),
+    ("/site/abc/\xff.html", None),
+    # . 和 .. 路径段交给 Flask 处理，由存储服务拒绝
+    ("/site/abc/../secret.txt", None),
+    ("/site/abc/css/../../secret.txt", None),
+    ("/site/abc/./index.html", None),
+    ("/site/../secret.txt", None),
+    ("/site/./index.html", None),
+    ("/site/abc/..", None),
+    ("/site/abc/..\\secret.txt", None),
+    ("/site/abc/..config.html", ("abc", "..config.html")),
+])
+def test_parse_site_path(path, expected):
+    assert parse_site_path(path) == expected
+
+
+class FlaskStub:
+    """记录被调用次数的下一层 WSGI 应用"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, environ, start_response):
+        self.calls += 1
+        start_response("299 FALLTHROUGH", [("Content-Type", "text/plain")])
+        return [b"flask"]
+
+
+def call(fast_path, path, method="GET", headers=None):
+    environ = EnvironBuilder(path=path, method=method, headers=headers).get_environ()
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response["status"] = int(status[:3])
+        response["headers"] = dict(response_headers)
+
+    body = fast_path(environ, start_response)
+    response["body"] = b"".join(body)
+    if hasattr(body, "close"):
+        body.close()
+    return response
+
+
+@pytest.fixture
+def files_app(make_app):
+    return make_app(LOCAL_STORAGE_MODE="files")
+
+
+@pytest.fixture
+def fast_path(files_app):
+    return SiteFastPath(files_app, FlaskStub())
+
+
+def test_published_file_is_served_without_flask(files_app, create_site, fast_path):
+    site_id = create_site(files_app, {"index.html": "<h1>hi</h1>"})
+
+    response = call(fast_path, f"/site/{site_id}/index.html")
+    assert response["status"] == 200
+    assert response["body"] == b"<h1>hi</h1>"
+    assert fast_path.wsgi_app.calls == 0
+
+    etag = response["headers"]["ETag"]
+    assert call(fast_path, f"/site/{site_id}/index.html", headers={"If-None-Match": etag})["status"] == 304
+    head = call(fast_path, f"/site/{site_id}/index.html", method="HEAD")
+    assert head["status"] == 200 and head["body"] == b""
+    assert fast_path.wsgi_app.calls == 0
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"path": "/site/{unknown}/index.html"},
+    {"path": "/site/{unpublished}/index.html"},
+    {"path": "/site/{published}/index.html", "method": "POST"},
+    {"path": "/site/{published}/index.html", "headers": {"Range": "bytes=0-1"}},
+    {"path": "/site/{published}/"},
+    {"path": "/"},
+])
+def test_requests_that_fall_through_to_flask(files_app, create_site, fast_path, kwargs):
+    ids = {
+        "unknown": "00000000-0000-0000-0000-000000000000",
+        "unpublished": create_site(files_app, {"index.html": "draft"}, is_published=False),
+        "published": create_site(files_app, {"index.html": "<h1>hi</h1>"}),
+    }
+    kwargs = dict(kwargs, path=kwargs["path"].format(**ids))
+
+    response = call(fast_path, **kwargs)
+    assert response["status"] == 299
+    assert fast_path.wsgi_app.calls == 1
+
+
+def test_missing_local_file_returns_404_without_flask(files_app, create_site, fast_path):
+    site_id = create_site(files_app, {"index.html": "<h1>hi</h1>"})
+
+    response = call(fast_path, f"/site/{site_id}/missing.html")
+    assert response["status"] == 404
+    assert "missing.html".encode() in response["body"]
+    assert fast_path.wsgi_app.calls == 0
+
+
+class CountingStorage:
+    """记录读取次数的存储服务"""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.reads = 0
+
+    def download_file(self, remote_path):
+        self.reads += 1
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.mark.parametrize("storage, status", [
+    (CountingStorage(result=(None, None)), 404),
+    (CountingStorage(error=StorageUnavailableError("熔断")), 503),
+    (CountingStorage(error=RuntimeError("读取失败")), 500),
+])
+def test_stored_file_errors_are_answered_once(make_app, create_site, storage, status):
+    app = make_app(LOCAL_STORAGE_MODE="pack")
+    site_id = create_site(app, {"index.html": "<h1>hi</h1>"})
+    fast_path = SiteFastPath(app, FlaskStub())
+    fast_path._storage = storage
+
+    response = call(fast_path, f"/site/{site_id}/index.html")
+    assert response["status"] == status
+    assert storage.reads == 1
+    assert fast_path.wsgi_app.calls == 0
+
+
+def test_fast_path_timing(make_app, create_site, caplog):
+    import logging
+
+    app = make_app(LOCAL_STORAGE_MODE="files", SERVER_TIMING="all")
+    # 每个请求都记录慢请求日志
+    app.config["SLOW_REQUEST_THRESHOLD_MS"] = 0.001
+    site_id = create_site(app, {"index.html": "<h1>hi</h1>"})
+    assert isinstance(app.wsgi_app, SiteFastPath)
+
+    with caplog.at_level(logging.WARNING):
+        response = app.test_client().get(f"/site/{site_id}/index.html")
+    assert response.status_code == 200
+    server_timing = response.headers["Server-Timing"]
+    assert "storage;dur=" in server_timing and "total;dur=" in server_timing
+    slow = [record.fields for record in caplog.records if getattr(record, "fields", {}).get("category") == "slow_request"]
+    assert slow and slow[0]["route"] == "/site/<site_id>/<path:filename>" and slow[0]["status"] == 200
+
+
+def test_fast_path_timing_admin_mode_has_no_header(make_app, create_site):
+    app = make_app(LOCAL_STORAGE_MODE="files", SERVER_TIMING="admin")
+    site_id = create_site(app, {"index.html": "<h1>hi</h1>"})
+    response = app.test_client().get(f"/site/{site_id}/index.html")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
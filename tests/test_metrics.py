@@ -0,0 +1,81 @@
+"""
+/metrics 访问控制和存储操作统计
+"""
+import pytest
+
+
+def test_metrics_local_only_without_token(make_app):
+    client = make_app().test_client()
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "::1"}).status_code == 200
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "203.0.113.5"}).status_code == 403
+
+
+def test_metrics_token_required(make_app):
+    client = make_app(METRICS_TOKEN="s3cret").test_client()
+    remote = {"REMOTE_ADDR": "203.0.113.5"}
+    assert client.get("/metrics", environ_base=remote).status_code == 401
+    assert client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == 401
+    response = client.get("/metrics", environ_base=remote, headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert b"html_hoster_http_requests_total" in response.data
+
+
+def test_storage_metrics_concurrent_first_calls(monkeypatch):
+    """多个线程同时第一次调用存储操作时，指标子项只创建一次，之后的调用正常"""
+    import time
+    import threading
+    from html_hoster import metrics
+
+    labels = metrics.STORAGE_DURATION.labels
+
+    def slow_labels(*values):
+        time.sleep(0.05)
+        return labels(*values)
+
+    monkeypatch.setattr(metrics.STORAGE_DURATION, "labels", slow_labels)
+
+    class ConcurrentTestStorage:
+        def download_file(self, remote_path):
+            return b"data", "text/plain"
+
+    metrics.instrument_storage_class(ConcurrentTestStorage)
+    storage = ConcurrentTestStorage()
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def first_call():
+        barrier.wait()
+        try:
+            storage.download_file("a/index.html")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=first_call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert storage.download_file("a/index.html") == (b"data", "text/plain")
+    rendered = metrics.registry.render()
+    assert 'html_hoster_storage_operation_duration_seconds_count{backend="concurrenttest",operation="download_file"} 5' in rendered
+
+
+@pytest.mark.parametrize("header", ["X-Forwarded-For", "Forwarded", "X-Real-IP"])
+def test_metrics_rejects_proxied_requests_without_trusted_proxy(make_app, header):
+    """同一台机器上的反向代理转发的请求对端地址也是本机，不能因此访问 /metrics"""
+    client = make_app().test_client()
+    response = client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"},
+                          headers={header: "203.0.113.5"})
+    assert response.status_code == 403
+
+
+def test_metrics_with_trusted_proxy_uses_client_address(make_app):
+    client = make_app(TRUSTED_PROXY_COUNT=1).test_client()
+    local = {"REMOTE_ADDR": "127.0.0.1"}
+    assert client.get("/metrics", environ_base=local,
+                      headers={"X-Forwarded-For": "203.0.113.5"}).status_code == 403
+    assert client.get("/metrics", environ_base=local,
+                      headers={"X-Forwarded-For": "127.0.0.1"}).status_code == 200
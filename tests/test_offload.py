@@ -0,0 +1,63 @@
+"""
+反向代理配置和文件发送卸载
+"""
+import logging
+
+import pytest
+
+
+@pytest.fixture
+def proxy_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("STORAGE_TYPE", "local")
+    monkeypatch.setenv("LOCAL_STORAGE_MODE", "files")
+    monkeypatch.setenv("SITES_FOLDER", str(tmp_path / "sites"))
+    return monkeypatch
+
+
+@pytest.mark.parametrize("server", ["nginx", "apache"])
+def test_proxy_config_restricts_admin_endpoints(server, proxy_env):
+    from html_hoster.config import get_config
+    from html_hoster.offload import render_proxy_config
+
+    content = render_proxy_config(get_config().to_flask_config(), server=server)
+    if server == "nginx":
+        for location in ("location = /metrics {", "location /api/admin/profile {"):
+            block = content.split(location, 1)[1].split("}", 1)[0]
+            assert "allow 127.0.0.1;" in block and "deny all;" in block
+    else:
+        assert '<Location "/metrics">\n        Require local' in content
+        assert '<Location "/api/admin/profile">\n        Require local' in content
+
+
+@pytest.mark.parametrize("count, warned", [(0, True), (1, False)])
+def test_proxy_config_warns_without_trusted_proxy(proxy_env, caplog, capsys, count, warned):
+    from html_hoster.__main__ import run_proxy_config
+
+    proxy_env.setenv("LOCAL_FILE_OFFLOAD", "x-accel-redirect")
+    proxy_env.setenv("TRUSTED_PROXY_COUNT", str(count))
+    with caplog.at_level(logging.WARNING):
+        run_proxy_config("nginx", None, 80, False)
+    assert ("TRUSTED_PROXY_COUNT" in caplog.text) == warned
+    assert "upstream html_hoster" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("fast_path", [True, False], ids=["fast-path", "flask"])
+def test_offload_missing_files_not_counted(make_app, create_site, monkeypatch, fast_path):
+    from html_hoster.warmup import HitCounter, hit_counter
+
+    app = make_app(LOCAL_STORAGE_MODE="files", LOCAL_FILE_OFFLOAD="x-accel-redirect",
+                   SITE_FAST_PATH=str(fast_path).lower())
+    site_id = create_site(app, {"index.html": "<h1>hi</h1>"})
+    counter = HitCounter()
+    counter.enabled = True
+    monkeypatch.setattr(hit_counter, "record", counter.record)
+
+    client = app.test_client()
+    response = client.get(f"/site/{site_id}/index.html")
+    assert response.status_code == 200
+    assert response.headers["X-Accel-Redirect"].endswith("/index.html")
+    for i in range(3):
+        response = client.get(f"/site/{site_id}/missing-{i}.html")
+        assert response.status_code == 404
+        assert "X-Accel-Redirect" not in response.headers
+    assert counter.drain() == {(site_id, "index.html"): 1}
@@ -0,0 +1,43 @@
+"""
+密码哈希方法升级判断
+"""
+import pytest
+from werkzeug.security import generate_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from html_hoster.passwords import PasswordHasher, normalize_hash_method
+
+
+@pytest.mark.parametrize("method, expected", [
+    ("pbkdf2", f"pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}"),
+    ("pbkdf2:sha512", f"pbkdf2:sha512:{DEFAULT_PBKDF2_ITERATIONS}"),
+    ("pbkdf2:sha256:1000", "pbkdf2:sha256:1000"),
+    ("scrypt", "scrypt:32768:8:1"),
+    ("scrypt:16384:8:1", "scrypt:16384:8:1"),
+])
+def test_normalize_hash_method(method, expected):
+    assert normalize_hash_method(method) == expected
+
+
+@pytest.mark.parametrize("method", ["md5", "scrypt:1", "pbkdf2:sha256:1:2"])
+def test_invalid_hash_method(method):
+    with pytest.raises(ValueError):
+        normalize_hash_method(method)
+
+
+@pytest.mark.parametrize("method", ["pbkdf2", "pbkdf2:sha256", "pbkdf2:sha256:1000", "scrypt"])
+def test_hash_from_same_method_needs_no_rehash(method):
+    hasher = PasswordHasher(method, workers=1)
+    assert not hasher.needs_rehash(generate_password_hash("secret", normalize_hash_method(method)))
+
+
+def test_changed_method_needs_rehash():
+    hasher = PasswordHasher("pbkdf2:sha256:2000", workers=1)
+    assert hasher.needs_rehash(generate_password_hash("secret", "pbkdf2:sha256:1000"))
+    assert hasher.needs_rehash(generate_password_hash("secret", "scrypt:1024:8:1"))
+
+
+def test_scrypt_hash_fits_column():
+    from html_hoster.database import User
+
+    password_hash = PasswordHasher("scrypt", workers=1).hash("secret")
+    assert len(password_hash) <= User.__table__.c.password_hash.type.length
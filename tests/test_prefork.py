@@ -0,0 +1,64 @@
+"""
+多进程主进程的平滑重新加载
+"""
+import sys
+import time
+
+import pytest
+
+from html_hoster import prefork
+from html_hoster.prefork import Supervisor
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="需要 POSIX 进程管理")
+
+# 通知主进程已开始监听后保持运行的工作进程
+READY_WORKER = [sys.executable, "-c",
+                "import os, time; os.write(int(os.environ['HTML_HOSTER_READY_FD']), b'1'); time.sleep(60)"]
+# 一直不通知开始监听的工作进程
+STUCK_WORKER = [sys.executable, "-c", "import time; time.sleep(60)"]
+
+
+def wait_ready(supervisor, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not all(worker.check_ready() for worker in supervisor.workers):
+        assert time.monotonic() < deadline, "工作进程未开始监听"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    monkeypatch.setattr(prefork, "POLL_INTERVAL", 0.02)
+    supervisor = Supervisor(READY_WORKER, processes=2, graceful_timeout=5, startup_timeout=10)
+    for _ in range(supervisor.processes):
+        supervisor._spawn()
+    yield supervisor
+    supervisor._terminate(list(supervisor.workers))
+
+
+def test_reload_replaces_workers(supervisor):
+    wait_ready(supervisor)
+    old_pids = {worker.process.pid for worker in supervisor.workers}
+
+    supervisor._handle_reload()
+
+    assert supervisor.generation == 1
+    assert len(supervisor.workers) == 2
+    assert all(worker.generation == 1 for worker in supervisor.workers)
+    assert not old_pids & {worker.process.pid for worker in supervisor.workers}
+
+
+def test_crashed_old_worker_restarted_during_reload(supervisor):
+    wait_ready(supervisor)
+    crashed = supervisor.workers[0]
+    crashed.process.kill()
+    crashed.process.wait()
+
+    # 新进程一直未开始监听，等待期间旧进程异常退出时应当重启
+    supervisor.command = STUCK_WORKER
+    supervisor.startup_timeout = 1.0
+    supervisor._handle_reload()
+
+    assert supervisor.generation == 0
+    assert crashed not in supervisor.workers
+    assert len(supervisor.workers) == 2
+    assert all(worker.generation == 0 and worker.process.poll() is None for worker in supervisor.workers)
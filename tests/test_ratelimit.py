@@ -0,0 +1,35 @@
+"""
+认证请求限流的客户端 IP
+"""
+
+
+def login(client, forwarded_for):
+    return client.post("/auth/login", data={"username": "nobody", "password": "wrong"},
+                       headers={"X-Forwarded-For": forwarded_for})
+
+
+def test_rate_limit_defaults_match_config(make_app):
+    app = make_app()
+    limiter = app.extensions["auth_rate_limiter"]
+    assert limiter.global_bucket.capacity == app.config["AUTH_RATE_LIMIT_GLOBAL_BURST"] == 30
+    assert limiter.global_bucket.rate == app.config["AUTH_RATE_LIMIT_GLOBAL_PER_SECOND"] == 5
+
+
+def test_forwarded_for_ignored_without_trusted_proxy(make_app):
+    app = make_app(AUTH_RATE_LIMIT_PER_IP_BURST=1, AUTH_RATE_LIMIT_PER_IP_PER_MINUTE=0.001)
+    client = app.test_client()
+    assert login(client, "10.0.0.1").status_code != 429
+    # 未配置受信任的代理时伪造的 X-Forwarded-For 不能绕过限流
+    assert login(client, "10.0.0.2").status_code == 429
+
+
+def test_trusted_proxy_uses_forwarded_client_ip(make_app):
+    app = make_app(AUTH_RATE_LIMIT_PER_IP_BURST=1, AUTH_RATE_LIMIT_PER_IP_PER_MINUTE=0.001,
+                   TRUSTED_PROXY_COUNT=1)
+    client = app.test_client()
+    assert login(client, "10.0.0.1").status_code != 429
+    assert login(client, "10.0.0.1").status_code == 429
+    # 代理之后的其他客户端使用各自的令牌桶
+    assert login(client, "10.0.0.2").status_code != 429
+    # 只信任最后一层代理添加的地址
+    assert login(client, "10.0.0.9, 10.0.0.1").status_code == 429
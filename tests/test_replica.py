@@ -0,0 +1,41 @@
+"""
+只读副本路由
+"""
+from sqlalchemy import create_engine, text
+
+
+class FakeRouter:
+    """轮流返回两个副本的路由，记录选择次数"""
+
+    def __init__(self):
+        self.engines = [create_engine("sqlite://"), create_engine("sqlite://")]
+        self.calls = 0
+
+    def choose(self):
+        self.calls += 1
+        return self.engines[self.calls % 2]
+
+
+def test_replica_is_chosen_once_per_transaction(make_app):
+    from html_hoster.database import db
+
+    app = make_app()
+    router = FakeRouter()
+    app.extensions["db_replicas"] = router
+
+    with app.app_context():
+        db.session.info["use_replica"] = True
+        first = db.session.get_bind(clause=text("SELECT 1"))
+        db.session.execute(text("SELECT 1"))
+        db.session.execute(text("SELECT 2"))
+        assert db.session.get_bind(clause=text("SELECT 3")) is first
+        assert router.calls == 1
+
+        db.session.commit()
+        db.session.execute(text("SELECT 1"))
+        assert db.session.get_bind(clause=text("SELECT 2")) is not first
+        assert router.calls == 2
+
+        db.session.close()
+        db.session.execute(text("SELECT 1"))
+        assert router.calls == 3
@@ -0,0 +1,151 @@
+"""
+对冲请求和熔断器
+"""
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from html_hoster.resilience import CircuitBreaker, FallbackCache, LatencyTracker, hedged_call
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=4)
+    yield executor
+    executor.shutdown(wait=False)
+
+
+class Backend:
+    """按调用顺序返回结果的远程读取，每次调用为 (耗时, 结果或异常)"""
+
+    def __init__(self, *behaviors):
+        self.behaviors = list(behaviors)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            delay, outcome = self.behaviors[min(self.calls, len(self.behaviors) - 1)]
+            self.calls += 1
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_fast_call_is_not_hedged(executor):
+    backend = Backend((0, "first"))
+    assert hedged_call(executor, backend, hedge_delay=0.5, timeout=2) == "first"
+    assert backend.calls == 1
+
+
+def test_slow_call_is_hedged(executor):
+    backend = Backend((1.0, "slow"), (0, "hedge"))
+    start = time.monotonic()
+    assert hedged_call(executor, backend, hedge_delay=0.05, timeout=2) == "hedge"
+    assert backend.calls == 2
+    assert time.monotonic() - start < 0.5
+
+
+def test_first_success_wins_over_failed_hedge(executor):
+    backend = Backend((0.2, "slow"), (0, OSError("hedge failed")))
+    assert hedged_call(executor, backend, hedge_delay=0.05, timeout=2) == "slow"
+
+
+def test_no_hedge_without_delay(executor):
+    backend = Backend((1.0, "slow"))
+    with pytest.raises(TimeoutError):
+        hedged_call(executor, backend, hedge_delay=None, timeout=0.1)
+    assert backend.calls == 1
+
+
+def test_timeout_when_both_calls_are_slow(executor):
+    backend = Backend((1.0, "slow"))
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        hedged_call(executor, backend, hedge_delay=0.05, timeout=0.2)
+    assert backend.calls == 2
+    assert time.monotonic() - start < 0.5
+
+
+def test_errors_are_raised(executor):
+    with pytest.raises(OSError, match="first"):
+        hedged_call(executor, Backend((0, OSError("first"))), hedge_delay=0.5, timeout=2)
+    # 两次调用都失败时抛出最后一个错误
+    backend = Backend((0.1, OSError("first")), (0.2, OSError("hedge")))
+    with pytest.raises(OSError, match="hedge"):
+        hedged_call(executor, backend, hedge_delay=0.05, timeout=2)
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_allows_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 试探请求完成前不放行其他请求
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_reopens_when_trial_fails():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_breaker_disabled():
+    breaker = CircuitBreaker(failure_threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_latency_p95():
+    tracker = LatencyTracker(window=100, min_samples=20)
+    for i in range(19):
+        tracker.record(i / 1000)
+    assert tracker.p95() is None
+    for i in range(19, 100):
+        tracker.record(i / 1000)
+    assert tracker.p95() == pytest.approx(0.094)
+
+
+def test_fallback_cache_evicts_least_recently_used():
+    cache = FallbackCache(max_bytes=80)
+    for key in "abcd":
+        cache.put(key, b"x" * 10)
+    cache.put("big", b"x" * 11)  # 超过 max_bytes // 8，不缓存
+    assert cache.get("big") is None
+    assert cache.get("a") == (b"x" * 10, None)
+    for key in "efghi":
+        cache.put(key, b"y" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
@@ -0,0 +1,143 @@
+"""
+服务端会话存储的过期和会话ID更换
+"""
+import pytest
+from flask import session
+
+from html_hoster import sessions
+from html_hoster.sessions import FilesystemSessionStore, MemorySessionStore, SqliteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite", "filesystem"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore()
+    if request.param == "sqlite":
+        return SqliteSessionStore(tmp_path / "sessions.db")
+    return FilesystemSessionStore(tmp_path / "sessions")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可以手动推进的 time.time"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(sessions.time, "time", lambda: now[0])
+    return now
+
+
+SID = "a" * 43
+
+
+def test_session_expires(store, clock):
+    store.set(SID, b"data", 10)
+    clock[0] += 5
+    assert store.get(SID) == b"data"
+    clock[0] += 6
+    assert store.get(SID) is None
+
+
+def test_read_refreshes_expiry(store, clock):
+    store.set(SID, b"data", 10)
+    for _ in range(3):
+        clock[0] += 8
+        assert store.get(SID, ttl=10) == b"data"
+    # 不延长过期时间的读取不影响过期
+    clock[0] += 8
+    assert store.get(SID) == b"data"
+    clock[0] += 3
+    assert store.get(SID, ttl=10) is None
+
+
+def test_cleanup_removes_expired(store, clock):
+    store.set(SID, b"data", 10)
+    store.set("b" * 43, b"other", 100)
+    clock[0] += 20
+    store.cleanup()
+    assert store.get(SID) is None
+    assert store.get("b" * 43) == b"other"
+
+
+@pytest.fixture
+def session_app(make_app):
+    app = make_app(SESSION_TYPE="memory")
+
+    @app.route("/_test/set")
+    def set_value():
+        session["value"] = "kept"
+        return session.sid
+
+    @app.route("/_test/regenerate")
+    def regenerate():
+        session.regenerate()
+        return session.sid
+
+    @app.route("/_test/get")
+    def get_value():
+        return session.get("value", "")
+
+    return app
+
+
+def test_regenerate_keeps_data_and_drops_old_session(session_app):
+    store = session_app.session_interface.store
+    client = session_app.test_client()
+
+    old_sid = client.get("/_test/set").get_data(as_text=True)
+    old_cookie = client.get_cookie("session").value
+    assert store.get(old_sid) is not None
+
+    new_sid = client.get("/_test/regenerate").get_data(as_text=True)
+    assert new_sid != old_sid
+    assert client.get_cookie("session").value != old_cookie
+    assert store.get(old_sid) is None
+    assert store.get(new_sid) is not None
+    assert client.get("/_test/get").get_data(as_text=True) == "kept"
+
+    # 旧的会话 Cookie 不能再使用
+    client.set_cookie("session", old_cookie)
+    assert client.get("/_test/get").get_data(as_text=True) == ""
+
+
+def test_regenerate_new_session(session_app):
+    client = session_app.test_client()
+    sid = client.get("/_test/regenerate").get_data(as_text=True)
+    assert session_app.session_interface.store.get(sid) is None
+    assert client.get_cookie("session") is None
+
+
+def test_admin_server_timing_does_not_load_session(make_app, monkeypatch):
+    from html_hoster.database import db, User
+
+    app = make_app(SESSION_TYPE="memory", SERVER_TIMING="admin")
+    with app.app_context():
+        admin = User(username="admin", password_hash="x", is_admin=True)
+        db.session.add(admin)
+        db.session.commit()
+        admin_id = admin.id
+
+    @app.route("/_test/plain")
+    def plain():
+        return "ok"
+
+    @app.route("/_test/set")
+    def set_value():
+        session["user_id"] = admin_id
+        return "ok"
+
+    store = app.session_interface.store
+    client = app.test_client()
+    client.get("/_test/set")
+    assert client.get_cookie("session") is not None
+
+    reads = []
+    original_get = store.get
+    monkeypatch.setattr(store, "get", lambda *args, **kwargs: reads.append(args) or original_get(*args, **kwargs))
+
+    response = client.get("/_test/plain")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    assert reads == []
+
+    # 请求中读取了会话时仍对管理员返回计时
+    response = client.get("/_test/set")
+    assert "Server-Timing" in response.headers
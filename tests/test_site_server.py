@@ -0,0 +1,75 @@
+"""
+异步站点文件服务
+"""
+import asyncio
+import threading
+import http.client
+
+import pytest
+
+from html_hoster.site_server import SiteServer
+
+
+@pytest.fixture
+def site_server(make_app, create_site):
+    """在后台线程中启动站点文件服务，返回 (端口, 站点ID)"""
+    app = make_app(LOCAL_STORAGE_MODE="files")
+    site_id = create_site(app, {"index.html": "<h1>hi</h1>", "css/a.css": "body{}"})
+    server = SiteServer(app, threads=2, keepalive_timeout=2)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(server.executor)
+        state["stop"] = asyncio.Event()
+        tcp_server = await asyncio.start_server(server._handle_connection, "127.0.0.1", 0)
+        state["port"] = tcp_server.sockets[0].getsockname()[1]
+        started.set()
+        await state["stop"].wait()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        # 结束仍在等待下一个请求的连接
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True)
+    thread.start()
+    assert started.wait(5)
+    yield state["port"], site_id
+    loop.call_soon_threadsafe(state["stop"].set)
+    thread.join(5)
+    loop.close()
+    server.executor.shutdown(wait=False)
+
+
+def get(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def test_serves_local_files(site_server):
+    port, site_id = site_server
+    assert get(port, f"/site/{site_id}/index.html") == (200, b"<h1>hi</h1>")
+    assert get(port, f"/site/{site_id}/css/a.css") == (200, b"body{}")
+    assert get(port, f"/site/{site_id}/missing.html")[0] == 404
+
+
+@pytest.mark.parametrize("path", [
+    "../../secret.txt",
+    "..%2F..%2Fsecret.txt",
+    "%2e%2e/%2e%2e/secret.txt",
+    "css/%2e%2e/%2e%2e/%2e%2e/secret.txt",
+])
+def test_rejects_traversal(site_server, secret_file, path):
+    port, site_id = site_server
+    status, body = get(port, f"/site/{site_id}/{path}")
+    assert status == 404
+    assert b"top secret" not in body
@@ -0,0 +1,237 @@
+"""本地存储路径解析的测试"""
+import os
+
+import pytest
+from flask import Flask
+
+from html_hoster.storage import LocalStorage, StorageService, TieredStorage
+
+
+def make_storage(tmp_path, **config):
+    app = Flask(__name__)
+    app.config.update(
+        UPLOAD_FOLDER=str(tmp_path / "uploads"),
+        SITES_FOLDER=str(tmp_path / "sites"),
+        **config,
+    )
+    return LocalStorage(app)
+
+
+@pytest.mark.parametrize("mode", ["files", "pack"])
+def test_resolve_path_stays_inside_site_directory(tmp_path, mode):
+    storage = make_storage(tmp_path, LOCAL_STORAGE_MODE=mode)
+    site_path = storage.get_site_path("site-1")
+
+    assert storage._resolve_path("site-1/index.html") == os.path.join(site_path, "index.html")
+    assert storage._resolve_path("site-1/css/main.css") == os.path.join(site_path, "css", "main.css")
+    assert storage._resolve_path("site-1") == site_path
+    assert storage._resolve_path("site-1/") == site_path
+
+
+@pytest.mark.parametrize("remote_path", [
+    "site-1/../secret.txt",
+    "site-1/../../secret.txt",
+    "site-1/css/../../secret.txt",
+    "site-1/..\\..\\secret.txt",
+    "site-1//etc/hostname",
+    "../secret.txt",
+    "./secret.txt",
+    "/secret.txt",
+])
+def test_resolve_path_rejects_escapes(tmp_path, remote_path):
+    storage = make_storage(tmp_path)
+    assert storage._resolve_path(remote_path) is None
+    assert storage._resolve_path(remote_path, for_write=True) is None
+
+
+@pytest.mark.parametrize("mode", ["files", "pack"])
+def test_download_file_does_not_read_outside_sites_folder(tmp_path, secret_file, mode):
+    storage = make_storage(tmp_path, LOCAL_STORAGE_MODE=mode)
+    # 没有打包文件的站点（打包模式下回退到普通文件读取）
+    os.makedirs(storage.get_site_path("site-1"))
+
+    assert storage.download_file("site-1/../../secret.txt") == (None, None)
+    assert storage.download_file("site-1/../../../" + "/".join([".."] * 10) + "/etc/hostname") == (None, None)
+
+
+def test_writes_outside_sites_folder_are_rejected(tmp_path, secret_file):
+    storage = make_storage(tmp_path)
+
+    with pytest.raises(ValueError):
+        storage.put_content("site-1/../../secret.txt", b"overwritten")
+    with pytest.raises(ValueError):
+        storage.upload_file(str(secret_file), "site-1/../../copy.txt")
+    assert secret_file.read_text() == "top secret"
+    assert not (tmp_path / "copy.txt").exists()
+    assert storage.delete_file("site-1/../../secret.txt") is False
+    assert secret_file.exists()
+
+
+@pytest.mark.parametrize("fast_path", ["true", "false"])
+def test_pack_mode_site_without_pack_rejects_traversal(make_app, create_site, secret_file, fast_path):
+    app = make_app(LOCAL_STORAGE_MODE="pack", SITE_FAST_PATH=fast_path)
+    site_id = create_site(app, {})
+    with app.app_context():
+        from html_hoster.storage import get_storage_service
+
+        os.makedirs(get_storage_service(app).get_site_path(site_id))
+
+    client = app.test_client()
+    for path in ("..%2F..%2Fsecret.txt", "..%2F" * 5 + "etc%2Fhostname"):
+        response = client.get(f"/site/{site_id}/{path}")
+        assert response.status_code == 404
+        assert b"top secret" not in response.data
+
+
+class FakeRemoteStorage(StorageService):
+    """返回固定内容的远程存储，记录读取的路径"""
+
+    def __init__(self):
+        self.reads = []
+
+    def upload_file(self, local_path, remote_path, content_type=None):
+        return True
+
+    def download_file(self, remote_path):
+        self.reads.append(remote_path)
+        return b"remote content", "text/plain"
+
+    def delete_file(self, remote_path):
+        return True
+
+    def list_files(self, prefix):
+        return []
+
+    def get_file_url(self, remote_path):
+        return f"/site/{remote_path}"
+
+    def get_site_url(self, site_id):
+        return self.get_file_url(f"{site_id}/index.html")
+
+    def delete_prefix(self, prefix):
+        return True
+
+
+def make_tiered_storage(tmp_path):
+    app = Flask(__name__)
+    app.config.update(UPLOAD_FOLDER=str(tmp_path / "uploads"), SITES_FOLDER=str(tmp_path / "sites"))
+    remote = FakeRemoteStorage()
+    return TieredStorage(app, remote), remote
+
+
+def test_tiered_storage_hydrates_local_copy(tmp_path):
+    storage, remote = make_tiered_storage(tmp_path)
+
+    assert storage.download_file("site-1/css/main.css") == (b"remote content", "text/plain")
+    assert storage.download_file("site-1/css/main.css")[0] == b"remote content"
+    assert remote.reads == ["site-1/css/main.css"]
+    assert os.path.isfile(os.path.join(storage.local.get_site_path("site-1"), "css", "main.css"))
+
+
+@pytest.mark.parametrize("remote_path", [
+    "site-1/../../secret.txt",
+    "site-1/../site-2/index.html",
+    "site-1/css/../../../secret.txt",
+    "site-1//secret.txt",
+])
+def test_tiered_storage_rejects_traversal(tmp_path, secret_file, remote_path):
+    storage, remote = make_tiered_storage(tmp_path)
+    # 站点已有本地副本目录
+    os.makedirs(storage.local.get_site_path("site-1"))
+
+    assert storage.download_file(remote_path) == (None, None)
+    assert remote.reads == []
+    assert secret_file.read_text() == "top secret"
+    assert sorted(os.listdir(tmp_path)) == ["secret.txt", "sites", "uploads"]
+
+
+class MemoryObjectStorage(FakeRemoteStorage):
+    """保存在内存中的对象存储，支持范围下载"""
+
+    def __init__(self):
+        super().__init__()
+        self.objects = {}
+
+    def upload_file(self, local_path, remote_path, content_type=None):
+        with open(local_path, "rb") as f:
+            self.objects[remote_path] = (f.read(), content_type)
+        return True
+
+    def download_file(self, remote_path):
+        self.reads.append(remote_path)
+        return self.objects.get(remote_path, (None, None))
+
+    def download_range(self, remote_path, start, end):
+        content, _ = self.objects.get(remote_path, (None, None))
+        return None if content is None else content[start:end + 1]
+
+    def delete_file(self, remote_path):
+        return self.objects.pop(remote_path, None) is not None
+
+
+def make_bundle_storage(tmp_path):
+    from html_hoster.storage import BundleStorage, _bundle_index_cache
+
+    _bundle_index_cache.clear()
+    app = Flask(__name__)
+    app.config.update(UPLOAD_FOLDER=str(tmp_path / "uploads"))
+    os.makedirs(app.config["UPLOAD_FOLDER"])
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "index.html").write_text("<h1>home</h1>")
+    backend = MemoryObjectStorage()
+    storage = BundleStorage(app, backend)
+    storage.upload_site("site-1", str(source))
+    return storage, backend
+
+
+def test_bundle_write_falls_back_when_pack_is_missing(tmp_path):
+    storage, backend = make_bundle_storage(tmp_path)
+    assert storage.list_files("site-1/") == ["site-1/index.html"]
+    # 索引仍在缓存中，但打包对象已被删除
+    del backend.objects["site-1.pack"]
+
+    new_file = tmp_path / "about.html"
+    new_file.write_text("about")
+    assert storage.upload_file(str(new_file), "site-1/about.html", "text/html")
+    assert backend.objects["site-1/about.html"][0] == b"about"
+    assert storage.delete_file("site-1/index.html") is False
+    assert "site-1.pack" not in backend.objects
+
+
+def test_bundle_concurrent_writes_keep_all_files(tmp_path):
+    import threading
+
+    storage, backend = make_bundle_storage(tmp_path)
+    # 预热索引缓存，使所有写入看到同一个旧索引
+    storage.list_files("site-1/")
+    original_download_pack = storage._download_pack
+    barrier = threading.Barrier(4, timeout=0.5)
+
+    def slow_download_pack(site_id):
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        return original_download_pack(site_id)
+
+    storage._download_pack = slow_download_pack
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"page-{i}.html"
+        path.write_text(f"page {i}")
+        paths.append(str(path))
+
+    threads = [
+        threading.Thread(target=storage.upload_file, args=(path, f"site-1/page-{i}.html"))
+        for i, path in enumerate(paths)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(storage.list_files("site-1/")) == [
+        "site-1/index.html", *(f"site-1/page-{i}.html" for i in range(4))
+    ]
+    assert storage.download_file("site-1/page-3.html")[0] == b"page 3"
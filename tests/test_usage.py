@@ -0,0 +1,100 @@
+"""
+用户配额检查
+"""
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def quota_app(make_app):
+    return make_app(USER_MAX_SITES=2, USER_QUOTA_MB=1)
+
+
+def add_user(app, site_count=0, total_bytes=0):
+    from html_hoster.database import db, User
+
+    with app.app_context():
+        user = User(username=f"user-{uuid.uuid4().hex[:8]}", password_hash="x",
+                    site_count=site_count, total_bytes=total_bytes)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def add_site(app, user_id, status):
+    from html_hoster.database import db, Site
+
+    site_id = str(uuid.uuid4())
+    with app.app_context():
+        db.session.add(Site(id=site_id, name=f"site-{site_id[:8]}", oss_url="", status=status, user_id=user_id))
+        db.session.commit()
+    return site_id
+
+
+def test_quota_disabled_by_default(make_app):
+    from html_hoster.usage import check_quota
+
+    app = make_app()
+    assert app.config["USER_MAX_SITES"] == 0
+    assert app.config["USER_QUOTA_MB"] == 0
+    user_id = add_user(app, site_count=1000, total_bytes=10 ** 12)
+    with app.app_context():
+        check_quota(user_id, 10 ** 9)
+
+
+def test_site_count_limit(quota_app):
+    from html_hoster.usage import QuotaExceededError, check_quota
+
+    user_id = add_user(quota_app, site_count=1)
+    with quota_app.app_context():
+        check_quota(user_id)
+        check_quota(user_id, new_site=False)
+
+    user_id = add_user(quota_app, site_count=2)
+    with quota_app.app_context():
+        with pytest.raises(QuotaExceededError):
+            check_quota(user_id)
+        # 更新已有站点不新增站点数量
+        check_quota(user_id, new_site=False)
+
+
+def test_storage_limit(quota_app):
+    from html_hoster.usage import QuotaExceededError, check_quota
+
+    user_id = add_user(quota_app, total_bytes=1024 * 1024 - 10)
+    with quota_app.app_context():
+        check_quota(user_id, 10)
+        with pytest.raises(QuotaExceededError):
+            check_quota(user_id, 11)
+
+
+def test_pending_sites_count_towards_limit(quota_app):
+    from html_hoster.usage import QuotaExceededError, check_quota
+
+    user_id = add_user(quota_app, site_count=1)
+    add_site(quota_app, user_id, "failed")
+    with quota_app.app_context():
+        check_quota(user_id)
+
+    pending_id = add_site(quota_app, user_id, "pending")
+    with quota_app.app_context():
+        with pytest.raises(QuotaExceededError):
+            check_quota(user_id)
+        # 后台任务检查自己的站点时不重复计入
+        check_quota(user_id, site_id=pending_id)
+
+
+def test_add_pending_site_reserves_slot(quota_app):
+    from html_hoster.database import db, Site
+    from html_hoster.usage import QuotaExceededError, add_pending_site
+
+    user_id = add_user(quota_app)
+    with quota_app.app_context():
+        add_pending_site(Site(id=str(uuid.uuid4()), name="a", oss_url="", status="pending", user_id=user_id))
+        add_pending_site(Site(id=str(uuid.uuid4()), name="b", oss_url="", status="pending", user_id=user_id))
+        rejected_id = str(uuid.uuid4())
+        with pytest.raises(QuotaExceededError):
+            add_pending_site(Site(id=rejected_id, name="c", oss_url="", status="pending", user_id=user_id))
+        assert db.session.get(Site, rejected_id) is None
+        assert db.session.query(Site).filter_by(user_id=user_id).count() == 2
@@ -0,0 +1,134 @@
+"""
+站点文件访问次数的记录和写入
+"""
+from datetime import datetime
+
+import pytest
+
+from html_hoster.warmup import HitCounter, HitFlusher, hit_counter
+
+
+@pytest.fixture(params=[True, False], ids=["writer-queue", "inline"])
+def hit_app(request, make_app):
+    return make_app(SQLITE_WRITER_QUEUE=str(request.param).lower())
+
+
+def read_hits(app):
+    from html_hoster.database import db, SiteHit
+
+    with app.app_context():
+        return {(hit.site_id, hit.path): hit.hits for hit in db.session.query(SiteHit)}
+
+
+def test_flush_accumulates(hit_app):
+    counter = HitCounter()
+    counter.enabled = True
+    flusher = HitFlusher.__new__(HitFlusher)
+    flusher.app, flusher.counter = hit_app, counter
+
+    for _ in range(3):
+        counter.record("s1", "index.html")
+    counter.record("s1", "a.css")
+    assert flusher.flush() == 2
+    counter.record("s1", "index.html")
+    assert flusher.flush() == 1
+    assert read_hits(hit_app) == {("s1", "index.html"): 4, ("s1", "a.css"): 1}
+
+
+def test_flush_retries_after_conflicting_insert(hit_app, monkeypatch):
+    """插入时主键冲突（其他进程同时插入了同一路径）后回滚并重试"""
+    from html_hoster import warmup
+    from html_hoster.database import db, SiteHit
+
+    original = warmup._write_hits
+    calls = []
+
+    def racing_write(counts, now):
+        calls.append(1)
+        result = original(counts, now)
+        if len(calls) == 1:
+            # 在本次插入写入之前插入同一路径，主键冲突
+            db.session.execute(SiteHit.__table__.insert().values(
+                site_id="s1", path="index.html", hits=5, last_hit_at=now))
+        return result
+
+    monkeypatch.setattr(warmup, "_write_hits", racing_write)
+    counter = HitCounter()
+    counter.enabled = True
+    counter.record("s1", "index.html")
+    flusher = HitFlusher.__new__(HitFlusher)
+    flusher.app, flusher.counter = hit_app, counter
+
+    assert flusher.flush() == 1
+    assert len(calls) == 2
+    assert read_hits(hit_app) == {("s1", "index.html"): 1}
+
+
+def test_flush_batches_upserts(make_app, monkeypatch):
+    """每批路径只执行一条 upsert 语句，不再逐个路径查询"""
+    from sqlalchemy import event
+    from html_hoster import warmup
+    from html_hoster.database import db
+
+    app = make_app(SQLITE_WRITER_QUEUE="false")
+    monkeypatch.setattr(warmup, "HIT_WRITE_BATCH_SIZE", 2)
+    counter = HitCounter()
+    counter.enabled = True
+    flusher = HitFlusher.__new__(HitFlusher)
+    flusher.app, flusher.counter = app, counter
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "site_hit" in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for i in range(5):
+            counter.record("s1", f"page-{i}.html")
+        assert flusher.flush() == 5
+        counter.record("s1", "page-0.html")
+        assert flusher.flush() == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert len(statements) == 4
+    assert all(statement.startswith("INSERT") for statement in statements)
+    hits = read_hits(app)
+    assert hits[("s1", "page-0.html")] == 2
+    assert len(hits) == 5
+
+
+def test_run_write_rolls_back_inline(make_app):
+    from sqlalchemy.exc import IntegrityError
+    from html_hoster.database import db, run_write, SiteHit
+
+    app = make_app(SQLITE_WRITER_QUEUE="false")
+    now = datetime.utcnow()
+    with app.app_context():
+        run_write(lambda: db.session.add(SiteHit(site_id="s1", path="a", hits=1, last_hit_at=now)))
+        with pytest.raises(IntegrityError):
+            run_write(lambda: db.session.add(SiteHit(site_id="s1", path="a", hits=1, last_hit_at=now)))
+        # 失败后同一会话可以继续写入
+        run_write(lambda: db.session.add(SiteHit(site_id="s1", path="b", hits=1, last_hit_at=now)))
+    assert read_hits(app) == {("s1", "a"): 1, ("s1", "b"): 1}
+
+
+def test_only_found_files_are_counted(make_app, create_site, monkeypatch):
+    from html_hoster.fastpath import SiteFastPath
+
+    app = make_app(LOCAL_STORAGE_MODE="files")
+    site_id = create_site(app, {"index.html": "<h1>hi</h1>"})
+    counter = HitCounter()
+    counter.enabled = True
+    monkeypatch.setattr(hit_counter, "record", counter.record)
+
+    client = app.test_client()
+    assert isinstance(app.wsgi_app, SiteFastPath)
+    assert client.get(f"/site/{site_id}/index.html").status_code == 200
+    for i in range(5):
+        assert client.get(f"/site/{site_id}/missing-{i}.html").status_code == 404
+    assert counter.drain() == {(site_id, "index.html"): 1}